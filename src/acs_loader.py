@@ -0,0 +1,158 @@
+# acs_loader.py
+#
+# Shared loader for the American Community Survey (ACS) tract tables.
+# Every raw ACS extract from data.census.gov has the same layout:
+#   - a GEO_ID column ("1400000US" + 11 digit tract FIPS; "14000US" in older
+#     vintages) and a NAME column
+#   - paired estimate/margin columns per variable (B08301_001E, B08301_001M, ...)
+#   - a second header row with human readable labels ("Geography", ...)
+#   - one national summary row (0100000US) before the tracts
+#   - a trailing empty "Unnamed" column
+# Instead of reading the whole file as strings and cleaning it afterwards,
+# a table spec lists the variables we actually need, so only those columns
+# are parsed, with numeric dtypes, chunk by chunk.
+# Each kept estimate carries its 90% margin of error (the paired _M column)
+# as "<name>_moe", so later stages can tell how exact a tract's value is.
+
+from dataclasses import dataclass, field
+
+import pandas as pd
+
+from instrument import step
+
+# GEO_ID prefixes of tract rows (summary level 140), current and older vintages
+TRACT_PREFIXES = ("1400000US", "14000US")
+
+# Annotation values the Census Bureau puts in estimate cells instead of numbers
+# (e.g. "-" = too few samples, "250,000+" = top-coded median income).
+# They are treated as missing, same as pd.to_numeric(errors="coerce") did.
+ACS_NA_VALUES = ["-", "N", "(X)", "*", "**", "***", "*****", "null", "250,000+", "2,500-"]
+
+DEFAULT_CHUNKSIZE = 100_000
+
+# Suffix of the margin of error column next to each estimate
+MOE_SUFFIX = "_moe"
+
+
+def margin_column(raw):
+    """Raw margin of error column of an estimate column (B08301_010E -> B08301_010M)."""
+    return raw[:-1] + "M"
+
+
+@dataclass(frozen=True)
+class AcsTableSpec:
+    """Describe which variables of an ACS table to keep and what to derive from them.
+
+    variables: raw ACS column -> readable column name (e.g. "B08301_010E" -> "workers_public")
+    ratios:    new column -> (numerator, denominator); the denominator is either
+               another readable column name or a constant number
+    keep_variables: write the renamed variables to the output as well as the ratios
+    margins:   also keep each variable's margin of error as "<name>_moe"; a
+               ratio over a constant gets "<ratio>_moe" (the margin scales
+               exactly), ratios of two estimates get theirs from simulation
+               (see build_moe_intervals.py)
+    """
+
+    table_id: str
+    variables: dict
+    ratios: dict = field(default_factory=dict)
+    keep_variables: bool = True
+    margins: bool = True
+
+    @property
+    def margin_columns(self):
+        """Raw margin column -> readable "<name>_moe" column."""
+        if not self.margins:
+            return {}
+        return {margin_column(raw): name + MOE_SUFFIX for raw, name in self.variables.items()}
+
+    @property
+    def raw_columns(self):
+        return ["GEO_ID", "NAME"] + list(self.variables) + list(self.margin_columns)
+
+
+def _clean_chunk(chunk, spec):
+    """Keep only tract rows of one chunk and give them readable column names."""
+    chunk = chunk[chunk["GEO_ID"].str.startswith(TRACT_PREFIXES, na=False)]
+
+    out = pd.DataFrame(
+        {
+            # 11 digit tract FIPS, parsed once as an integer join key
+            "geoid": chunk["GEO_ID"].str.slice(-11).astype("int64"),
+            "tract_name": chunk["NAME"],
+        }
+    )
+    for raw, name in spec.variables.items():
+        out[name] = chunk[raw]
+        if spec.margins:
+            out[name + MOE_SUFFIX] = chunk[margin_column(raw)]
+    return out
+
+
+def _restore_integer_counts(df, columns):
+    """Store count columns as int64 when that is lossless (no gaps, whole numbers).
+
+    Estimates are parsed as float64 up front so a missing value never breaks a
+    chunk. Columns that turn out to be complete whole numbers are turned back to
+    integers, matching what pd.to_numeric produced in the original cleaners.
+    """
+    for col in columns:
+        s = df[col]
+        if s.notna().all() and (s % 1 == 0).all():
+            df[col] = s.astype("int64")
+    return df
+
+
+def load_acs_table(path, spec, chunksize=DEFAULT_CHUNKSIZE):
+    """Read one raw ACS csv into a tidy tract-level DataFrame following `spec`.
+
+    Only GEO_ID, NAME and the spec variables are parsed. The label row is
+    skipped at parse time and the file is processed `chunksize` rows at a time,
+    so memory depends on the number of tracts and kept columns, not on the
+    width of the raw extract.
+    """
+    with step("load") as s:
+        df, rows_read = _read_acs_table(path, spec, chunksize)
+        s.record(rows_in=rows_read, rows_out=len(df))
+    return df
+
+
+def _read_acs_table(path, spec, chunksize):
+    header = pd.read_csv(path, nrows=0).columns
+    missing = [c for c in spec.raw_columns if c not in header]
+    if missing:
+        raise ValueError(f"{path} is missing ACS columns for {spec.table_id}: {missing}")
+
+    dtypes = {"GEO_ID": "string", "NAME": "string"}
+    dtypes.update({raw: "float64" for raw in spec.variables})
+    dtypes.update({raw: "float64" for raw in spec.margin_columns})
+
+    reader = pd.read_csv(
+        path,
+        usecols=spec.raw_columns,
+        dtype=dtypes,
+        skiprows=[1],  # "Geography" / "Geographic Area Name" label row
+        na_values=ACS_NA_VALUES,
+        keep_default_na=True,
+        chunksize=chunksize,
+    )
+    chunks = []
+    rows_read = 0
+    for chunk in reader:
+        rows_read += len(chunk)
+        chunks.append(_clean_chunk(chunk, spec))
+    df = pd.concat(chunks, ignore_index=True)
+
+    df["tract_name"] = df["tract_name"].astype(object)
+    df = _restore_integer_counts(df, list(spec.variables.values()) + list(spec.margin_columns.values()))
+
+    # Derived ratios, e.g. share of workers using public transit
+    for name, (num, den) in spec.ratios.items():
+        denominator = df[den] if isinstance(den, str) else den
+        df[name] = df[num] / denominator
+        if spec.margins and not isinstance(den, str):
+            df[name + MOE_SUFFIX] = df[num + MOE_SUFFIX] / den
+
+    if not spec.keep_variables:
+        df = df.drop(columns=list(spec.variables.values()) + list(spec.margin_columns.values()))
+    return df, rows_read
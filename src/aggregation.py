@@ -0,0 +1,91 @@
+# aggregation.py
+#
+# Combine tract rows of the master into other units: community areas in
+# build_community_rollup.py, 2020 census tracts in build_panel.py.
+# A tract row can contribute only part of itself (share, e.g. the fraction
+# of an old tract that lies in a new one):
+#   - count columns (workers_*, hh_*, travel_total and the commute_* travel
+#     time buckets, selected by name) are summed, and their margins of error
+#     combined as the root of the summed squares (the ACS rule for sums),
+#   - shares and averages are weighted by the population they describe
+#     (workers for commute metrics, households for income / vehicle metrics),
+#     which for the pct_* shares equals the share of the summed counts,
+#   - commute percentiles and pct_commute_over_* shares are recomputed from
+#     the summed travel time buckets (commute_distribution.py).
+# Margins of error of averaged metrics (median_income_moe,
+# mean_travel_time_min_moe) are approximated like those of a weighted mean
+# of independent estimates with fixed weights: the root of the summed
+# squares of weight * MOE, divided by the summed weights. So every aggregated
+# table keeps the MOE columns of its input.
+
+import numpy as np
+import pandas as pd
+
+from acs_loader import MOE_SUFFIX
+from commute_distribution import BUCKET_COLUMNS, commute_distribution
+
+# Count columns: these prefixes, and these names
+COUNT_PREFIXES = ("workers_", "hh_")
+COUNT_COLUMNS = ("travel_total", *BUCKET_COLUMNS)
+
+# Weight of every averaged metric: the count of people it is a share or
+# average of. Other pct_hh_* columns use households, other pct_* workers.
+WEIGHTS = {
+    "median_income": "hh_total",  # household-weighted mean of tract medians
+    "mean_travel_time_min": "workers_total",
+}
+
+
+def is_count(column):
+    """Whether a master column is a count (by name: a count with gaps is stored as float)."""
+    return column.startswith(COUNT_PREFIXES) or column in COUNT_COLUMNS
+
+
+def weight_column(column):
+    if column in WEIGHTS:
+        return WEIGHTS[column]
+    return "hh_total" if column.startswith("pct_hh_") else "workers_total"
+
+
+def aggregate_tracts(df, by, columns, share=None):
+    """Aggregate the master `columns` of df's tract rows per `by` key(s).
+
+    share names an optional column with the fraction of each row that
+    belongs to its group (default: all of it). Returns one row per group,
+    indexed by `by`: summed counts, their margins, then weighted metrics
+    and their margins.
+    """
+    keys = [df[c] for c in ([by] if isinstance(by, str) else by)]
+    fraction = df[share].astype("float64") if share else 1.0
+    measures = [c for c in columns if c not in ("geoid", "tract_name") and not c.endswith(MOE_SUFFIX)]
+    counts = [c for c in measures if is_count(c)]
+    averaged = [c for c in measures if c not in counts and pd.api.types.is_numeric_dtype(df[c])]
+    margins = [c + MOE_SUFFIX for c in counts if c + MOE_SUFFIX in columns]
+    averaged_margins = [c for c in averaged if c + MOE_SUFFIX in columns]
+
+    # Weighted means via grouped sums of value * weight and of the weights
+    # of the rows where the value is known.
+    parts = {c: df[c] * fraction if share else df[c] for c in counts}
+    parts.update({c: (df[c].astype("float64") * fraction) ** 2 for c in margins})
+    for column in averaged:
+        weight = df[weight_column(column)].astype("float64") * fraction
+        known = df[column].notna() & weight.notna()
+        parts[column] = (df[column].astype("float64") * weight).where(known)
+        parts[f"{column}__w"] = weight.where(known)
+        if column in averaged_margins:
+            parts[column + MOE_SUFFIX] = ((df[column + MOE_SUFFIX].astype("float64") * weight) ** 2).where(known)
+    sums = pd.DataFrame(parts).groupby(keys).sum(min_count=1)
+
+    out = sums[counts].copy()
+    for column in margins:
+        out[column] = np.sqrt(sums[column])
+    for column in averaged:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            out[column] = sums[column] / sums[f"{column}__w"]
+    for column in averaged_margins:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            out[column + MOE_SUFFIX] = np.sqrt(sums[column + MOE_SUFFIX]) / sums[f"{column}__w"]
+    if set(BUCKET_COLUMNS) <= set(counts):
+        distribution = commute_distribution(out)
+        out[distribution.columns] = distribution
+    return out
@@ -0,0 +1,345 @@
+# benchmark.py
+#
+# Scaling benchmark of the pipeline stages on synthetic data.
+# For every --sizes tract count, synthetic_data.py writes raw files of that
+# size (plus one CTA station per ten tracts x --days days) into a scratch
+# workspace, and every stage script then runs on it in pipeline order, each
+# in its own process with MOBILITY_DATA_ROOT pointing at the workspace
+# (paths.py), --repeat times. Per run the benchmark records:
+#   - wall seconds, and CPU seconds of the stage process and its workers,
+#   - peak resident memory (max RSS) of the stage process, or of its largest
+#     worker process for stages that use a process pool,
+#   - with --tracemalloc, the peak of Python / numpy allocations traced in the
+#     stage process (adds overhead to the timings, so run it separately),
+#   - the size of the files the stage wrote,
+#   - the stage's own step report (instrument.py): time, rows and bytes of
+#     its load / transform / figure / serialize steps.
+# Results go to benchmarks/<commit>.json (commit, machine, package versions
+# and one entry per stage and size); --compare OLD.json prints how every
+# stage changed against an earlier run and exits with status 1 when one got
+# slower or bigger than --tolerance allows, so it can gate a change.
+#
+# Usage:
+#   python src/benchmark.py                                # 1k, 10k, 100k tracts
+#   python src/benchmark.py --sizes 1000 --stages build_master_tracts
+#   python src/benchmark.py --compare benchmarks/abc1234.json
+#   python src/benchmark.py --results benchmarks/def5678.json --compare benchmarks/abc1234.json
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from importlib.metadata import PackageNotFoundError, version
+
+import instrument
+import synthetic_data
+from paths import DATA_ROOT, PROJECT_ROOT
+from pipeline import SRC_DIR, STAGES, with_dependencies
+
+BENCHMARK_DIR = os.path.join(PROJECT_ROOT, "benchmarks")
+DEFAULT_SIZES = (1_000, 10_000, 100_000)
+# CTA stations per tract (1k tracts -> 100 stations), never fewer than MIN_STATIONS
+STATIONS_PER_TRACT = 0.1
+MIN_STATIONS = 10
+DEFAULT_DAYS = 365
+
+# Stages that need data the generator does not write
+SKIPPED_STAGES = ("build_panel",)
+# Files copied from this checkout's data_raw/ into every workspace
+COPIED_RAW_FILES = ("community_boundaries.csv",)
+PACKAGES = ("numpy", "pandas", "pyarrow", "plotly")
+# Step report fields kept in the results
+STEP_KEYS = ("name", "wall_seconds", "cpu_seconds", "rows_in", "rows_out", "bytes_written")
+
+# ru_maxrss is in kilobytes on Linux and in bytes on macOS
+RSS_BYTES = 1 if sys.platform == "darwin" else 1024
+MB = 1024 * 1024
+
+# A stage regressed when slower / bigger than tolerance x the baseline and
+# by more than these absolute amounts (short stages are noisy)
+DEFAULT_TOLERANCE = 1.2
+MIN_SECONDS_DELTA = 0.1
+MIN_MB_DELTA = 10.0
+
+# Stage processes are started by this small runner, not by the benchmark
+# itself: a process starts out with the peak memory of the process that
+# forked it, and the benchmark holds the synthetic data. The runner starts
+# the command in argv[2:], waits for it with wait4 (which adds the usage of
+# the processes it waited for, i.e. its pool workers) and writes the
+# measurements to argv[1].
+RUNNER = """
+import json, os, subprocess, sys, time
+start = time.perf_counter()
+process = subprocess.Popen(sys.argv[2:])
+_, status, usage = os.wait4(process.pid, 0)
+seconds = time.perf_counter() - start
+with open(sys.argv[1], "w") as fh:
+    json.dump({"seconds": seconds, "cpu_seconds": usage.ru_utime + usage.ru_stime, "max_rss": usage.ru_maxrss}, fh)
+sys.exit(os.waitstatus_to_exitcode(status))
+"""
+
+# Runs one stage script with tracemalloc on and writes its peak to argv[1]
+TRACEMALLOC_RUNNER = """
+import json, runpy, sys, tracemalloc
+out, script = sys.argv[1], sys.argv[2]
+sys.argv = sys.argv[2:]
+sys.path.insert(0, {src!r})
+tracemalloc.start()
+try:
+    runpy.run_path(script, run_name="__main__")
+finally:
+    with open(out, "w") as fh:
+        json.dump({{"peak": tracemalloc.get_traced_memory()[1]}}, fh)
+"""
+
+
+def git(*args):
+    try:
+        return subprocess.run(
+            ["git", *args], cwd=PROJECT_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    """Commit and machine description stored with the results."""
+    packages = {}
+    for name in PACKAGES:
+        try:
+            packages[name] = version(name)
+        except PackageNotFoundError:
+            packages[name] = None
+    return {
+        "commit": git("rev-parse", "--short", "HEAD"),
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "packages": packages,
+    }
+
+
+def make_workspace(root, n_tracts, n_days, seed):
+    """Scratch data root with synthetic raw files for n_tracts tracts."""
+    workspace = os.path.join(root, f"tracts_{n_tracts}")
+    shutil.rmtree(workspace, ignore_errors=True)
+    n_stations = max(MIN_STATIONS, round(n_tracts * STATIONS_PER_TRACT))
+    raw_dir = synthetic_data.generate(workspace, n_tracts, n_stations, n_days, seed)
+    for name in COPIED_RAW_FILES:
+        shutil.copy(os.path.join(PROJECT_ROOT, "data_raw", name), raw_dir)
+    return workspace, n_stations
+
+
+def run_process(stage, workspace, trace=False):
+    """Run one stage script in a child process on the workspace data.
+
+    Returns the run's measurements; raises RuntimeError with the end of the
+    script's output when it fails.
+    """
+    script = os.path.join(SRC_DIR, f"{stage.module}.py")
+    log_path = os.path.join(workspace, f"{stage.name}.log")
+    usage_path = os.path.join(workspace, f"{stage.name}.usage.json")
+    trace_path = os.path.join(workspace, f"{stage.name}.tracemalloc.json")
+    command = [sys.executable, script, *stage.args]
+    if trace:
+        command = [sys.executable, "-c", TRACEMALLOC_RUNNER.format(src=SRC_DIR), trace_path, script, *stage.args]
+    env = dict(os.environ, MOBILITY_DATA_ROOT=workspace, MOBILITY_PROFILE="report")
+
+    with open(log_path, "w") as log:
+        returncode = subprocess.call(
+            [sys.executable, "-c", RUNNER, usage_path, *command], cwd=workspace, env=env, stdout=log, stderr=log
+        )
+    if returncode != 0:
+        with open(log_path) as log:
+            tail = log.read()[-2000:]
+        raise RuntimeError(f"{stage.name} exited with status {returncode}\n{tail}")
+
+    with open(usage_path) as fh:
+        usage = json.load(fh)
+    run = {
+        "seconds": usage["seconds"],
+        "cpu_seconds": usage["cpu_seconds"],
+        "max_rss_mb": usage["max_rss"] * RSS_BYTES / MB,
+    }
+    if trace:
+        with open(trace_path) as fh:
+            run["tracemalloc_peak_mb"] = json.load(fh)["peak"] / MB
+    report_path = os.path.join(workspace, os.path.relpath(instrument.PROFILE_DIR, DATA_ROOT), f"{stage.module}.json")
+    if os.path.exists(report_path):
+        with open(report_path) as fh:
+            steps = json.load(fh)["steps"]
+        run["steps"] = [{key: s[key] for key in STEP_KEYS if key in s} for s in steps if s["depth"] == 0]
+    return run
+
+
+def output_mb(stage, workspace):
+    """Size of the files the stage wrote to the workspace.
+
+    Stage outputs are listed under this checkout's data directories
+    (pipeline.py is imported without MOBILITY_DATA_ROOT), so they are moved
+    over to the workspace first.
+    """
+    paths = [os.path.join(workspace, os.path.relpath(p, DATA_ROOT)) for p in stage.outputs]
+    return sum(os.path.getsize(p) for p in paths if os.path.exists(p)) / MB
+
+
+def benchmark_size(stages, n_tracts, args, root):
+    """Generate one size's data and run every stage on it; returns result entries."""
+    start = time.perf_counter()
+    workspace, n_stations = make_workspace(root, n_tracts, args.days, args.seed)
+    seconds = time.perf_counter() - start
+    print(f"\n=== {n_tracts:,} tracts, {n_stations} stations x {args.days} days (generated in {seconds:.1f}s) ===")
+
+    results = []
+    status = {}
+    for stage in stages:
+        entry = {"stage": stage.name, "tracts": n_tracts, "stations": n_stations, "days": args.days}
+        if any(status.get(dep) != "ok" for dep in stage.deps if dep in status):
+            entry["status"] = status[stage.name] = "skipped"
+            print(f"[skip] {stage.name}: an upstream stage failed")
+            results.append(entry)
+            continue
+        runs = []
+        try:
+            for _ in range(args.repeat):
+                runs.append(run_process(stage, workspace, args.tracemalloc))
+        except RuntimeError as exc:
+            entry["status"] = status[stage.name] = "failed"
+            entry["error"] = str(exc)
+            print(f"[FAIL] {exc}")
+            results.append(entry)
+            continue
+
+        status[stage.name] = "ok"
+        entry["status"] = "ok"
+        best = min(runs, key=lambda run: run["seconds"])
+        entry.update(best)
+        entry["output_mb"] = output_mb(stage, workspace)
+        entry["runs"] = [run["seconds"] for run in runs]
+        results.append(entry)
+        print(
+            f"[done] {stage.name:<30} {best['seconds']:8.2f}s  cpu {best['cpu_seconds']:8.2f}s  "
+            f"rss {best['max_rss_mb']:8.1f} MB  out {entry['output_mb']:8.1f} MB"
+        )
+    return results
+
+
+def result_key(entry):
+    return entry["stage"], entry["tracts"]
+
+
+def regressed(old, new, tolerance, min_delta):
+    return new > old * tolerance and new - old > min_delta
+
+
+def compare(baseline, current, tolerance=DEFAULT_TOLERANCE):
+    """Print current vs baseline per stage and size; returns the regressions."""
+    old = {result_key(e): e for e in baseline["results"] if e.get("status") == "ok"}
+    print(f"\n=== {current.get('commit')} vs baseline {baseline.get('commit')} ===")
+    if current.get("config", {}).get("tracemalloc") != baseline.get("config", {}).get("tracemalloc"):
+        print("Warning: only one of the runs traced allocations (--tracemalloc), which slows stages down")
+    print(f"{'stage':<30} {'tracts':>8} {'seconds':>19} {'ratio':>6} {'max RSS MB':>21} {'ratio':>6}")
+    regressions = []
+    for entry in current["results"]:
+        before = old.get(result_key(entry))
+        if entry.get("status") != "ok" or before is None:
+            continue
+        time_ratio = entry["seconds"] / before["seconds"] if before["seconds"] else float("nan")
+        rss_ratio = entry["max_rss_mb"] / before["max_rss_mb"] if before["max_rss_mb"] else float("nan")
+        flags = []
+        if regressed(before["seconds"], entry["seconds"], tolerance, MIN_SECONDS_DELTA):
+            flags.append("slower")
+        if regressed(before["max_rss_mb"], entry["max_rss_mb"], tolerance, MIN_MB_DELTA):
+            flags.append("more memory")
+        if flags:
+            regressions.append((entry["stage"], entry["tracts"], flags))
+        print(
+            f"{entry['stage']:<30} {entry['tracts']:>8,} "
+            f"{before['seconds']:8.2f} -> {entry['seconds']:8.2f} {time_ratio:5.2f}x "
+            f"{before['max_rss_mb']:9.1f} -> {entry['max_rss_mb']:9.1f} {rss_ratio:5.2f}x"
+            + (f"  <- {', '.join(flags)}" if flags else "")
+        )
+    print(f"\n{len(regressions)} regression(s) above {tolerance:.2f}x")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark every pipeline stage on synthetic data.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="tract counts (default 1k 10k 100k)")
+    parser.add_argument(
+        "--stages", nargs="+", help="stages to run, with their dependencies (default: all the synthetic data supports)"
+    )
+    parser.add_argument("--days", type=int, default=DEFAULT_DAYS, help=f"days of CTA rides (default {DEFAULT_DAYS})")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per stage; the fastest is reported")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic data")
+    parser.add_argument("--tracemalloc", action="store_true", help="also record traced Python allocations (slower)")
+    parser.add_argument("--workdir", help="where to build the synthetic workspaces (default: a temporary directory)")
+    parser.add_argument("--keep", action="store_true", help="keep the workspaces (data, figures, stage logs)")
+    parser.add_argument("--output", help="results file (default: benchmarks/<commit>.json)")
+    parser.add_argument("--results", help="compare this existing results file instead of running the benchmark")
+    parser.add_argument("--compare", metavar="BASELINE", help="results file of an earlier run to compare against")
+    parser.add_argument(
+        "--tolerance", type=float, default=DEFAULT_TOLERANCE, help="slowdown / growth ratio counted as a regression"
+    )
+    args = parser.parse_args(argv)
+
+    if args.results:
+        with open(args.results) as fh:
+            current = json.load(fh)
+    else:
+        unsupported = set(args.stages or ()) & set(SKIPPED_STAGES)
+        if unsupported:
+            parser.error(f"the synthetic data does not cover {', '.join(sorted(unsupported))}")
+        try:
+            stages = with_dependencies(args.stages) if args.stages else STAGES
+        except ValueError as exc:
+            parser.error(str(exc))
+        stages = [s for s in stages if s.name not in SKIPPED_STAGES]
+
+        root = args.workdir or tempfile.mkdtemp(prefix="mobility-benchmark-")
+        current = environment()
+        current["config"] = {
+            "sizes": list(args.sizes),
+            "stages": [s.name for s in stages],
+            "days": args.days,
+            "repeat": args.repeat,
+            "seed": args.seed,
+            "tracemalloc": args.tracemalloc,
+        }
+        current["results"] = []
+        try:
+            for n_tracts in args.sizes:
+                current["results"] += benchmark_size(stages, n_tracts, args, root)
+        finally:
+            if args.keep:
+                print("\nWorkspaces kept in", root)
+            else:
+                shutil.rmtree(root, ignore_errors=True)
+
+        output = args.output
+        if output is None:
+            suffix = "-dirty" if current["dirty"] else ""
+            output = os.path.join(BENCHMARK_DIR, f"{current['commit'] or 'results'}{suffix}.json")
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, "w") as fh:
+            json.dump(current, fh, indent=2)
+        print("\nSaved:", output)
+
+    if args.compare:
+        with open(args.compare) as fh:
+            baseline = json.load(fh)
+        if compare(baseline, current, args.tolerance):
+            return 1
+    return 1 if any(e.get("status") == "failed" for e in current["results"]) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
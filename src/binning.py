@@ -0,0 +1,165 @@
+# binning.py
+#
+# Server-side binning for the dashboards.
+# Instead of shipping every raw value to the browser and letting plotly.js
+# bin it, the bins are computed here with NumPy and only the bin heights are
+# written to the HTML, so figure size no longer grows with the number of
+# tracts.
+
+import numpy as np
+
+
+def nice_step(span, n_bins):
+    """Round span / n_bins up to 1, 2 or 5 x 10^k, like plotly's auto bins."""
+    if span <= 0 or not np.isfinite(span):
+        return 1.0
+    raw = span / n_bins
+    magnitude = 10 ** np.floor(np.log10(raw))
+    for factor in (1, 2, 5, 10):
+        if factor * magnitude >= raw:
+            return factor * magnitude
+    return 10 * magnitude
+
+
+def nice_bin_edges(values, n_bins=30):
+    """About n_bins equal-width bins with a round width covering `values`."""
+    values = np.asarray(values, dtype="float64")
+    values = values[np.isfinite(values)]
+    if not values.size:
+        return np.array([0.0, 1.0])
+    lo, hi = values.min(), values.max()
+    step = nice_step(hi - lo, n_bins)
+    start = np.floor(lo / step) * step
+    count = max(int(np.ceil((hi - start) / step)), 1)
+    if start + count * step <= hi:
+        count += 1  # bins are half-open, so the maximum needs its own bin
+    return start + step * np.arange(count + 1)
+
+
+def bin_index(values, edges):
+    """Bin of every value in `edges`, or -1 outside them (and for NaN).
+
+    Bins are half-open [a, b), except the last which also includes its right
+    edge, as in np.histogram.
+    """
+    n_bins = len(edges) - 1
+    bins = np.searchsorted(edges, values, side="right") - 1
+    bins[values == edges[-1]] = n_bins - 1
+    bins[~np.isfinite(values) | (bins >= n_bins)] = -1
+    return bins
+
+
+def grouped_histogram(values, codes, n_groups, edges):
+    """Probability-density histograms of `values` for every group at once.
+
+    codes holds the group (0 .. n_groups - 1, or -1 for none) of each value.
+    Bin and group are combined into one index, so a single np.bincount pass
+    counts every group. Bins follow bin_index.
+
+    Returns an array of shape (n_groups, len(edges) - 1) whose rows integrate
+    to 1 (rows of empty groups are 0).
+    """
+    values = np.asarray(values, dtype="float64")
+    codes = np.asarray(codes, dtype=np.int64)
+    n_bins = len(edges) - 1
+
+    bins = bin_index(values, edges)
+    keep = (codes >= 0) & (bins >= 0)
+
+    flat = codes[keep] * n_bins + bins[keep]
+    counts = np.bincount(flat, minlength=n_groups * n_bins).reshape(n_groups, n_bins)
+
+    totals = counts.sum(axis=1, keepdims=True)
+    widths = np.diff(edges)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        density = counts / (totals * widths)
+    return np.nan_to_num(density)
+
+
+def grouped_histogram2d(x, y, codes, n_groups, x_edges, y_edges):
+    """Point counts on an x/y grid for every group, in one np.bincount pass.
+
+    Returns an int array of shape (n_groups, len(y_edges) - 1, len(x_edges) - 1):
+    rows are y bins, as plotly heatmaps expect for z.
+    """
+    x = np.asarray(x, dtype="float64")
+    y = np.asarray(y, dtype="float64")
+    codes = np.asarray(codes, dtype=np.int64)
+    nx, ny = len(x_edges) - 1, len(y_edges) - 1
+
+    xb = bin_index(x, x_edges)
+    yb = bin_index(y, y_edges)
+    keep = (codes >= 0) & (xb >= 0) & (yb >= 0)
+
+    flat = (codes[keep] * ny + yb[keep]) * nx + xb[keep]
+    return np.bincount(flat, minlength=n_groups * ny * nx).reshape(n_groups, ny, nx)
+
+
+def occupied_columns(counts):
+    """For each group of (n_groups, ny, nx) counts, the slice of x bins it uses.
+
+    Income groups split the income axis, so cropping each group's grid to its
+    own columns avoids shipping the (empty) rest of the grid for every group.
+    """
+    slices = []
+    for group in counts:
+        used = np.flatnonzero(group.sum(axis=0))
+        slices.append(slice(int(used[0]), int(used[-1]) + 1) if used.size else slice(0, 0))
+    return slices
+
+
+def silverman_bandwidth(values):
+    """Silverman's rule of thumb, the default bandwidth of plotly.js violins."""
+    values = np.asarray(values, dtype="float64")
+    if values.size < 2:
+        return 0.0
+    q75, q25 = np.percentile(values, [75, 25])
+    spread = min(values.std(ddof=1), (q75 - q25) / 1.349) or values.std(ddof=1)
+    return 1.059 * spread * values.size ** -0.2
+
+
+def grouped_kde(values, codes, n_groups, grid_size=512):
+    """Gaussian kernel density of `values` for every group, on one shared grid.
+
+    Binned estimator: each value is split linearly between its two nearest
+    grid points (one np.bincount for all groups), and the binned counts are
+    convolved with each group's Gaussian kernel through a zero-padded FFT.
+    Cost is O(n + groups * grid_size * log(grid_size)) instead of
+    O(n * grid_size). Every group uses its own Silverman bandwidth.
+
+    Returns (grid, density of shape (n_groups, grid_size), bandwidths).
+    """
+    values = np.asarray(values, dtype="float64")
+    codes = np.asarray(codes, dtype=np.int64)
+    keep = np.isfinite(values) & (codes >= 0)
+    values, codes = values[keep], codes[keep]
+
+    sizes = np.bincount(codes, minlength=n_groups)
+    bandwidths = np.array([silverman_bandwidth(values[codes == g]) for g in range(n_groups)])
+    pad = 3 * bandwidths.max() if bandwidths.size else 0.0
+    lo, hi = values.min() - pad, values.max() + pad
+    if hi <= lo:
+        hi = lo + 1.0
+    grid = np.linspace(lo, hi, grid_size)
+    step = grid[1] - grid[0]
+
+    # Linear binning onto the grid
+    pos = (values - lo) / step
+    left = np.clip(np.floor(pos).astype(np.int64), 0, grid_size - 2)
+    frac = pos - left
+    offset = codes * grid_size
+    counts = np.bincount(offset + left, weights=1 - frac, minlength=n_groups * grid_size)
+    counts += np.bincount(offset + left + 1, weights=frac, minlength=n_groups * grid_size)
+    counts = counts.reshape(n_groups, grid_size)
+
+    # Circular convolution over 2 * grid_size points == linear convolution
+    n_fft = 2 * grid_size
+    lags = np.arange(n_fft)
+    lags = np.where(lags < grid_size, lags, lags - n_fft) * step
+    safe_bw = np.where(bandwidths > 0, bandwidths, step)[:, None]
+    kernels = np.exp(-0.5 * (lags[None, :] / safe_bw) ** 2)
+    smoothed = np.fft.irfft(np.fft.rfft(counts, n_fft, axis=1) * np.fft.rfft(kernels, axis=1), n_fft, axis=1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        density = smoothed[:, :grid_size] / (sizes[:, None] * safe_bw * np.sqrt(2 * np.pi))
+    return grid, np.clip(np.nan_to_num(density), 0, None), bandwidths
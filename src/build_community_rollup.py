@@ -0,0 +1,110 @@
+# build_community_rollup.py
+#
+# Roll the tract master up to Chicago's 77 community areas.
+# Each tract is assigned to the community area that contains its centroid
+# (spatial.locate_points on the boundaries in community_boundaries.csv), then
+# the tract metrics are aggregated per community area (see aggregation.py:
+# counts summed, shares and averages weighted by workers or households).
+# Tracts outside Chicago (most of suburban Cook County) get no community area.
+#
+# Input: data_raw/tract_centroids.csv with a geoid column and the centroid
+# longitude / latitude (e.g. from the Census Gazetteer tract file).
+
+import argparse
+import os
+
+import pandas as pd
+
+from aggregation import aggregate_tracts
+from datastore import load_master, write_table
+from geometry import COMMUNITY_PATH, load_geometries
+from instrument import step
+from paths import RAW_DIR
+from spatial import locate_points
+
+CENTROIDS_PATH = os.path.join(RAW_DIR, "tract_centroids.csv")
+LOOKUP_NAME = "tract_community_areas"
+OUTPUT_NAME = "community_area_mobility"
+AREA_COLUMNS = ["AREA_NUMBE", "COMMUNITY"]
+
+# Accepted spellings of the centroid columns (first match wins)
+GEOID_COLUMNS = ("geoid", "GEOID")
+LON_COLUMNS = ("lon", "longitude", "INTPTLONG", "INTPTLON", "x")
+LAT_COLUMNS = ("lat", "latitude", "INTPTLAT", "y")
+
+
+def pick_column(df, names, what):
+    for name in names:
+        if name in df.columns:
+            return name
+    raise ValueError(f"Centroid file needs a {what} column (one of {', '.join(names)})")
+
+
+def load_centroids(path):
+    """Tract centroids as a DataFrame with integer geoid, lon and lat."""
+    df = pd.read_csv(path)
+    geoid = pick_column(df, GEOID_COLUMNS, "GEOID")
+    lon = pick_column(df, LON_COLUMNS, "longitude")
+    lat = pick_column(df, LAT_COLUMNS, "latitude")
+    out = pd.DataFrame(
+        {
+            "geoid": pd.to_numeric(df[geoid], errors="coerce").astype("Int64"),
+            "lon": pd.to_numeric(df[lon], errors="coerce"),
+            "lat": pd.to_numeric(df[lat], errors="coerce"),
+        }
+    ).dropna()
+    out["geoid"] = out["geoid"].astype("int64")
+    if not out["geoid"].is_unique:
+        raise ValueError(f"{path} has duplicate geoids")
+    return out
+
+
+def assign_community_areas(centroids, areas, geoms):
+    """geoid -> community area lookup for the centroids inside an area."""
+    found = locate_points(geoms, centroids["lon"].to_numpy(), centroids["lat"].to_numpy())
+    inside = found >= 0
+    lookup = areas.iloc[found[inside]][AREA_COLUMNS].reset_index(drop=True)
+    lookup.insert(0, "geoid", centroids["geoid"].to_numpy()[inside])
+    return lookup
+
+
+def aggregate_by_area(master, lookup):
+    """One row per community area with summed counts and weighted metrics."""
+    df = master.merge(lookup, on="geoid", how="inner")
+    out = aggregate_tracts(df, AREA_COLUMNS, master.columns)
+    out.insert(0, "tracts", df.groupby(AREA_COLUMNS).size())
+    return out.reset_index().sort_values("AREA_NUMBE", ignore_index=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Roll tract metrics up to community areas.")
+    parser.add_argument("--centroids", default=CENTROIDS_PATH, help="tract centroid CSV (geoid, lon, lat)")
+    parser.add_argument("--boundaries", default=COMMUNITY_PATH, help="community area boundary CSV (WKT)")
+    args = parser.parse_args(argv)
+
+    areas, geoms = load_geometries(args.boundaries)
+    centroids = load_centroids(args.centroids)
+    master = load_master(exact=True)
+    print("Community areas:", len(areas))
+    print("Tract centroids:", len(centroids))
+
+    with step("transform", rows_in=len(master)) as s:
+        lookup = assign_community_areas(centroids, areas, geoms)
+        in_master = lookup["geoid"].isin(master["geoid"])
+        print(f"Centroids inside a community area: {len(lookup)} ({in_master.sum()} in the master)")
+
+        rollup = aggregate_by_area(master, lookup)
+        s.record(rows_out=len(rollup))
+    empty = len(areas) - len(rollup)
+    if empty:
+        print("Community areas without any tract:", empty)
+
+    print("\n=== Preview of community area rollup ===")
+    print(rollup.head())
+
+    paths = write_table(lookup, LOOKUP_NAME) + write_table(rollup, OUTPUT_NAME)
+    print("\nSaved:", ", ".join(paths))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,33 +1,78 @@
 import pandas as pd
 
-# Load cleaned files
-income = pd.read_csv("./data_processed/median_income_clean.csv")
-transport = pd.read_csv("./data_processed/means_transport_clean.csv")
-vehicles = pd.read_csv("./data_processed/vehicles_available_clean.csv")
-travel = pd.read_csv("./data_processed/travel_time_clean.csv")
+from datastore import MASTER_NAME, read_table, write_table
+from instrument import step
 
-print("Income rows:", len(income))
-print("Transport rows:", len(transport))
-print("Vehicles rows:", len(vehicles))
-print("Travel rows:", len(travel))
+# The income table defines which tracts are in the master; every other table
+# is joined onto it (left join) by GEOID.
+BASE_TABLE = "median_income_clean"
+JOIN_TABLES = [
+    "means_transport_clean",
+    "vehicles_available_clean",
+    "travel_time_clean",
+]
 
-# Convert all geoids to strings
-for df in [income, transport, vehicles, travel]:
-    df["geoid"] = df["geoid"].astype(str)
 
-# Start master
-master = income.copy()
+def index_by_geoid(df, name):
+    """Index a cleaned table by its integer GEOID (11 digit tract FIPS)."""
+    df = df.set_index("geoid")
+    if not df.index.is_unique:
+        dupes = df.index[df.index.duplicated()].unique().tolist()
+        raise ValueError(f"{name} has duplicate geoids: {dupes[:5]}")
+    return df
 
-# Don't duplicate tract_name during merges
-master = master.merge(transport.drop(columns=["tract_name"]), on="geoid", how="left")
 
-master = master.merge(vehicles.drop(columns=["tract_name"]), on="geoid", how="left")
+def join_on_geoid(base, others):
+    """Left-join every table in `others` onto `base` by their GEOID index.
 
-master = master.merge(travel.drop(columns=["tract_name"]), on="geoid", how="left")
+    Each table is aligned to the base index (a no-op when the tracts already
+    match) and all of them are glued together with one concat, so the master
+    is allocated once instead of once per merge. Returns the master and a
+    per-table count of unmatched GEOIDs.
+    """
+    aligned = [base]
+    unmatched = {}
+    for name, df in others.items():
+        # Don't duplicate tract_name during the join
+        df = df.drop(columns=["tract_name"])
+        unmatched[name] = {
+            "missing": int((~base.index.isin(df.index)).sum()),
+            "extra": int((~df.index.isin(base.index)).sum()),
+        }
+        if not df.index.equals(base.index):
+            df = df.reindex(base.index)
+        aligned.append(df)
 
-print("\nMaster shape:", master.shape)
-print("\n=== Preview of master dataset ===")
-print(master.head())
+    master = pd.concat(aligned, axis=1)
+    return master.reset_index(), unmatched
 
-master.to_csv("./data_processed/tract_mobility_master.csv", index=False)
-print("\nSaved master file to: ./data_processed/tract_mobility_master.csv")
+
+def main():
+    # Load cleaned files
+    base = index_by_geoid(read_table(BASE_TABLE, exact=True), BASE_TABLE)
+    others = {name: index_by_geoid(read_table(name, exact=True), name) for name in JOIN_TABLES}
+
+    print(f"{BASE_TABLE} rows:", len(base))
+    for name, df in others.items():
+        print(f"{name} rows:", len(df))
+
+    with step("transform", rows_in=len(base)) as s:
+        master, unmatched = join_on_geoid(base, others)
+        s.record(rows_out=len(master))
+
+    # GEOIDs that did not line up: "missing" tracts get NaN for that table,
+    # "extra" tracts are not in the income table and are dropped.
+    print("\nUnmatched GEOIDs:")
+    for name, counts in unmatched.items():
+        print(f"  {name}: {counts['missing']} missing, {counts['extra']} extra")
+
+    print("\nMaster shape:", master.shape)
+    print("\n=== Preview of master dataset ===")
+    print(master.head())
+
+    paths = write_table(master, MASTER_NAME)
+    print("\nSaved master file to:", ", ".join(paths))
+
+
+if __name__ == "__main__":
+    main()
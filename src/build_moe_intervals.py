@@ -0,0 +1,206 @@
+# build_moe_intervals.py
+#
+# Confidence intervals for the tract metrics from the ACS margins of error
+# (the *_moe columns the cleaners keep).
+# Every estimate is redrawn --replicates times (see uncertainty.py) as one
+# (tracts x replicates) array per variable: incomes and mean commute times
+# directly, the pct_* shares by redrawing their numerator and denominator
+# counts and dividing. From those replicates:
+#   - tract_mobility_intervals: for every tract and metric the bounds that
+#     hold the central --level of the replicates (<metric>_lo, <metric>_hi),
+#     and quartile_agreement, the share of replicates in which the tract
+#     stays in its published income quartile;
+#   - quartile_correlation_intervals: the income vs commute time correlations
+#     of commute_inequality_dashboard.py (overall and within each quartile,
+#     with quartiles re-assigned in every replicate) and their intervals.
+# Redrawing estimates that already carry sampling noise adds more of it,
+# which pulls replicate correlations towards zero, so the correlation
+# intervals take the spread of the replicates around their own mean and
+# center it on the published r (uncertainty.centered_interval).
+# The counts of a table are drawn independently, since the ACS publishes no
+# covariances (the Census Bureau's ratio formulas make the same assumption).
+# Work is split into chunks of at most CHUNK_CELLS draws per variable; with
+# many replicates the chunks run in a process pool.
+
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from acs_loader import MOE_SUFFIX
+from clean_means_transport import SPEC as MEANS_SPEC
+from clean_vehicles_available import SPEC as VEHICLES_SPEC
+from datastore import load_master, write_table
+from income_groups import assign_income_groups, group_labels, replicate_income_groups
+from instrument import step
+from uncertainty import DEFAULT_LEVEL, centered_interval, draw_estimates, grouped_correlations, interval, standard_error
+
+INTERVALS_NAME = "tract_mobility_intervals"
+CORRELATIONS_NAME = "quartile_correlation_intervals"
+
+# Estimates redrawn directly from their own margin of error
+DIRECT_METRICS = ("median_income", "mean_travel_time_min")
+# Shares of two estimates: metric -> (numerator, denominator)
+SHARE_METRICS = {
+    name: (num, den)
+    for spec in (MEANS_SPEC, VEHICLES_SPEC)
+    for name, (num, den) in spec.ratios.items()
+    if isinstance(den, str)
+}
+# Correlated pair and grouping of the commute inequality dashboard
+INCOME, TRAVEL = "median_income", "mean_travel_time_min"
+N_GROUPS = 4
+
+DEFAULT_REPLICATES = 1000
+# Draws per variable in one chunk (8 bytes each)
+CHUNK_CELLS = 500_000
+# Total draws per variable from which the chunks run in a process pool
+PARALLEL_ABOVE = 5_000_000
+
+
+def estimate_columns():
+    """Master columns the simulation reads: estimates and their margins."""
+    names = list(DIRECT_METRICS) + sorted({c for pair in SHARE_METRICS.values() for c in pair})
+    return names + [name + MOE_SUFFIX for name in names]
+
+
+def tract_intervals(columns, n_replicates, level, seed):
+    """Interval of every metric for one slice of tracts.
+
+    columns maps estimate / *_moe column names to that slice's values.
+    Returns metric -> (low, high) arrays.
+    """
+    rng = np.random.default_rng(seed)
+    draws = {}
+
+    def draw(name):
+        if name not in draws:
+            se = standard_error(columns[name + MOE_SUFFIX])
+            draws[name] = draw_estimates(rng, columns[name], se, n_replicates)
+        return draws[name]
+
+    out = {metric: interval(draw(metric), level) for metric in DIRECT_METRICS}
+    for metric, (num, den) in SHARE_METRICS.items():
+        total = draw(den)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # a part can not exceed its total; 0 / 0 replicates are ignored
+            out[metric] = interval(np.minimum(draw(num), total) / total, level)
+        del draws[num]  # each count is the numerator of one share only
+    return out
+
+
+def correlation_replicates(income, travel, published, n_replicates, seed):
+    """Grouped correlations and quartile agreement for one chunk of replicates.
+
+    income / travel are (estimate, standard error) pairs for all tracts and
+    published their income group codes. Returns the (N_GROUPS + 1, n) r
+    array and, per tract, the number of replicates in its published group.
+    """
+    rng = np.random.default_rng(seed)
+    x = draw_estimates(rng, *income, n_replicates)
+    y = draw_estimates(rng, *travel, n_replicates)
+    codes = replicate_income_groups(x, N_GROUPS)
+    return grouped_correlations(x, y, codes, N_GROUPS), (codes == published[:, None]).sum(axis=1)
+
+
+def run_tasks(fn, tasks, jobs):
+    """fn(*task) for every task, in a process pool when jobs > 1."""
+    if jobs == 1:
+        return [fn(*task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        return list(pool.map(fn, *zip(*tasks)))
+
+
+def simulate_intervals(master, n_replicates, level, seed, jobs):
+    """tract_mobility_intervals without the quartile agreement column.
+
+    seed is a numpy SeedSequence; every chunk gets its own child stream.
+    """
+    columns = {c: master[c].to_numpy(dtype="float64") for c in estimate_columns()}
+    step = max(1, CHUNK_CELLS // n_replicates)
+    starts = range(0, len(master), step)
+    tasks = [
+        ({c: v[start : start + step] for c, v in columns.items()}, n_replicates, level, child)
+        for start, child in zip(starts, seed.spawn(len(starts)))
+    ]
+    parts = run_tasks(tract_intervals, tasks, jobs)
+
+    out = pd.DataFrame({"geoid": master["geoid"].to_numpy()})
+    for metric in list(DIRECT_METRICS) + list(SHARE_METRICS):
+        out[metric] = master[metric].to_numpy()
+        out[f"{metric}_lo"] = np.concatenate([part[metric][0] for part in parts])
+        out[f"{metric}_hi"] = np.concatenate([part[metric][1] for part in parts])
+    return out
+
+
+def simulate_correlations(master, n_replicates, level, seed, jobs):
+    """(correlation table, quartile agreement per master row)."""
+    complete = master[[INCOME, TRAVEL]].notna().all(axis=1).to_numpy()
+    df = master[complete]
+    published = assign_income_groups(df[INCOME], n_groups=N_GROUPS).cat.codes.to_numpy()
+    income = (df[INCOME].to_numpy(dtype="float64"), standard_error(df[INCOME + MOE_SUFFIX]))
+    travel = (df[TRAVEL].to_numpy(dtype="float64"), standard_error(df[TRAVEL + MOE_SUFFIX]))
+
+    step = max(1, CHUNK_CELLS // max(len(df), 1))
+    sizes = [min(step, n_replicates - start) for start in range(0, n_replicates, step)]
+    tasks = [(income, travel, published, size, child) for size, child in zip(sizes, seed.spawn(len(sizes)))]
+    parts = run_tasks(correlation_replicates, tasks, jobs)
+
+    r = np.concatenate([part[0] for part in parts], axis=1)
+    estimate = grouped_correlations(income[0][:, None], travel[0][:, None], published, N_GROUPS)[:, 0]
+    low, high = centered_interval(r, estimate, level, axis=1)
+    table = pd.DataFrame(
+        {"group": ["Overall"] + group_labels(N_GROUPS), "r": estimate, "r_lo": low, "r_hi": high}
+    )
+
+    agreement = np.full(len(master), np.nan)
+    agreement[complete] = sum(part[1] for part in parts) / n_replicates
+    return table, agreement
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate confidence intervals from the ACS margins of error.")
+    parser.add_argument(
+        "--replicates", type=int, default=DEFAULT_REPLICATES, help=f"draws per estimate (default {DEFAULT_REPLICATES})"
+    )
+    parser.add_argument("--level", type=float, default=DEFAULT_LEVEL, help="confidence level (default 0.9, as the ACS)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed (results do not depend on --jobs)")
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=None,
+        help=f"worker processes (default: all CPUs above {PARALLEL_ABOVE:,} draws per variable, else 1)",
+    )
+    args = parser.parse_args(argv)
+
+    master = load_master(columns=["geoid", *SHARE_METRICS] + estimate_columns(), exact=True)
+    jobs = args.jobs
+    if jobs is None:
+        jobs = os.cpu_count() if len(master) * args.replicates > PARALLEL_ABOVE else 1
+    print("Tracts:", len(master))
+    print(f"Replicates: {args.replicates}  (level {args.level:.0%}, {jobs} process(es))")
+
+    # Independent random streams per chunk, fixed by --seed and the chunking
+    tract_seed, replicate_seed = np.random.SeedSequence(args.seed).spawn(2)
+    with step("transform", rows_in=len(master)):
+        intervals = simulate_intervals(master, args.replicates, args.level, tract_seed, jobs)
+        correlations, agreement = simulate_correlations(master, args.replicates, args.level, replicate_seed, jobs)
+        intervals["quartile_agreement"] = agreement
+
+    print("\n=== Income vs commute time correlation ===")
+    print(correlations.to_string(index=False, float_format="{:.3f}".format))
+    shares = intervals["quartile_agreement"].dropna()
+    print(f"\nTracts in their published quartile in < 90% of replicates: {(shares < 0.9).mean():.1%}")
+    widths = {m: (intervals[f"{m}_hi"] - intervals[f"{m}_lo"]).median() for m in SHARE_METRICS}
+    print("Median interval width of the shares:")
+    for metric, width in widths.items():
+        print(f"  {metric:<28} {width:.3f}")
+
+    paths = write_table(intervals, INTERVALS_NAME) + write_table(correlations, CORRELATIONS_NAME)
+    print("\nSaved:", ", ".join(paths))
+
+
+if __name__ == "__main__":
+    main()
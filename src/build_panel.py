@@ -0,0 +1,231 @@
+# build_panel.py
+#
+# Multi-year panel of the tract master, one ACS extract per year.
+# Raw files go in data_raw/panel/<year>/ under the same names as the
+# single-year files in data_raw/ (median_income.csv, means_transport.csv,
+# vehicles_available.csv, travel_time.csv). Every (year, table) file is
+# cleaned by the single-year cleaner's code, one process pool worker per
+# file; each year's tables are then joined as in build_master_tracts.py and
+# written as its own partition, data_processed/panel/year=<year>/, which the
+# dashboards read with --year.
+#
+# GEOIDs are harmonized across vintages: tract rows are recognised by both
+# the current and the older GEO_ID prefix (acs_loader.py), and years before
+# 2020, which use 2010 census tracts, are moved onto 2020 tracts with
+# data_raw/panel/tract_crosswalk.csv when it exists (aggregation.py:
+# counts apportioned by the crosswalk weights, shares and averages
+# re-weighted). The Census Bureau's 2020 to 2010 tract relationship file
+# can be used as the crosswalk as is.
+#
+# A year is processed again only when its raw files (or, for harmonized
+# years, the crosswalk) or the cleaning code changed since its partition was
+# written (see manifest.json next to the partitions), so adding a year
+# processes just that year's files.
+
+import argparse
+import json
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import clean_means_transport
+import clean_median_income
+import clean_travel_time
+import clean_vehicles_available
+from acs_loader import MOE_SUFFIX
+from aggregation import aggregate_tracts, is_count
+from build_master_tracts import BASE_TABLE, JOIN_TABLES, index_by_geoid, join_on_geoid
+from datastore import MASTER_NAME, PANEL_DIR, atomic_output, file_digest, partition_name, table_files, write_table
+from paths import PROCESSED_DIR, RAW_DIR
+
+PANEL_RAW_DIR = os.path.join(RAW_DIR, "panel")
+CROSSWALK_NAME = "tract_crosswalk.csv"
+MANIFEST_PATH = os.path.join(PROCESSED_DIR, PANEL_DIR, "manifest.json")
+
+# First ACS year on 2020 census tracts; earlier years are harmonized
+TRACT_VINTAGE_CHANGE = 2020
+
+# Cleaned table -> (raw file name, cleaning function)
+TABLES = {
+    "median_income_clean": ("median_income.csv", clean_median_income.clean),
+    "means_transport_clean": ("means_transport.csv", clean_means_transport.clean),
+    "vehicles_available_clean": ("vehicles_available.csv", clean_vehicles_available.clean),
+    "travel_time_clean": ("travel_time.csv", clean_travel_time.clean),
+}
+
+# Code that decides a partition's content (see code_digest)
+CODE_FILES = (
+    "build_panel.py",
+    "build_master_tracts.py",
+    "acs_loader.py",
+    "aggregation.py",
+    "commute_distribution.py",
+    *(f"{fn.__module__}.py" for _, fn in TABLES.values()),
+)
+
+
+def find_years(raw_dir):
+    """Years (sub-directories named like 2019) that have every raw table."""
+    years = []
+    if not os.path.isdir(raw_dir):
+        return years
+    for entry in sorted(os.listdir(raw_dir)):
+        if not (entry.isdigit() and len(entry) == 4):
+            continue
+        missing = [f for f, _ in TABLES.values() if not os.path.exists(os.path.join(raw_dir, entry, f))]
+        if missing:
+            print(f"Skipping {entry}: missing {', '.join(missing)}")
+        else:
+            years.append(int(entry))
+    return years
+
+
+def code_digest():
+    src = os.path.dirname(os.path.abspath(__file__))
+    return "".join(file_digest(os.path.join(src, name)) or "-" for name in CODE_FILES)
+
+
+def load_crosswalk(path):
+    """2010 -> 2020 tract crosswalk as geoid_from, geoid_to, weight.
+
+    Accepts either those columns or the Census Bureau's tract relationship
+    file (pipe-delimited GEOID_TRACT_10 / GEOID_TRACT_20 with land areas),
+    where the weight is the share of the 2010 tract's land in each 2020 tract.
+    """
+    df = pd.read_csv(path, sep=None, engine="python", dtype=str)
+    if "GEOID_TRACT_20" in df.columns:
+        land = pd.to_numeric(df["AREALAND_PART"])
+        total = pd.to_numeric(df["AREALAND_TRACT_10"])
+        df = pd.DataFrame(
+            {"geoid_from": df["GEOID_TRACT_10"], "geoid_to": df["GEOID_TRACT_20"], "weight": land / total}
+        )
+    out = pd.DataFrame(
+        {
+            "geoid_from": pd.to_numeric(df["geoid_from"]).astype("int64"),
+            "geoid_to": pd.to_numeric(df["geoid_to"]).astype("int64"),
+            "weight": pd.to_numeric(df["weight"]).astype("float64"),
+        }
+    )
+    return out[out["weight"] > 0]
+
+
+def tract_label(geoid):
+    """ACS style tract name from the GEOID ("Census Tract 102.01")."""
+    code = geoid % 1_000_000
+    suffix = code % 100
+    return f"Census Tract {code // 100}" + (f".{suffix:02d}" if suffix else "")
+
+
+def harmonize_tracts(master, crosswalk):
+    """Move one year's master from 2010 onto 2020 census tracts.
+
+    Apportioned counts are rounded back to whole numbers; 2020 tracts get
+    ACS style names built from their GEOIDs. The result has the columns of
+    `master`, so every panel partition has the same schema: the margins of
+    averaged metrics are approximated (see aggregation.py), and a column that
+    cannot be aggregated is left empty.
+    """
+    df = master.merge(crosswalk, left_on="geoid", right_on="geoid_from", how="inner")
+    out = aggregate_tracts(df, "geoid_to", master.columns, share="weight")
+    for column in out.columns:
+        # counts and their margins
+        if is_count(column.removesuffix(MOE_SUFFIX)) and out[column].notna().all():
+            out[column] = out[column].round().astype("int64")
+    out = out.rename_axis("geoid").reset_index()
+    out.insert(1, "tract_name", out["geoid"].map(tract_label))
+    return out.reindex(columns=master.columns)
+
+
+def clean_file(year, table, path):
+    """Pool task: one cleaned (year, table) frame."""
+    _, clean = TABLES[table]
+    return year, table, clean(path)
+
+
+def build_year(year, tables, crosswalk):
+    """Join one year's cleaned tables into its master partition frame."""
+    base = index_by_geoid(tables[BASE_TABLE], f"{year} {BASE_TABLE}")
+    others = {name: index_by_geoid(tables[name], f"{year} {name}") for name in JOIN_TABLES}
+    master, unmatched = join_on_geoid(base, others)
+    for name, counts in unmatched.items():
+        if counts["missing"] or counts["extra"]:
+            print(f"  {year} {name}: {counts['missing']} missing, {counts['extra']} extra GEOIDs")
+
+    if year < TRACT_VINTAGE_CHANGE and crosswalk is not None:
+        before = len(master)
+        master = harmonize_tracts(master, crosswalk)
+        print(f"  {year}: {before} tracts (2010) -> {len(master)} tracts (2020)")
+    master.insert(1, "year", year)
+    return master
+
+
+def load_manifest():
+    if not os.path.exists(MANIFEST_PATH):
+        return {}
+    with open(MANIFEST_PATH) as fh:
+        return json.load(fh)
+
+
+def save_manifest(manifest):
+    os.makedirs(os.path.dirname(MANIFEST_PATH), exist_ok=True)
+    with atomic_output(MANIFEST_PATH) as tmp:
+        with open(tmp, "w") as fh:
+            json.dump(manifest, fh, indent=2, sort_keys=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the multi-year tract panel, one partition per year.")
+    parser.add_argument("--raw-dir", default=PANEL_RAW_DIR, help="directory with one sub-directory per ACS year")
+    parser.add_argument("--jobs", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--force", action="store_true", help="rebuild every year, not only changed ones")
+    args = parser.parse_args(argv)
+
+    years = find_years(args.raw_dir)
+    if not years:
+        print("No complete ACS years in", args.raw_dir)
+        return
+    crosswalk_path = os.path.join(args.raw_dir, CROSSWALK_NAME)
+    crosswalk = load_crosswalk(crosswalk_path) if os.path.exists(crosswalk_path) else None
+    if crosswalk is None and years[0] < TRACT_VINTAGE_CHANGE <= years[-1]:
+        print(f"Warning: no {CROSSWALK_NAME}; years before {TRACT_VINTAGE_CHANGE} keep their 2010 tract GEOIDs")
+
+    # What each partition is built from; unchanged years are not rebuilt.
+    code = code_digest()
+    sources = {}
+    for year in years:
+        files = [os.path.join(args.raw_dir, str(year), f) for f, _ in TABLES.values()]
+        if year < TRACT_VINTAGE_CHANGE and crosswalk is not None:
+            files.append(crosswalk_path)
+        sources[year] = {"code": code, **{os.path.relpath(p, args.raw_dir): file_digest(p) for p in files}}
+    manifest = load_manifest()
+    todo = [
+        y
+        for y in years
+        if args.force
+        or manifest.get(str(y)) != sources[y]
+        or not all(os.path.exists(p) for p in table_files(partition_name(MASTER_NAME, y)))
+    ]
+    print("ACS years:", ", ".join(map(str, years)))
+    print("Up to date:", ", ".join(str(y) for y in years if y not in todo) or "-")
+    if not todo:
+        return
+
+    # One worker per (year, table) file
+    tasks = [(y, table, os.path.join(args.raw_dir, str(y), raw)) for y in todo for table, (raw, _) in TABLES.items()]
+    cleaned = defaultdict(dict)
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        for year, table, df in pool.map(clean_file, *zip(*tasks)):
+            cleaned[year][table] = df
+
+    for year in todo:
+        master = build_year(year, cleaned.pop(year), crosswalk)
+        paths = write_table(master, partition_name(MASTER_NAME, year))
+        manifest[str(year)] = sources[year]
+        save_manifest(manifest)
+        print(f"{year}: {master.shape[0]} tracts, {master.shape[1]} columns -> {', '.join(paths)}")
+
+
+if __name__ == "__main__":
+    main()
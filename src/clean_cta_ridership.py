@@ -1,58 +1,348 @@
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+
 import pandas as pd
 
-file_path = "./data_raw/cta_entries.csv"
+from datastore import atomic_output, file_digest, write_table
+from instrument import step
+from paths import PROCESSED_DIR, RAW_DIR
+
+INPUT_PATH = os.path.join(RAW_DIR, "cta_entries.csv")
+OUTPUT_NAME = "cta_ridership_clean"
+
+# Running totals for incremental updates (see update_running_totals)
+TOTALS_PATH = os.path.join(PROCESSED_DIR, "cta_ridership_totals.csv")
+STATE_PATH = os.path.join(PROCESSED_DIR, "cta_ridership_state.json")
+
+STATION_KEYS = ["station_id", "station_name"]
+PERIOD_KEYS = STATION_KEYS + ["period"]
+RAW_COLUMNS = ["station_id", "stationname", "date", "daytype", "rides"]
+DATE_FORMAT = "%m/%d/%Y"
+
+DEFAULT_YEAR = 2023
+DEFAULT_CHUNKSIZE = 500_000
+
+# CTA day types: W = weekday, A = Saturday, U = Sunday/holiday
+WEEKDAY_TYPES = ["W"]
+WEEKEND_TYPES = ["A", "U"]
+
+
+def parse_chunk(chunk, start=None, end=None):
+    """Parse one raw chunk and keep only valid rows with start <= date <= end.
+
+    Either bound may be None for an open-ended range.
+    """
+    # Dates are MM/DD/YYYY in the CTA export; an explicit format avoids
+    # per-row format inference. Unparseable dates become NaT and are dropped.
+    chunk = chunk.rename(columns={"stationname": "station_name"})
+    chunk["date"] = pd.to_datetime(chunk["date"], format=DATE_FORMAT, errors="coerce")
+    chunk["rides"] = pd.to_numeric(chunk["rides"], errors="coerce")
+
+    keep = chunk["date"].notna() & chunk["rides"].notna()
+    if start is not None:
+        keep &= chunk["date"] >= start
+    if end is not None:
+        keep &= chunk["date"] < end + pd.Timedelta(days=1)
+    chunk = chunk[keep].copy()
+    chunk["rides"] = chunk["rides"].astype("int64")
+    return chunk
+
+
+def station_totals(df, by_period=False):
+    """Sum rides and day counts per station in a single groupby pass.
 
-# Load raw data
-df = pd.read_csv(file_path)
-print("Raw shape:", df.shape)
+    Weekday and weekend rides are split into their own columns first
+    (rides where the day type matches, 0 otherwise), so one vectorized sum
+    gives every total needed for the averages. With by_period=True the
+    totals are also split by calendar month (period = YYYYMM).
+    """
+    rides = df["rides"]
+    weekday = df["daytype"].isin(WEEKDAY_TYPES)
+    weekend = df["daytype"].isin(WEEKEND_TYPES)
 
-# clean column names
-df["date"] = pd.to_datetime(df["date"], errors="coerce")
-df = df.dropna(subset=["date"])
+    parts = pd.DataFrame(
+        {
+            "station_id": df["station_id"],
+            "station_name": df["station_name"],
+            "rides_sum": rides,
+            "days": 1,
+            "weekday_sum": rides.where(weekday, 0),
+            "weekday_days": weekday.astype("int64"),
+            "weekend_sum": rides.where(weekend, 0),
+            "weekend_days": weekend.astype("int64"),
+        }
+    )
+    keys = STATION_KEYS
+    if by_period:
+        parts.insert(2, "period", df["date"].dt.year * 100 + df["date"].dt.month)
+        keys = PERIOD_KEYS
+    return parts.groupby(keys).sum().reset_index()
+
+
+def merge_totals(*frames, keys=STATION_KEYS):
+    """Combine total frames that may contain the same station (and period)."""
+    frames = [f for f in frames if f is not None and len(f)]
+    if not frames:
+        return None
+    return pd.concat(frames, ignore_index=True).groupby(keys).sum().reset_index()
 
-# convert rides to numeric
-df["rides"] = pd.to_numeric(df["rides"], errors="coerce")
-df = df.dropna(subset=["rides"])
-df["rides"] = df["rides"].astype(int)
 
-# filter to 2023 only
-df = df[df["date"].dt.year == 2023]
-print("After filtering 2023:", df.shape)
+class ByteRange(io.RawIOBase):
+    """Read-only view of the next `length` bytes of an open binary file."""
 
-# Rename Station Name column
-df.rename(columns={"stationname": "station_name"}, inplace=True)
+    def __init__(self, fh, length):
+        self.fh = fh
+        self.remaining = length
 
+    def readable(self):
+        return True
 
-# Aggregate to get total rides, avg daily, avg weekday, avg weekend
-def avg_weekday(group):
-    return group[group["daytype"] == "W"]["rides"].mean()
+    def readinto(self, buffer):
+        data = self.fh.read(min(len(buffer), self.remaining))
+        buffer[: len(data)] = data
+        self.remaining -= len(data)
+        return len(data)
 
 
-def avg_weekend(group):
-    return group[group["daytype"].isin(["A", "U"])]["rides"].mean()
+def complete_lines_end(path):
+    """Byte position just after the last newline of the file (0 if there is none)."""
+    with open(path, "rb") as fh:
+        end = fh.seek(0, os.SEEK_END)
+        while end > 0:
+            start = max(0, end - (1 << 16))
+            fh.seek(start)
+            newline = fh.read(end - start).rfind(b"\n")
+            if newline >= 0:
+                return start + newline + 1
+            end = start
+    return 0
 
 
-agg = (
-    df.groupby(["station_id", "station_name"])
-    .apply(
-        lambda g: pd.Series(
-            {
-                "total_rides": g["rides"].sum(),
-                "avg_rides_daily": g["rides"].mean(),
-                "avg_weekday": avg_weekday(g),
-                "avg_weekend": avg_weekend(g),
-            }
-        )
+def read_raw_chunks(path, chunksize, offset=0, stop=None):
+    """Yield raw chunks of the entries file, from byte `offset` up to byte `stop`.
+
+    A non-zero offset must point at the start of a line and `stop` at the
+    end of one; the header is taken from the first line of the file so
+    column names still apply.
+    """
+    options = dict(
+        usecols=RAW_COLUMNS,
+        dtype={"station_id": "int64", "stationname": "str", "date": "str", "daytype": "category", "rides": "str"},
+        chunksize=chunksize,
     )
-    .reset_index()
-)
+    if not offset and stop is None:
+        yield from pd.read_csv(path, **options)
+        return
+
+    with open(path, "rb") as fh:
+        names = next(csv.reader([fh.readline().decode("utf-8-sig")]))
+        start = max(offset, fh.tell())
+        stop = os.path.getsize(path) if stop is None else stop
+        if start >= stop:
+            return
+        fh.seek(start)
+        rows = io.BufferedReader(ByteRange(fh, stop - start))
+        yield from pd.read_csv(rows, header=None, names=names, **options)
+
+
+def stream_station_totals(path, start, end, chunksize=DEFAULT_CHUNKSIZE, by_period=False, offset=0, stop=None):
+    """Fold the raw entries file into per-station totals, one chunk at a time.
+
+    Rows outside [start, end] are dropped inside each chunk, and each chunk is
+    reduced to one row per station before it is merged into the running
+    totals, so peak memory depends on the number of stations and the chunk
+    size, not on the length of the history.
+
+    Returns the totals and the latest date that was kept (None if no rows).
+    """
+    keys = PERIOD_KEYS if by_period else STATION_KEYS
+    totals = None
+    last_date = None
+    rows_read = rows_kept = 0
+    with step("load") as s:
+        for chunk in read_raw_chunks(path, chunksize, offset=offset, stop=stop):
+            rows_read += len(chunk)
+            chunk = parse_chunk(chunk, start, end)
+            rows_kept += len(chunk)
+            if len(chunk):
+                chunk_last = chunk["date"].max()
+                last_date = chunk_last if last_date is None else max(last_date, chunk_last)
+            totals = merge_totals(totals, station_totals(chunk, by_period), keys=keys)
+
+        print(f"Rows read: {rows_read:,}  kept: {rows_kept:,}")
+        if totals is None:
+            empty = pd.DataFrame(columns=STATION_KEYS + ["date", "daytype", "rides"])
+            empty["date"] = pd.to_datetime(empty["date"])
+            totals = station_totals(empty, by_period)
+        s.record(rows_in=rows_read, rows_out=len(totals))
+    return totals, last_date
+
+
+def date_range(args):
+    """Resolve --year / --start / --end into an inclusive (start, end) pair."""
+    start = pd.Timestamp(args.start) if args.start else pd.Timestamp(year=args.year, month=1, day=1)
+    end = pd.Timestamp(args.end) if args.end else pd.Timestamp(year=args.year, month=12, day=31)
+    if end < start:
+        raise ValueError(f"end date {end.date()} is before start date {start.date()}")
+    return start, end
+
+
+def load_running_totals():
+    """Load the persisted per-station, per-month totals and their state.
+
+    Returns (totals or None, state dict). The state holds the byte offset of
+    the raw file consumed so far (the end of its last complete line), the
+    sha256 of those bytes, the sha256 of the totals file and the latest date
+    counted. Totals that do not match their state (a run interrupted between
+    writing the two) are discarded.
+    """
+    if not os.path.exists(STATE_PATH):
+        return None, {}
+    with open(STATE_PATH) as fh:
+        state = json.load(fh)
+    if file_digest(TOTALS_PATH) != state.get("totals_digest"):
+        print("Running totals do not match their state; rebuilding them.")
+        return None, {}
+    totals = pd.read_csv(TOTALS_PATH, dtype={"station_name": "str"})
+    return totals, state
+
+
+def consumed_prefix_unchanged(path, state):
+    """Whether the first state["offset"] bytes of the raw file are the ones already counted.
+
+    The offset must still end a line, and the bytes up to it must have the
+    stored sha256; a replaced file (re-sorted, backfilled, re-downloaded)
+    fails the check even when it did not shrink.
+    """
+    offset = state.get("offset", 0)
+    if not offset:
+        return True
+    if offset > os.path.getsize(path):
+        return False
+    with open(path, "rb") as fh:
+        fh.seek(offset - 1)
+        if fh.read(1) != b"\n":
+            return False
+    return file_digest(path, limit=offset) == state.get("fingerprint")
+
+
+def update_running_totals(path, chunksize=DEFAULT_CHUNKSIZE):
+    """Merge the rows appended to the raw file since the last run into the running totals.
+
+    Only the lines after the stored offset are parsed, after checking that
+    the part of the file before it is byte for byte the one already counted.
+    If it is not (the file was replaced), the totals are rebuilt from the
+    whole file. Reading stops at the last complete line, so a row that is
+    still being written is counted by the next run instead.
+    """
+    totals, state = load_running_totals()
+    if not consumed_prefix_unchanged(path, state):
+        print("Raw file changed before the last consumed line; rebuilding the totals from the start.")
+        totals, state = None, {}
+    offset = state.get("offset", 0)
+    stop = complete_lines_end(path)
+    print("Counted through:", state.get("high_water_mark") or "nothing yet (first run)")
+
+    new, last_date = stream_station_totals(
+        path, None, None, chunksize=chunksize, by_period=True, offset=offset, stop=stop
+    )
+    totals = merge_totals(totals, new, keys=PERIOD_KEYS)
+    if totals is None:
+        totals = new
+    hwm = state.get("high_water_mark")
+    if last_date is not None:
+        hwm = max(hwm or "", last_date.date().isoformat())
+
+    # Totals first, then the state that points past them; the state records
+    # the totals' digest, so totals without a matching state are rebuilt.
+    with atomic_output(TOTALS_PATH) as tmp:
+        totals.to_csv(tmp, index=False)
+    state = {
+        "high_water_mark": hwm,
+        "offset": stop,
+        "fingerprint": file_digest(path, limit=stop),
+        "totals_digest": file_digest(TOTALS_PATH),
+    }
+    with atomic_output(STATE_PATH) as tmp:
+        with open(tmp, "w") as fh:
+            json.dump(state, fh, indent=2)
+    print("Running totals updated through", state["high_water_mark"])
+    return totals
+
+
+def totals_for_range(period_totals, start, end):
+    """Collapse per-month totals into per-station totals for [start, end].
+
+    Periods are whole calendar months, so the range must start on the first
+    and end on the last day of a month.
+    """
+    if start.day != 1 or not end.is_month_end:
+        raise ValueError("incremental mode needs a date range made of whole months")
+    first = start.year * 100 + start.month
+    last = end.year * 100 + end.month
+    in_range = period_totals[period_totals["period"].between(first, last)]
+    totals = merge_totals(in_range.drop(columns="period"))
+    if totals is None:
+        totals = period_totals.drop(columns="period").iloc[:0]
+    return totals
+
+
+def summarize_stations(totals):
+    """Turn per-station sums and counts into the published ridership columns."""
+    # Averages are sum / count, which is exactly what Series.mean() computes
+    # for integer rides; 0 / 0 gives NaN for stations without such days.
+    out = totals[STATION_KEYS].copy()
+    out["total_rides"] = totals["rides_sum"].astype("float64")
+    out["avg_rides_daily"] = totals["rides_sum"] / totals["days"]
+    out["avg_weekday"] = totals["weekday_sum"] / totals["weekday_days"]
+    out["avg_weekend"] = totals["weekend_sum"] / totals["weekend_days"]
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Clean CTA daily station entries.")
+    parser.add_argument("--year", type=int, default=DEFAULT_YEAR, help="calendar year to keep")
+    parser.add_argument("--start", help="first date to keep (YYYY-MM-DD), overrides --year")
+    parser.add_argument("--end", help="last date to keep (YYYY-MM-DD), overrides --year")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE)
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="only read rows appended since the last run and update the running totals",
+    )
+    args = parser.parse_args(argv)
+
+    try:
+        start, end = date_range(args)
+    except ValueError as exc:
+        parser.error(str(exc))
+    if args.incremental and (start.day != 1 or not end.is_month_end):
+        parser.error("--incremental needs a date range made of whole months (--start on a 1st, --end on a month's last day)")
+    if args.incremental:
+        period_totals = update_running_totals(INPUT_PATH, chunksize=args.chunksize)
+        totals = totals_for_range(period_totals, start, end)
+    else:
+        totals, _ = stream_station_totals(INPUT_PATH, start, end, chunksize=args.chunksize)
+
+    # Aggregate to get total rides, avg daily, avg weekday, avg weekend
+    with step("transform", rows_in=len(totals)) as s:
+        agg = summarize_stations(totals)
+        s.record(rows_out=len(agg))
+
+    # OUTPUT
+    print("\n=== PREVIEW OF CLEANED DATA ===")
+    print(agg.head())
+    print(f"\nStations processed: {agg.shape[0]}")
 
+    # Save cleaned file
+    paths = write_table(agg, OUTPUT_NAME)
+    print("\nSaved cleaned file to:", ", ".join(paths))
+    return 0
 
-# OUTPUT
-print("\n=== PREVIEW OF CLEANED DATA ===")
-print(agg.head())
-print(f"\nStations processed: {agg.shape[0]}")
 
-# Save cleaned file
-agg.to_csv("./data_processed/cta_ridership_clean.csv", index=False)
-print("\nSaved cleaned file to: ./data_processed/cta_ridership_clean.csv")
+if __name__ == "__main__":
+    sys.exit(main())
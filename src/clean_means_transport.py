@@ -1,75 +1,50 @@
-import pandas as pd
+import os
 
-# Load raw file
-path = "./data_raw/means_transport.csv"
-df = pd.read_csv(path)
+from acs_loader import AcsTableSpec, load_acs_table
+from datastore import write_table
+from paths import RAW_DIR
 
-print("Raw shape:", df.shape)
+INPUT_PATH = os.path.join(RAW_DIR, "means_transport.csv")
+OUTPUT_NAME = "means_transport_clean"
 
-# Drop the Unnamed column at the end
-df = df.loc[:, ~df.columns.str.contains("Unnamed")]
-print("After dropping Unnamed:", df.shape)
+# B08301: means of transportation to work
+# Percentages are mode shares of all workers in the tract.
+SPEC = AcsTableSpec(
+    table_id="B08301",
+    variables={
+        "B08301_001E": "workers_total",
+        "B08301_002E": "workers_car",
+        "B08301_010E": "workers_public",
+        "B08301_018E": "workers_walk",
+        "B08301_019E": "workers_other",
+        "B08301_021E": "workers_home",
+    },
+    ratios={
+        "pct_car": ("workers_car", "workers_total"),
+        "pct_public": ("workers_public", "workers_total"),
+        "pct_walk": ("workers_walk", "workers_total"),
+        "pct_other": ("workers_other", "workers_total"),
+        "pct_home": ("workers_home", "workers_total"),
+    },
+)
 
-# Remove non-tract rows
-# Row 0 is "Geography", row 1 is "0100000US" (USA)
-df = df[df["GEO_ID"] != "Geography"].copy()
-df = df[df["GEO_ID"] != "0100000US"].copy()
 
-# keeping only census tracts (IDs that start with 1400000US...)
-df = df[df["GEO_ID"].str.startswith("1400000US")].copy()
-print("After keeping only tracts:", df.shape)
+def clean(path=INPUT_PATH):
+    """Cleaned tract table from one raw ACS extract (also used by build_panel.py)."""
+    return load_acs_table(path, SPEC)
 
-# Clean GEOID
-df["geoid"] = df["GEO_ID"].str.replace("1400000US", "", regex=False)
 
-# Rename important columns to readable names
-rename_map = {
-    "NAME": "tract_name",
-    "B08301_001E": "workers_total",
-    "B08301_002E": "workers_car",
-    "B08301_010E": "workers_public",
-    "B08301_018E": "workers_walk",
-    "B08301_019E": "workers_other",
-    "B08301_021E": "workers_home",
-}
-df = df.rename(columns=rename_map)
+def main():
+    df_clean = clean()
+    print("Tracts kept:", df_clean.shape)
 
-# Keep only the columns we care abou
-cols_keep = [
-    "geoid",
-    "tract_name",
-    "workers_total",
-    "workers_car",
-    "workers_public",
-    "workers_walk",
-    "workers_other",
-    "workers_home",
-]
-df_clean = df[cols_keep].copy()
+    paths = write_table(df_clean, OUTPUT_NAME)
 
-# Ensure counts are numeric
-for col in [
-    "workers_total",
-    "workers_car",
-    "workers_public",
-    "workers_walk",
-    "workers_other",
-    "workers_home",
-]:
-    df_clean[col] = pd.to_numeric(df_clean[col], errors="coerce")
+    print("\n=== Preview of cleaned data ===")
+    print(df_clean.head())
 
-# Compute percentages (mode shares) for each transport mode
-df_clean["pct_car"] = df_clean["workers_car"] / df_clean["workers_total"]
-df_clean["pct_public"] = df_clean["workers_public"] / df_clean["workers_total"]
-df_clean["pct_walk"] = df_clean["workers_walk"] / df_clean["workers_total"]
-df_clean["pct_other"] = df_clean["workers_other"] / df_clean["workers_total"]
-df_clean["pct_home"] = df_clean["workers_home"] / df_clean["workers_total"]
+    print("\nSaved cleaned file to:", ", ".join(paths))
 
-# Save cleaned file
-output = "./data_processed/means_transport_clean.csv"
-df_clean.to_csv(output, index=False)
 
-print("\n=== Preview of cleaned data ===")
-print(df_clean.head())
-
-print("\nSaved cleaned file:", output)
+if __name__ == "__main__":
+    main()
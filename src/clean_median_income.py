@@ -1,40 +1,34 @@
-import pandas as pd
-
-INPUT_PATH = "./data_raw/median_income.csv"
-OUTPUT_PATH = "./data_processed/median_income_clean.csv"
-
-df = pd.read_csv(INPUT_PATH)
-print("Raw shape:", df.shape)
-
-# Drop unnamed metadata columns
-df = df.loc[:, ~df.columns.str.contains("^Unnamed")]
-print("After dropping Unnamed:", df.shape)
-
-# Keep only census tracts
-df = df[df["GEO_ID"].str.startswith("1400000US")].copy()
-print("After keeping only tracts:", df.shape)
-
-# Rename columns to friendlier names
-df.rename(
-    columns={
-        "GEO_ID": "geoid",
-        "NAME": "tract_name",
-        "B19013_001E": "median_income",
-    },
-    inplace=True,
+import os
+
+from acs_loader import AcsTableSpec, load_acs_table
+from datastore import write_table
+from paths import RAW_DIR
+
+INPUT_PATH = os.path.join(RAW_DIR, "median_income.csv")
+OUTPUT_NAME = "median_income_clean"
+
+# B19013: median household income in the past 12 months
+SPEC = AcsTableSpec(
+    table_id="B19013",
+    variables={"B19013_001E": "median_income"},
 )
 
-# make geoid format match other tables by removing leading "1400000US"
-df["geoid"] = df["geoid"].str.replace("1400000US", "", regex=False)
 
-# Keep only needed columns
-df = df[["geoid", "tract_name", "median_income"]]
+def clean(path=INPUT_PATH):
+    """Cleaned tract table from one raw ACS extract (also used by build_panel.py)."""
+    return load_acs_table(path, SPEC)
+
+
+def main():
+    df = clean()
+    print("Tracts kept:", df.shape)
+
+    print("\n=== Preview of cleaned income data ===")
+    print(df.head())
 
-# Ensure numeric income
-df["median_income"] = pd.to_numeric(df["median_income"], errors="coerce")
+    paths = write_table(df, OUTPUT_NAME)
+    print("\nSaved cleaned file to:", ", ".join(paths))
 
-print("\n=== Preview of cleaned income data ===")
-print(df.head())
 
-df.to_csv(OUTPUT_PATH, index=False)
-print("\nSaved cleaned file to:", OUTPUT_PATH)
+if __name__ == "__main__":
+    main()
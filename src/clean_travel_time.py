@@ -1,40 +1,44 @@
-import pandas as pd
+import os
 
-# File path
-file_path = "./data_raw/travel_time.csv"
+from acs_loader import AcsTableSpec, load_acs_table
+from commute_distribution import BUCKETS, commute_distribution
+from datastore import write_table
+from instrument import step
+from paths import RAW_DIR
 
-# Read raw file
-df = pd.read_csv(file_path)
-print("Raw shape:", df.shape)
+INPUT_PATH = os.path.join(RAW_DIR, "travel_time.csv")
+OUTPUT_NAME = "travel_time_clean"
 
-# Drop any unnamed columns
-df = df.loc[:, ~df.columns.str.contains("^Unnamed")]
-print("After dropping Unnamed:", df.shape)
+# B08303: travel time to work
+# mean_travel_time_min is the B08303_001E total divided by 60. The worker
+# counts per travel time bucket (B08303_002E-013E) are kept as commute_*
+# columns, and commute_distribution turns them into each tract's estimated
+# mean, median and percentile commute plus the share of workers commuting
+# longer than 5, 10, ..., 90 minutes (pct_commute_over_<X>).
+SPEC = AcsTableSpec(
+    table_id="B08303",
+    variables={"B08303_001E": "travel_total", **BUCKETS},
+    ratios={"mean_travel_time_min": ("travel_total", 60.0)},
+)
 
-# Keep only census tracts (GEO_ID starting with 1400000US)
-df = df[df["GEO_ID"].str.startswith("1400000US")].copy()
-print("After keeping only tracts:", df.shape)
 
-# Fix GEOID format to match other tables by removing leading "1400000US"
-# Example: 1400000US17031010100 -> 17031010100
-df["geoid"] = df["GEO_ID"].str.replace("1400000US", "", regex=False)
+def clean(path=INPUT_PATH):
+    """Cleaned tract table from one raw ACS extract (also used by build_panel.py)."""
+    df = load_acs_table(path, SPEC)
+    with step("transform", rows_in=len(df)):
+        return df.join(commute_distribution(df))
 
-# Rename NAME -> tract_name
-df.rename(columns={"NAME": "tract_name"}, inplace=True)
 
-# Convert mean travel time to numeric (this is the total minutes value)
-df["B08303_001E"] = pd.to_numeric(df["B08303_001E"], errors="coerce")
+def main():
+    df = clean()
+    print("Tracts kept:", df.shape)
 
-# Compute mean travel time in minutes
-df["mean_travel_time_min"] = df["B08303_001E"] / 60.0
+    print("\n=== Preview of cleaned data ===")
+    print(df.head())
 
-# Keep only what we need
-df = df[["geoid", "tract_name", "mean_travel_time_min"]]
+    paths = write_table(df, OUTPUT_NAME)
+    print("\nSaved cleaned file to:", ", ".join(paths))
 
-print("\n=== Preview of cleaned data ===")
-print(df.head())
 
-# Save
-out_path = "./data_processed/travel_time_clean.csv"
-df.to_csv(out_path, index=False)
-print(f"\nSaved cleaned file to: {out_path}")
+if __name__ == "__main__":
+    main()
@@ -1,69 +1,48 @@
-import pandas as pd
-
-# Load raw data
-path = "./data_raw/vehicles_available.csv"
-df = pd.read_csv(path)
-
-print("Raw shape:", df.shape)
-
-# Drop empty unnamed columns
-df = df.loc[:, ~df.columns.str.contains("Unnamed")]
-print("After dropping Unnamed:", df.shape)
+import os
+
+from acs_loader import AcsTableSpec, load_acs_table
+from datastore import write_table
+from paths import RAW_DIR
+
+INPUT_PATH = os.path.join(RAW_DIR, "vehicles_available.csv")
+OUTPUT_NAME = "vehicles_available_clean"
+
+# B08201: household size by vehicles available
+# Percentages are shares of all households in the tract.
+SPEC = AcsTableSpec(
+    table_id="B08201",
+    variables={
+        "B08201_001E": "hh_total",
+        "B08201_002E": "hh_no_vehicle",
+        "B08201_003E": "hh_one_vehicle",
+        "B08201_004E": "hh_two_vehicle",
+        "B08201_005E": "hh_three_plus_vehicle",
+    },
+    ratios={
+        "pct_hh_no_vehicle": ("hh_no_vehicle", "hh_total"),
+        "pct_hh_one_vehicle": ("hh_one_vehicle", "hh_total"),
+        "pct_hh_two_vehicle": ("hh_two_vehicle", "hh_total"),
+        "pct_hh_three_plus_vehicle": ("hh_three_plus_vehicle", "hh_total"),
+    },
+)
 
-# Remove USA + metadata
-df = df[df["GEO_ID"] != "Geography"].copy()
-df = df[df["GEO_ID"] != "0100000US"].copy()
-df = df[df["GEO_ID"].str.startswith("1400000US")].copy()
-print("After keeping only tracts:", df.shape)
 
-# Create clean GEOID
-df["geoid"] = df["GEO_ID"].str.replace("1400000US", "", regex=False)
+def clean(path=INPUT_PATH):
+    """Cleaned tract table from one raw ACS extract (also used by build_panel.py)."""
+    return load_acs_table(path, SPEC)
 
-# Rename relevant fields
-rename_map = {
-    "NAME": "tract_name",
-    "B08201_001E": "hh_total",
-    "B08201_002E": "hh_no_vehicle",
-    "B08201_003E": "hh_one_vehicle",
-    "B08201_004E": "hh_two_vehicle",
-    "B08201_005E": "hh_three_plus_vehicle",
-}
-df = df.rename(columns=rename_map)
 
-cols_keep = [
-    "geoid",
-    "tract_name",
-    "hh_total",
-    "hh_no_vehicle",
-    "hh_one_vehicle",
-    "hh_two_vehicle",
-    "hh_three_plus_vehicle",
-]
-df_clean = df[cols_keep].copy()
+def main():
+    df_clean = clean()
+    print("Tracts kept:", df_clean.shape)
 
-# convert to numeric
-for col in [
-    "hh_total",
-    "hh_no_vehicle",
-    "hh_one_vehicle",
-    "hh_two_vehicle",
-    "hh_three_plus_vehicle",
-]:
-    df_clean[col] = pd.to_numeric(df_clean[col], errors="coerce")
+    paths = write_table(df_clean, OUTPUT_NAME)
 
-# compute percentages
-df_clean["pct_hh_no_vehicle"] = df_clean["hh_no_vehicle"] / df_clean["hh_total"]
-df_clean["pct_hh_one_vehicle"] = df_clean["hh_one_vehicle"] / df_clean["hh_total"]
-df_clean["pct_hh_two_vehicle"] = df_clean["hh_two_vehicle"] / df_clean["hh_total"]
-df_clean["pct_hh_three_plus_vehicle"] = (
-    df_clean["hh_three_plus_vehicle"] / df_clean["hh_total"]
-)
+    print("\n=== Preview of cleaned data ===")
+    print(df_clean.head())
 
-# Save cleaned file
-output = "./data_processed/vehicles_available_clean.csv"
-df_clean.to_csv(output, index=False)
+    print("\nSaved cleaned file to:", ", ".join(paths))
 
-print("\n=== Preview of cleaned data ===")
-print(df_clean.head())
 
-print("\nSaved cleaned file:", output)
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+# Dashboard 4: Mobility by Chicago community area (choropleth)
+# Maps one tract_mobility_master metric, rolled up to the 77 community areas
+# by build_community_rollup.py, on the community area boundaries.
+#
+# The boundaries are embedded as a compact topology (see topology.py): shared
+# borders are stored once, coordinates are quantized and delta-encoded, and
+# only points that matter at the chosen simplification tolerance are kept.
+# The page decodes it into GeoJSON; the slider switches to coarser
+# tolerances without reloading and the dropdown switches the metric.
+#
+# build_figure(rollup, ...) makes the figure and main() is the command line;
+# plotly is imported on the first build (see income_vs_car_dashboard.py).
+# The topology travels in the figure's layout.meta, and the boundaries'
+# topology is built once per process and quantization.
+
+import functools
+import os
+
+from instrument import step
+from paths import FIGS_DIR
+
+ROLLUP_NAME = "community_area_mobility"
+OUTPUT_NAME = "community_choropleth.html"
+
+# metric -> (label, number format)
+METRICS = {
+    "pct_hh_no_vehicle": ("% Households with no vehicle", ".0%"),
+    "pct_public": ("% Workers commuting by public transit", ".0%"),
+    "mean_travel_time_min": ("Mean travel time to work (minutes)", ".1f"),
+}
+
+# Slider tolerances, as multiples of --tolerance
+TOLERANCE_STEPS = (1, 2, 5, 10, 20, 50)
+
+# Runs in the exported page: decode the topology in layout.meta, draw it at
+# the first tolerance, and redraw when the tolerance slider moves.
+CHOROPLETH_JS = """
+var gd = document.getElementById('{plot_id}');
+var topo = decodeTopology(gd.layout.meta.topology);
+function showTolerance(step) {
+    Plotly.restyle(gd, {geojson: [topologyFeatures(topo, gd.layout.meta.area_ids, step)]}, [0]);
+}
+showTolerance(0);
+gd.on('plotly_sliderchange', function (e) { showTolerance(Number(e.step.value)); });
+"""
+
+
+def parser():
+    """Command-line options of the dashboard."""
+    from figure_export import dashboard_parser
+    from topology import QUANTIZATION
+
+    parser = dashboard_parser("Community area choropleth of a mobility metric.", years=False)
+    parser.add_argument("--metric", choices=list(METRICS), default="pct_hh_no_vehicle", help="metric shown first")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=10.0,
+        help="simplification tolerance in meters; finest detail kept in the page (default 10)",
+    )
+    parser.add_argument(
+        "--quantization",
+        type=int,
+        default=QUANTIZATION,
+        help=f"coordinate grid steps per axis (default {QUANTIZATION:,})",
+    )
+    return parser
+
+
+def figure_params(args):
+    """build_figure keyword arguments of the command-line options."""
+    return {"metric": args.metric, "tolerance": args.tolerance, "quantization": args.quantization}
+
+
+def load_data():
+    """Community area metrics (one row per area with data)."""
+    from datastore import read_table
+
+    return read_table(ROLLUP_NAME)
+
+
+@functools.lru_cache(maxsize=4)
+def boundary_topology(quantization=None):
+    """(area ids, topology) of the community area boundaries, built once per quantization.
+
+    quantization=None uses topology.QUANTIZATION.
+    """
+    from geometry import load_geometries
+    from topology import QUANTIZATION, build_topology
+
+    # Row i of areas = geometry i
+    areas, geoms = load_geometries()
+    topo = build_topology(geoms, quantization=QUANTIZATION if quantization is None else quantization)
+    print(f"Topology: {topo.n_arcs} shared arcs, {len(topo.arc_coords)} points before simplification")
+    return areas["AREA_NUMBE"].astype(str).tolist(), topo
+
+
+def metric_style(df, metric):
+    """Trace / layout updates that show `metric`."""
+    label, fmt = METRICS[metric]
+    value = "%{z:" + fmt + "}"
+    return (
+        {
+            "z": [df[metric].tolist()],
+            "colorbar.title.text": label,
+            "colorbar.tickformat": fmt,
+            "hovertemplate": "<b>%{customdata}</b><br>" + label + ": " + value + "<extra></extra>",
+        },
+        {"title.text": f"{label} by Chicago community area"},
+    )
+
+
+def build_figure(df, metric="pct_hh_no_vehicle", tolerance=10.0, quantization=None):
+    """The choropleth of community area rows `df` (see parser() for the options)."""
+    import plotly.graph_objects as go
+
+    from topology import encode_topology
+
+    if metric not in METRICS:
+        raise ValueError(f"metric must be one of {', '.join(METRICS)}, not {metric!r}")
+
+    with step("transform", rows_in=len(df)) as s:
+        area_ids, topo = boundary_topology(quantization)
+        print("Community areas with data:", len(df), "of", len(area_ids))
+        tolerances = [tolerance * multiple for multiple in TOLERANCE_STEPS]
+        payload = encode_topology(topo, tolerances)
+        s.record(rows_out=len(df))
+
+    with step("figure"):
+        locations = df["AREA_NUMBE"].astype(str)
+
+        trace_style, layout_style = metric_style(df, metric)
+        fig = go.Figure(
+            go.Choropleth(
+                geojson={"type": "FeatureCollection", "features": []},  # filled in by the page
+                featureidkey="id",
+                locations=locations,
+                z=trace_style["z"][0],
+                customdata=df["COMMUNITY"].str.title(),
+                colorscale="Viridis",
+                marker_line_color="white",
+                marker_line_width=0.5,
+                colorbar=dict(title=dict(text=trace_style["colorbar.title.text"]), tickformat=trace_style["colorbar.tickformat"]),
+                hovertemplate=trace_style["hovertemplate"],
+            )
+        )
+
+        # Metric dropdown: restyle z and the colorbar, retitle the figure.
+        buttons = []
+        for shown, (label, _) in METRICS.items():
+            trace_update, layout_update = metric_style(df, shown)
+            buttons.append(dict(label=label, method="update", args=[trace_update, layout_update]))
+
+        # Tolerance slider: handled by CHOROPLETH_JS (method "skip" = no plotly action).
+        slider_steps = [
+            dict(label=f"{tol:g} m", method="skip", value=str(i)) for i, tol in enumerate(tolerances)
+        ]
+
+        fig.update_layout(
+            template="plotly_white",
+            title=layout_style["title.text"],
+            geo=dict(visible=False, fitbounds="locations", projection_type="mercator"),
+            updatemenus=[
+                dict(buttons=buttons, active=list(METRICS).index(metric), x=0.0, xanchor="left", y=1.08, yanchor="bottom")
+            ],
+            sliders=[
+                dict(
+                    active=0,
+                    currentvalue={"prefix": "Simplification tolerance: "},
+                    pad={"t": 30},
+                    steps=slider_steps,
+                )
+            ],
+            height=800,
+            meta={"topology": payload, "area_ids": area_ids},
+            margin=dict(l=20, r=20, t=110, b=40),
+        )
+    return fig
+
+
+def page_options(fig):
+    """write_html options of the figure's page."""
+    from topology import TOPOLOGY_JS
+
+    return {"post_script": TOPOLOGY_JS + CHOROPLETH_JS}
+
+
+def main(argv=None):
+    from figure_export import write_figure
+
+    args = parser().parse_args(argv)
+
+    rollup = load_data()
+    fig = build_figure(rollup, **figure_params(args))
+
+    output_path = os.path.join(FIGS_DIR, OUTPUT_NAME)
+    write_figure(
+        fig,
+        output_path,
+        offline=args.offline,  # local plotly.js instead of the CDN
+        **page_options(fig),
+    )
+    print("Saved interactive figure to", output_path)
+
+
+if __name__ == "__main__":
+    main()
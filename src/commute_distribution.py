@@ -0,0 +1,110 @@
+# commute_distribution.py
+#
+# Commute time distributions from the ACS B08303 travel time buckets.
+# B08303 counts the workers of a tract in twelve travel time ranges
+# (< 5, 5-9, ..., 45-59, 60-89, 90+ minutes). With the counts of all tracts
+# as one (tracts x buckets) array, every statistic below is computed for all
+# tracts at once by assuming workers are spread evenly within each bucket,
+# the same linear interpolation the Census Bureau uses for medians:
+#   - means from the bucket midpoints,
+#   - percentiles (median, quartiles, ...) by interpolating inside the
+#     bucket where the cumulative count crosses the target,
+#   - the share of workers commuting longer than X minutes for a whole grid
+#     of thresholds, as one matrix product.
+# The open-ended 90+ bucket is taken to end at OPEN_BUCKET_END minutes.
+
+import numpy as np
+import pandas as pd
+
+# Raw B08303 bucket column -> readable count column, shortest commutes first
+BUCKETS = {
+    "B08303_002E": "commute_lt5",
+    "B08303_003E": "commute_5_9",
+    "B08303_004E": "commute_10_14",
+    "B08303_005E": "commute_15_19",
+    "B08303_006E": "commute_20_24",
+    "B08303_007E": "commute_25_29",
+    "B08303_008E": "commute_30_34",
+    "B08303_009E": "commute_35_39",
+    "B08303_010E": "commute_40_44",
+    "B08303_011E": "commute_45_59",
+    "B08303_012E": "commute_60_89",
+    "B08303_013E": "commute_90_plus",
+}
+BUCKET_COLUMNS = list(BUCKETS.values())
+
+# Assumed upper end of the open 90+ minute bucket
+OPEN_BUCKET_END = 120
+# Bucket boundaries in minutes (bucket i covers edges[i] to edges[i + 1])
+BUCKET_EDGES = np.array([0, 5, 10, 15, 20, 25, 30, 35, 40, 45, 60, 90, OPEN_BUCKET_END], dtype="float64")
+
+# Percentiles written by commute_distribution, and the "longer than X
+# minutes" thresholds of its pct_commute_over_<X> columns
+PERCENTILES = (0.25, 0.5, 0.75, 0.9)
+THRESHOLDS = tuple(range(5, 95, 5))
+
+
+def percentile_column(p):
+    return "commute_median_min" if p == 0.5 else f"commute_p{round(p * 100)}_min"
+
+
+def share_column(minutes):
+    return f"pct_commute_over_{minutes}"
+
+
+def bucket_counts(df):
+    """The bucket columns of df as a float (tracts x buckets) array."""
+    return df[BUCKET_COLUMNS].to_numpy(dtype="float64")
+
+
+def bucket_means(counts, edges=BUCKET_EDGES):
+    """Mean commute (minutes) per row of a (rows, buckets) count array."""
+    counts = np.asarray(counts, dtype="float64")
+    midpoints = (edges[:-1] + edges[1:]) / 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return counts @ midpoints / counts.sum(axis=1)
+
+
+def bucket_quantiles(counts, probs, edges=BUCKET_EDGES):
+    """(rows, len(probs)) commute times below which a share `probs` of workers fall.
+
+    The target count p * total is located in the first bucket whose
+    cumulative count reaches it and interpolated linearly inside that
+    bucket. Rows without workers get NaN.
+    """
+    counts = np.asarray(counts, dtype="float64")
+    cumulative = np.cumsum(counts, axis=1)
+    total = cumulative[:, -1:]
+    target = total * np.asarray(probs, dtype="float64")[None, :]  # (rows, probs)
+
+    bucket = (cumulative[:, :, None] < target[:, None, :]).sum(axis=1)
+    bucket = np.minimum(bucket, counts.shape[1] - 1)
+    rows = np.arange(len(counts))[:, None]
+    below = cumulative[rows, bucket] - counts[rows, bucket]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        within = np.clip((target - below) / counts[rows, bucket], 0.0, 1.0)
+    values = edges[bucket] + within * (edges[bucket + 1] - edges[bucket])
+    values[(total == 0).ravel()] = np.nan
+    return values
+
+
+def share_over(counts, thresholds, edges=BUCKET_EDGES):
+    """(rows, len(thresholds)) share of workers commuting longer than each threshold."""
+    counts = np.asarray(counts, dtype="float64")
+    thresholds = np.asarray(thresholds, dtype="float64")
+    lo, hi = edges[:-1, None], edges[1:, None]
+    # part of each bucket above each threshold: (buckets, thresholds)
+    above = np.clip((hi - thresholds[None, :]) / (hi - lo), 0.0, 1.0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return counts @ above / counts.sum(axis=1, keepdims=True)
+
+
+def commute_distribution(df, percentiles=PERCENTILES, thresholds=THRESHOLDS):
+    """Mean, percentiles and pct_commute_over_<X> columns from df's bucket counts."""
+    counts = bucket_counts(df)
+    out = pd.DataFrame({"commute_mean_min": bucket_means(counts)}, index=df.index)
+    for p, values in zip(percentiles, bucket_quantiles(counts, percentiles).T):
+        out[percentile_column(p)] = values
+    for minutes, values in zip(thresholds, share_over(counts, thresholds).T):
+        out[share_column(minutes)] = values
+    return out
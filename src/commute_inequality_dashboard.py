@@ -6,256 +6,415 @@
 #   1. Income distribution per quartile (histogram)
 #   2. Income vs commute time relationship (scatter)
 #   3. Commute time distribution per quartile (horizontal histogram)
+#
+# build_figure(df, ...) makes the figure and main() is the command line;
+# numpy and plotly are imported on the first build (see income_vs_car_dashboard.py).
 
-import os
-import numpy as np
-import pandas as pd
-from plotly.subplots import make_subplots
-import plotly.graph_objects as go
-
-
-# Load mobility dataset produced during preprocessing.
-# It contains one row per census tract with income, commute time, and mobility stats.
-df = pd.read_csv("./data_processed/tract_mobility_master.csv")
-
-# We are only analyzing commute inequality, so rows without key metrics are dropped.
-# Missing values here would bias correlations and distributions.
-df = df.dropna(subset=["median_income", "mean_travel_time_min"]).copy()
-
-
-# Calculate income quartile thresholds.
-# Quartiles split census tracts into 4 equally sized economic groups.
-q25 = df["median_income"].quantile(0.25)
-q50 = df["median_income"].quantile(0.50)
-q75 = df["median_income"].quantile(0.75)
-
-
-def income_quartile(v):
-    """Assign a tract to an income quartile based on median household income."""
-    if v <= q25:
-        return "Q1 – Lowest income"
-    if v <= q50:
-        return "Q2 – Lower-middle"
-    if v <= q75:
-        return "Q3 – Upper-middle"
-    return "Q4 – Highest income"
-
-
-df["Income Quartile"] = df["median_income"].apply(income_quartile)
-
-# Fixed order of quartiles ensures consistent visual encoding across all dashboards.
-quartile_order = [
-    "Q1 – Lowest income",
-    "Q2 – Lower-middle",
-    "Q3 – Upper-middle",
-    "Q4 – Highest income",
-]
-
-# Assign a unique color to each quartile for visual continuity.
-colors = {
-    "Q1 – Lowest income": "#440154",  # purple
-    "Q2 – Lower-middle": "#31688e",  # blue
-    "Q3 – Upper-middle": "#35b779",  # green
-    "Q4 – Highest income": "#fde725",  # yellow
-}
-
-
-# Compute overall correlation between income and commute time.
-# This helps quantify the strength of inequality, not just visualize it.
-overall_r = df[["median_income", "mean_travel_time_min"]].corr().iloc[0, 1]
-
-# Also compute correlation within each income quartile to reveal internal inequality.
-r_by_q = {}
-for q in quartile_order:
-    sub = df[df["Income Quartile"] == q]
-    if len(sub) > 1:
-        r_by_q[q] = sub[["median_income", "mean_travel_time_min"]].corr().iloc[0, 1]
-    else:
-        r_by_q[q] = np.nan
-
-
-# Create a compound subplot layout:
-# Row 1  - income distribution only (histogram)
-# Row 2  - scatter plot + commute histogram side panel
-# This provides multiple perspectives using the same population.
-fig = make_subplots(
-    rows=2,
-    cols=2,
-    row_heights=[0.25, 0.75],  # small header, larger analytical area
-    column_widths=[0.75, 0.25],  # main scatter on left, distribution on right
-    specs=[
-        [{"type": "xy", "colspan": 2}, None],
-        [{"type": "xy"}, {"type": "xy"}],
-    ],
-    shared_xaxes=True,  # income axis shared vertically
-    vertical_spacing=0.06,
-    horizontal_spacing=0.08,
-)
-
-
-# First layer: income histogram per quartile.
-# Shows how economically separated the neighborhoods are.
-for q in quartile_order:
-    sub = df[df["Income Quartile"] == q]
-    fig.add_trace(
-        go.Histogram(
-            x=sub["median_income"],
-            name=q,
-            legendgroup=q,  # link with scatter + commute histogram
-            marker=dict(color=colors[q]),
-            opacity=0.5,
-            nbinsx=30,
-            histnorm="probability density",  # shape-based visualization
-            showlegend=False,  # avoid duplicate legend rows
-        ),
-        row=1,
-        col=1,
+from instrument import step
+
+OUTPUT_NAME = "commute_inequality.html"
+COLUMNS = ["tract_name", "median_income", "mean_travel_time_min"]
+
+# Number of bins for both density histograms
+N_BINS = 30
+# Approximate income x commute grid of the scatter in binned mode
+SCATTER_BINS = (60, 40)
+
+
+def parser():
+    """Command-line options of the dashboard."""
+    from figure_export import add_render_args, dashboard_parser
+
+    parser = dashboard_parser("Commute time inequality dashboard.")
+    parser.add_argument("--groups", type=int, default=4, help="number of income groups, at least 2 (default 4, quartiles)")
+    parser.add_argument(
+        "--precomputed-histograms",
+        action="store_true",
+        help="bin the two density histograms in Python and embed only the bars",
     )
+    add_render_args(parser)
+    parser.add_argument(
+        "--bootstrap",
+        type=int,
+        default=10_000,
+        help="bootstrap replicates for the correlation intervals (0 = point estimates only)",
+    )
+    parser.add_argument("--ci-level", type=float, default=0.95, help="confidence level of the intervals (default 0.95)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed of the bootstrap")
+    return parser
+
+
+def figure_params(args):
+    """build_figure keyword arguments of the command-line options."""
+    from figure_export import render_params
+
+    return {
+        "n_groups": args.groups,
+        "precomputed_histograms": args.precomputed_histograms,
+        "bootstrap": args.bootstrap,
+        "ci_level": args.ci_level,
+        "seed": args.seed,
+        **render_params(args),
+    }
+
+
+def load_data(year=None):
+    """Master rows with the columns build_figure uses."""
+    from datastore import load_master
+
+    # Only the columns used below are read from the columnar store.
+    return load_master(columns=COLUMNS, year=year)
 
 
-# Second layer: scatter of income vs commute time.
-# Every point represents a census tract.
-# This plot exposes the core inequality pattern visually.
-for q in quartile_order:
-    sub = df[df["Income Quartile"] == q]
-    fig.add_trace(
-        go.Scatter(
-            x=sub["median_income"],
-            y=sub["mean_travel_time_min"],
-            mode="markers",
-            name=q,
-            legendgroup=q,
-            marker=dict(
-                color=colors[q],
-                size=7,
-                opacity=0.65,
+def quartile_correlations(df, quartile_order, bootstrap, ci_level, seed):
+    """Income / commute correlation overall and per quartile, with bootstrap intervals.
+
+    Returns (overall r, {quartile: r}, {"Overall" or quartile: (low, high)});
+    the intervals are empty when bootstrap is 0.
+    """
+    import numpy as np
+
+    from uncertainty import bootstrap_correlations, grouped_correlations, interval
+
+    # The overall and per-group correlations come from one pass over the data
+    # (uncertainty.grouped_correlations), and their bootstrap intervals
+    # from resampling tracts, all replicates at once.
+    income = df["median_income"].to_numpy(dtype="float64")
+    commute = df["mean_travel_time_min"].to_numpy(dtype="float64")
+    codes = df["Income Quartile"].cat.codes.to_numpy()
+    r_all = grouped_correlations(income[:, None], commute[:, None], codes, len(quartile_order))[:, 0]
+
+    ci_by_group = {}
+    if bootstrap > 0:
+        rng = np.random.default_rng(seed)
+        replicates = bootstrap_correlations(income, commute, codes, len(quartile_order), bootstrap, rng)
+        low, high = interval(replicates, ci_level, axis=1)
+        ci_by_group = dict(zip(["Overall"] + quartile_order, zip(low, high)))
+    return r_all[0], dict(zip(quartile_order, r_all[1:])), ci_by_group
+
+
+def density_bars(fig, df, column, orientation, quartile_order, colors, row, col):
+    """Add per-quartile density histograms of `column` computed in Python.
+
+    All quartiles share the same round-width bins and are counted in one
+    vectorized pass; only bin centers and heights go into the figure.
+    """
+    import numpy as np
+    import plotly.graph_objects as go
+
+    from binning import grouped_histogram, nice_bin_edges
+
+    edges = nice_bin_edges(df[column], N_BINS)
+    density = grouped_histogram(df[column], df["Income Quartile"].cat.codes, len(quartile_order), edges)
+    centers = (edges[:-1] + edges[1:]) / 2
+    bin_ranges = np.stack([edges[:-1], edges[1:]], axis=-1)
+    if orientation == "v":
+        value_fmt, axes = "$%{customdata[0]:,.0f} – $%{customdata[1]:,.0f}", ("x", "y")
+    else:
+        value_fmt, axes = "%{customdata[0]:.0f} – %{customdata[1]:.0f} minutes", ("y", "x")
+
+    for code, q in enumerate(quartile_order):
+        fig.add_trace(
+            go.Bar(
+                **{axes[0]: centers, axes[1]: density[code]},
+                name=q,
+                legendgroup=q,
+                marker=dict(color=colors[q]),
+                opacity=0.5,
+                orientation=orientation,
+                showlegend=False,
+                customdata=bin_ranges,
+                hovertemplate=value_fmt + "<br>Density: %{" + axes[1] + ":.3g}<extra>" + q + "</extra>",
             ),
-            customdata=np.stack([sub["tract_name"], sub["Income Quartile"]], axis=-1),
-            hovertemplate=(
-                "<b>%{customdata[0]}</b><br>"
-                "Income group: %{customdata[1]}<br>"
-                "Median income: $%{x:,.0f}<br>"
-                "Mean commute: %{y:.1f} minutes"
-                "<extra></extra>"
+            row=row,
+            col=col,
+        )
+
+
+def build_figure(
+    df,
+    n_groups=4,
+    precomputed_histograms=False,
+    render="auto",
+    webgl_above=None,
+    binned_above=None,
+    bootstrap=10_000,
+    ci_level=0.95,
+    seed=0,
+):
+    """The three-panel inequality figure of master rows `df` (see parser() for the options)."""
+    import numpy as np
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+
+    from binning import grouped_histogram2d, nice_bin_edges, occupied_columns
+    from figure_export import group_heatmaps, render_mode, scatter_trace
+    from income_groups import assign_income_groups, group_colors, group_labels
+
+    if not 0 < ci_level < 1:
+        raise ValueError(f"ci_level must be between 0 and 1 (exclusive), not {ci_level}")
+    if bootstrap < 0:
+        raise ValueError(f"bootstrap must be 0 or a positive number of replicates, not {bootstrap}")
+    quartile_order = group_labels(n_groups)
+    colors = group_colors(n_groups)
+
+    with step("transform", rows_in=len(df)) as s:
+        # We are only analyzing commute inequality, so rows without key metrics are dropped.
+        # Missing values here would bias correlations and distributions.
+        df = df.dropna(subset=["median_income", "mean_travel_time_min"]).copy()
+
+        # Split census tracts into 4 equally sized economic groups (quartiles) by default.
+        # Labels and colors are shared with the other dashboards for visual continuity.
+        df["Income Quartile"] = assign_income_groups(df["median_income"], n_groups=n_groups)
+
+        # Compute overall correlation between income and commute time.
+        # This helps quantify the strength of inequality, not just visualize it.
+        # Also compute correlation within each income quartile to reveal internal inequality.
+        overall_r, r_by_q, ci_by_group = quartile_correlations(df, quartile_order, bootstrap, ci_level, seed)
+        s.record(rows_out=len(df))
+
+    with step("figure"):
+        # Create a compound subplot layout:
+        # Row 1  - income distribution only (histogram)
+        # Row 2  - scatter plot + commute histogram side panel
+        # This provides multiple perspectives using the same population.
+        fig = make_subplots(
+            rows=2,
+            cols=2,
+            row_heights=[0.25, 0.75],  # small header, larger analytical area
+            column_widths=[0.75, 0.25],  # main scatter on left, distribution on right
+            specs=[
+                [{"type": "xy", "colspan": 2}, None],
+                [{"type": "xy"}, {"type": "xy"}],
+            ],
+            shared_xaxes=True,  # income axis shared vertically
+            vertical_spacing=0.06,
+            horizontal_spacing=0.08,
+        )
+
+        # First layer: income histogram per quartile.
+        # Shows how economically separated the neighborhoods are.
+        if precomputed_histograms:
+            density_bars(fig, df, "median_income", "v", quartile_order, colors, row=1, col=1)
+        else:
+            for q in quartile_order:
+                sub = df[df["Income Quartile"] == q]
+                fig.add_trace(
+                    go.Histogram(
+                        x=sub["median_income"],
+                        name=q,
+                        legendgroup=q,  # link with scatter + commute histogram
+                        marker=dict(color=colors[q]),
+                        opacity=0.5,
+                        nbinsx=N_BINS,
+                        histnorm="probability density",  # shape-based visualization
+                        showlegend=False,  # avoid duplicate legend rows
+                    ),
+                    row=1,
+                    col=1,
+                )
+
+        # Second layer: scatter of income vs commute time.
+        # Every point represents a census tract.
+        # This plot exposes the core inequality pattern visually.
+        # Large tract sets are drawn with WebGL, or binned into per-quartile
+        # heatmaps when even that would be too much data for the page.
+        render = render_mode(render, len(df), webgl_above, binned_above)
+        if render == "binned":
+            x_edges = nice_bin_edges(df["median_income"], SCATTER_BINS[0])
+            y_edges = nice_bin_edges(df["mean_travel_time_min"], SCATTER_BINS[1])
+            counts = grouped_histogram2d(
+                df["median_income"],
+                df["mean_travel_time_min"],
+                df["Income Quartile"].cat.codes,
+                len(quartile_order),
+                x_edges,
+                y_edges,
+            )
+            for trace in group_heatmaps(
+                counts,
+                x_edges,
+                y_edges,
+                quartile_order,
+                colors,
+                occupied_columns(counts),
+                hovertemplate=(
+                    "%{z} tracts<br>"
+                    "Median income ≈ $%{x:,.0f}<br>"
+                    "Mean commute ≈ %{y:.1f} minutes"
+                ),
+            ):
+                fig.add_trace(trace, row=2, col=1)
+        else:
+            for q in quartile_order:
+                sub = df[df["Income Quartile"] == q]
+                fig.add_trace(
+                    scatter_trace(
+                        render,
+                        x=sub["median_income"],
+                        y=sub["mean_travel_time_min"],
+                        mode="markers",
+                        name=q,
+                        legendgroup=q,
+                        marker=dict(
+                            color=colors[q],
+                            size=7,
+                            opacity=0.65,
+                        ),
+                        customdata=np.stack([sub["tract_name"], sub["Income Quartile"]], axis=-1),
+                        hovertemplate=(
+                            "<b>%{customdata[0]}</b><br>"
+                            "Income group: %{customdata[1]}<br>"
+                            "Median income: $%{x:,.0f}<br>"
+                            "Mean commute: %{y:.1f} minutes"
+                            "<extra></extra>"
+                        ),
+                    ),
+                    row=2,
+                    col=1,
+                )
+
+        # Third layer: commute time histogram per quartile (horizontal).
+        # Shows distribution of commute durations per group.
+        if precomputed_histograms:
+            density_bars(fig, df, "mean_travel_time_min", "h", quartile_order, colors, row=2, col=2)
+        else:
+            for q in quartile_order:
+                sub = df[df["Income Quartile"] == q]
+                fig.add_trace(
+                    go.Histogram(
+                        y=sub["mean_travel_time_min"],
+                        name=q,
+                        legendgroup=q,
+                        marker=dict(color=colors[q]),
+                        opacity=0.5,
+                        nbinsy=N_BINS,
+                        histnorm="probability density",
+                        orientation="h",
+                        showlegend=False,
+                    ),
+                    row=2,
+                    col=2,
+                )
+
+        # Display the correlation summary directly on the canvas.
+        # This helps the viewer understand inequality numerically.
+        def format_r(group, r):
+            if np.isnan(r):
+                return "NA"
+            if group in ci_by_group and not np.isnan(ci_by_group[group]).any():
+                low, high = ci_by_group[group]
+                return f"{r:.2f} [{low:.2f}, {high:.2f}]"
+            return f"{r:.2f}"
+
+        lines = [f"Overall r = {format_r('Overall', overall_r)}"]
+        for q in quartile_order:
+            label = q.split("–")[0].strip()  # keep labels compact
+            lines.append(f"{label}  r = {format_r(q, r_by_q[q])}")
+        if ci_by_group:
+            lines.append(f"<sup>[{ci_level:.0%} bootstrap CI, {bootstrap:,} resamples of tracts]</sup>")
+
+        fig.add_annotation(
+            xref="paper",
+            yref="paper",
+            x=0.02,
+            y=0.96,
+            align="left",
+            showarrow=False,
+            text="<br>".join(lines),
+            font=dict(size=11),
+        )
+
+        # Global layout settings:
+        # - unified color system
+        # - interaction rules
+        # - meaningfully formatted axes
+        fig.update_layout(
+            template="plotly_white",
+            title=(
+                "Does commute time increase for lower-income neighborhoods?<br>"
+                "<sup>Income vs mean travel time to work — Cook County census tracts</sup>"
             ),
-        ),
-        row=2,
-        col=1,
+            height=700,
+            legend_title="Income Group",
+            legend=dict(
+                itemclick="toggleothers",  # click one - isolate group
+                itemdoubleclick="toggle",  # double click - traditional toggle
+            ),
+            bargap=0.05,
+        )
+
+        # Axis formatting for each subplot
+        fig.update_xaxes(
+            title_text="Median household income (USD)",
+            tickprefix="$",
+            tickformat=",",
+            row=2,
+            col=1,
+        )
+        fig.update_yaxes(
+            title_text="Mean travel time to work (minutes)",
+            row=2,
+            col=1,
+        )
+
+        fig.update_xaxes(
+            title_text="Median household income (USD)",
+            tickprefix="$",
+            tickformat=",",
+            showticklabels=False,  # avoid duplicate labels above scatter
+            row=1,
+            col=1,
+        )
+        fig.update_yaxes(
+            title_text="Density",
+            row=1,
+            col=1,
+        )
+
+        fig.update_xaxes(
+            title_text="Density",
+            row=2,
+            col=2,
+        )
+        fig.update_yaxes(
+            title_text="Mean travel time to work (minutes)",
+            row=2,
+            col=2,
+        )
+
+        # Disable lasso selection, since it interferes with linked filtering.
+        # Box-select remains available.
+        fig.update_layout(modebar_remove=["lasso2d"])
+    return fig
+
+
+def page_options(fig):
+    """write_html options of the figure's page."""
+    return {"full_html": True}
+
+
+def main(argv=None):
+    from figure_export import figure_path, write_figure
+
+    args = parser().parse_args(argv)
+
+    # Load mobility dataset produced during preprocessing.
+    # It contains one row per census tract with income, commute time, and mobility stats.
+    df = load_data(args.year)
+    fig = build_figure(df, **figure_params(args))
+
+    # Export to interactive HTML so anyone can explore without Python installed.
+    output_path = figure_path(OUTPUT_NAME, args.year)
+    write_figure(
+        fig,
+        output_path,
+        offline=args.offline,  # local plotly.js instead of the CDN
+        **page_options(fig),
     )
 
-
-# Third layer: commute time histogram per quartile (horizontal).
-# Shows distribution of commute durations per group.
-for q in quartile_order:
-    sub = df[df["Income Quartile"] == q]
-    fig.add_trace(
-        go.Histogram(
-            y=sub["mean_travel_time_min"],
-            name=q,
-            legendgroup=q,
-            marker=dict(color=colors[q]),
-            opacity=0.5,
-            nbinsy=30,
-            histnorm="probability density",
-            orientation="h",
-            showlegend=False,
-        ),
-        row=2,
-        col=2,
-    )
+    print("Saved interactive figure to", output_path)
 
 
-# Display the correlation summary directly on the canvas.
-# This helps the viewer understand inequality numerically.
-lines = [f"Overall r = {overall_r:.2f}"]
-for q in quartile_order:
-    r = r_by_q[q]
-    label = q.split("–")[0].strip()  # keep labels compact
-    lines.append(f"{label}  r = {r:.2f}" if not np.isnan(r) else f"{label}  r = NA")
-
-fig.add_annotation(
-    xref="paper",
-    yref="paper",
-    x=0.02,
-    y=0.96,
-    align="left",
-    showarrow=False,
-    text="<br>".join(lines),
-    font=dict(size=11),
-)
-
-
-# Global layout settings:
-# - unified color system
-# - interaction rules
-# - meaningfully formatted axes
-fig.update_layout(
-    template="plotly_white",
-    title=(
-        "Does commute time increase for lower-income neighborhoods?<br>"
-        "<sup>Income vs mean travel time to work — Cook County census tracts</sup>"
-    ),
-    height=700,
-    legend_title="Income Group",
-    legend=dict(
-        itemclick="toggleothers",  # click one - isolate group
-        itemdoubleclick="toggle",  # double click - traditional toggle
-    ),
-    bargap=0.05,
-)
-
-
-# Axis formatting for each subplot
-fig.update_xaxes(
-    title_text="Median household income (USD)",
-    tickprefix="$",
-    tickformat=",",
-    row=2,
-    col=1,
-)
-fig.update_yaxes(
-    title_text="Mean travel time to work (minutes)",
-    row=2,
-    col=1,
-)
-
-fig.update_xaxes(
-    title_text="Median household income (USD)",
-    tickprefix="$",
-    tickformat=",",
-    showticklabels=False,  # avoid duplicate labels above scatter
-    row=1,
-    col=1,
-)
-fig.update_yaxes(
-    title_text="Density",
-    row=1,
-    col=1,
-)
-
-fig.update_xaxes(
-    title_text="Density",
-    row=2,
-    col=2,
-)
-fig.update_yaxes(
-    title_text="Mean travel time to work (minutes)",
-    row=2,
-    col=2,
-)
-
-
-# Disable lasso selection, since it interferes with linked filtering.
-# Box-select remains available.
-fig.update_layout(modebar_remove=["lasso2d"])
-
-
-# Export to interactive HTML so anyone can explore without Python installed.
-os.makedirs("./figs", exist_ok=True)
-fig.write_html(
-    "./figs/commute_inequality.html",
-    include_plotlyjs="cdn",
-    full_html=True,
-)
-
-print("Saved interactive figure to ./figs/commute_inequality.html")
+if __name__ == "__main__":
+    main()
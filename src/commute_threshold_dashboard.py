@@ -1,129 +1,302 @@
 # Dashboard 3: Transit Reliance vs Income (animated by commute time)
 # This dashboard shows how public transit use varies across income groups,
 # and how that pattern changes as we move through different mean commute times.
-
-import os
-import pandas as pd
-import plotly.graph_objects as go
-
-# Load input data produced by the preprocessing pipeline.
-# This file contains one row per census tract with income, commute time,
-# and mode-share percentages (car, transit, etc.).
-df = pd.read_csv("./data_processed/tract_mobility_master.csv")
-
-# Keep only rows that have all fields needed for this dashboard.
-# We need: income (median), transit share (% using public transit),
-# and mean travel time to work.
-df = df.dropna(subset=["median_income", "pct_public", "mean_travel_time_min"]).copy()
-print("Rows used:", len(df))
-
-# Build income quartiles so each tract is assigned to an income group.
-# This matches the same grouping used in the other dashboards.
-q25 = df["median_income"].quantile(0.25)
-q50 = df["median_income"].quantile(0.50)
-q75 = df["median_income"].quantile(0.75)
-
-
-def income_group(v):
-    """Map a median income value to one of four income quartile labels."""
-    if v <= q25:
-        return "Q1 – Lowest income"
-    if v <= q50:
-        return "Q2 – Lower-middle"
-    if v <= q75:
-        return "Q3 – Upper-middle"
-    return "Q4 – Highest income"
-
-
-df["Income Group"] = df["median_income"].apply(income_group)
-
-# Fixed quartile ordering keeps colors and legend ordering predictable.
-quartile_order = [
-    "Q1 – Lowest income",
-    "Q2 – Lower-middle",
-    "Q3 – Upper-middle",
-    "Q4 – Highest income",
-]
-
-# Consistent colors across all dashboards so viewers can build intuition:
-# purple = lowest income, yellow = highest income.
-colors = {
-    "Q1 – Lowest income": "#440154",  # purple
-    "Q2 – Lower-middle": "#31688e",  # blue
-    "Q3 – Upper-middle": "#35b779",  # green
-    "Q4 – Highest income": "#fde725",  # yellow
+# With --slider threshold it uses each tract's travel time distribution
+# instead: the slider picks a commute length and every tract's marker is
+# sized by the share of its workers commuting longer than that.
+#
+# build_figure(df, ...) makes the figure and main() is the command line;
+# numpy and plotly are imported on the first build (see income_vs_car_dashboard.py).
+# The data the page scripts need (which view, the threshold shares) travels
+# in the figure's layout.meta, so a built figure is complete on its own and
+# page_options(fig) picks the script that goes with it.
+
+from instrument import step
+
+OUTPUT_NAME = "commute_threshold_slider.html"
+SLIDERS = ("minute", "threshold")
+
+# Approximate income x transit share grid in binned mode
+SCATTER_BINS = (60, 40)
+# Marker size for a share of 0 and of 1 in the threshold view
+THRESHOLD_MARKER_SIZES = (4, 22)
+
+# Runs in the exported page: keeps a copy of every trace's full data and, each
+# time a frame starts (slider move or Play), restyles the traces to the tracts
+# whose rounded mean commute (customdata[1]) equals the frame's minute.
+# The data is copied from gd.data, where compact arrays are still plotly's
+# {dtype, bdata} typed array specs (see figure_export.py), so they are decoded here.
+MINUTE_FILTER_JS = """
+var gd = document.getElementById('{plot_id}');
+var TYPED_ARRAYS = {
+    i1: Int8Array, u1: Uint8Array, i2: Int16Array, u2: Uint16Array,
+    i4: Int32Array, u4: Uint32Array, f4: Float32Array, f8: Float64Array
+};
+function values(a) {
+    if (a && a.bdata !== undefined) {
+        var bytes = Uint8Array.from(atob(a.bdata), function (c) { return c.charCodeAt(0); });
+        return Array.from(new TYPED_ARRAYS[a.dtype](bytes.buffer));
+    }
+    return Array.from(a || []);
 }
-
-# Convert mean commute time into whole minutes.
-# This rounded value is used as the animation frame variable.
-df["commute_min"] = df["mean_travel_time_min"].round().astype(int)
-
-# Remove tracts with extremely short commute values (under 5 minutes),
-# which are often unusual and can make the slider less meaningful.
-df = df[df["commute_min"] >= 5].copy()
-
-# Collect the sorted list of unique commute minutes to use as frames.
-minutes = sorted(df["commute_min"].unique())
-print("Commute minutes in data:", minutes[0], "to", minutes[-1])
-
-# Fix axis ranges for all frames so the animation feels stable.
-x_min = df["median_income"].min()
-x_max = df["median_income"].max()
-y_min = 0.0
-y_max = df["pct_public"].max() * 1.05
-
-# Build the initial figure for the "All minutes" view.
-# In this starting view, we show all tracts together with no commute filter.
-fig = go.Figure()
-all_traces = []
-
-for q in quartile_order:
-    sub = df[df["Income Group"] == q]
-
-    # customdata stores extra fields for the hover tooltip:
-    # tract name and commute minutes.
-    customdata = list(zip(sub["tract_name"], sub["commute_min"]))
-
-    trace = go.Scatter(
-        x=sub["median_income"],
-        y=sub["pct_public"],
-        mode="markers",
-        name=q,
-        marker=dict(color=colors[q], size=7, opacity=0.7),
-        customdata=customdata,
-        hovertemplate=(
-            "<b>%{customdata[0]}</b><br>"
-            "Income group: " + q + "<br>"
-            "Mean commute: %{customdata[1]} minutes<br>"
-            "Median income: $%{x:,.0f}<br>"
-            "Transit share: %{y:.1%}<extra></extra>"
-        ),
+var full = gd.data.map(function (t) {
+    return {x: values(t.x), y: values(t.y), customdata: values(t.customdata)};
+});
+var shown = null;
+function showMinute(name) {
+    if (name === shown) { return; }
+    shown = name;
+    var update = {x: [], y: [], customdata: []};
+    full.forEach(function (t) {
+        var x = [], y = [], cd = [];
+        for (var i = 0; i < t.x.length; i++) {
+            if (name === 'all' || String(t.customdata[i][1]) === name) {
+                x.push(t.x[i]); y.push(t.y[i]); cd.push(t.customdata[i]);
+            }
+        }
+        update.x.push(x); update.y.push(y); update.customdata.push(cd);
+    });
+    Plotly.restyle(gd, update);
+}
+gd.on('plotly_animatingframe', function (e) { showMinute(e.name); });
+gd.on('plotly_sliderchange', function (e) { showMinute(e.step.args[0][0]); });
+"""
+
+# Runs in the exported page in the threshold view: layout.meta.shares holds,
+# per trace, the percent of each tract's workers commuting longer than every
+# threshold (URL-safe base64 uint8, threshold-major). Moving the slider
+# resizes the markers and updates the hover text to the chosen threshold.
+THRESHOLD_JS = """
+var gd = document.getElementById('{plot_id}');
+var meta = gd.layout.meta;
+var thresholds = meta.thresholds;
+var minSize = meta.marker_sizes[0], maxSize = meta.marker_sizes[1];
+var shares = meta.shares.map(function (b64) {
+    return Uint8Array.from(atob(b64.replace(/-/g, '+').replace(/_/g, '/')), function (c) { return c.charCodeAt(0); });
+});
+function showThreshold(k) {
+    var size = [], customdata = [];
+    shares.forEach(function (pct) {
+        var n = pct.length / thresholds.length, s = [], cd = [];
+        for (var i = 0; i < n; i++) {
+            var share = pct[k * n + i] / 100;
+            s.push(minSize + share * (maxSize - minSize));
+            cd.push([thresholds[k], share]);
+        }
+        size.push(s); customdata.push(cd);
+    });
+    Plotly.restyle(gd, {'marker.size': size, customdata: customdata});
+}
+gd.on('plotly_sliderchange', function (e) { showThreshold(Number(e.step.value)); });
+"""
+
+
+def parser():
+    """Command-line options of the dashboard."""
+    from commute_distribution import THRESHOLDS
+    from figure_export import add_render_args, dashboard_parser
+
+    parser = dashboard_parser("Transit reliance vs income, animated by commute time.")
+    add_render_args(parser)
+    parser.add_argument("--groups", type=int, default=4, help="number of income groups, at least 2 (default 4, quartiles)")
+    parser.add_argument(
+        "--min-commute",
+        type=int,
+        default=5,
+        help="minute view: leave out tracts whose rounded mean commute is shorter (default 5)",
+    )
+    parser.add_argument(
+        "--slider",
+        choices=SLIDERS,
+        default="minute",
+        help="minute: show tracts by rounded mean commute; "
+        "threshold: size tracts by their share of workers commuting longer than the slider value",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=int,
+        choices=THRESHOLDS,
+        default=45,
+        help="commute length (minutes) selected first with --slider threshold",
+    )
+    return parser
+
+
+def figure_params(args):
+    """build_figure keyword arguments of the command-line options."""
+    from figure_export import render_params
+
+    return {
+        "slider": args.slider,
+        "threshold": args.threshold,
+        "n_groups": args.groups,
+        "min_commute": args.min_commute,
+        **render_params(args),
+    }
+
+
+def commute_columns(slider):
+    """Master columns describing each tract's commute in the `slider` view."""
+    from commute_distribution import THRESHOLDS, share_column
+
+    # The threshold view reads the share of workers commuting longer than each
+    # threshold (from the travel time buckets) instead of the mean.
+    return [share_column(m) for m in THRESHOLDS] if slider == "threshold" else ["mean_travel_time_min"]
+
+
+def load_data(year=None, slider="minute"):
+    """Master rows with the columns build_figure uses in the `slider` view."""
+    from datastore import load_master
+
+    # This file contains one row per census tract with income, commute time,
+    # and mode-share percentages (car, transit, etc.).
+    return load_master(columns=["tract_name", "median_income", "pct_public"] + commute_columns(slider), year=year)
+
+
+def prepare(df, slider, n_groups=4, min_commute=5):
+    """Tracts with every field of the view, their income group and (minute view) commute minute."""
+    from income_groups import assign_income_groups
+
+    # Keep only rows that have all fields needed for this dashboard.
+    # We need: income (median), transit share (% using public transit),
+    # and mean travel time to work (or its distribution).
+    df = df.dropna(subset=["median_income", "pct_public"] + commute_columns(slider)).copy()
+    print("Rows used:", len(df))
+
+    # Build income quartiles so each tract is assigned to an income group.
+    # This matches the same grouping, ordering and colors used in the other
+    # dashboards (purple = lowest income, yellow = highest income).
+    df["Income Group"] = assign_income_groups(df["median_income"], n_groups=n_groups)
+
+    if slider == "minute":
+        # Convert mean commute time into whole minutes.
+        # This rounded value is used as the animation frame variable.
+        df["commute_min"] = df["mean_travel_time_min"].round().astype(int)
+
+        # Remove tracts with extremely short commute values (under 5 minutes
+        # by default), which are often unusual and can make the slider less meaningful.
+        df = df[df["commute_min"] >= min_commute].copy()
+    return df
+
+
+def binned_traces(fig, df, minutes, quartile_order, colors):
+    """Per-group heatmaps, with one frame of counts per commute minute."""
+    import plotly.graph_objects as go
+
+    from binning import grouped_histogram2d, nice_bin_edges, occupied_columns
+    from figure_export import group_heatmaps, heatmap_z
+
+    # Binned view: one heatmap per income group, and every frame replaces
+    # only the heatmaps' counts with those of its commute minute. All frames
+    # are counted in one pass by treating (minute, income group) as the group.
+    x_edges = nice_bin_edges(df["median_income"], SCATTER_BINS[0])
+    y_edges = nice_bin_edges(df["pct_public"], SCATTER_BINS[1])
+    n_groups = len(quartile_order)
+    minute_index = df["commute_min"].map({m: i for i, m in enumerate(minutes)}).to_numpy()
+    counts = grouped_histogram2d(
+        df["median_income"],
+        df["pct_public"],
+        minute_index * n_groups + df["Income Group"].cat.codes.to_numpy(),
+        len(minutes) * n_groups,
+        x_edges,
+        y_edges,
+    ).reshape(len(minutes), n_groups, len(y_edges) - 1, len(x_edges) - 1)
+    all_counts = counts.sum(axis=0)
+    columns = occupied_columns(all_counts)
+
+    fig.add_traces(
+        group_heatmaps(
+            all_counts,
+            x_edges,
+            y_edges,
+            quartile_order,
+            colors,
+            columns,
+            hovertemplate=(
+                "%{z} tracts<br>"
+                "Median income ≈ $%{x:,.0f}<br>"
+                "Transit share ≈ %{y:.1%}"
+            ),
+        )
     )
 
-    fig.add_trace(trace)
-    all_traces.append(trace)
+    def counts_frame(name, frame_counts):
+        return go.Frame(
+            name=name,
+            data=[go.Heatmap(z=heatmap_z(frame_counts[g], columns[g])) for g in range(n_groups)],
+            traces=list(range(n_groups)),
+        )
 
-# Build animation frames.
-# Each frame represents either:
-# "all"  → all commute minutes together, or
-# a specific minute (e.g., "25") → tracts whose mean commute equals that value.
+    fig.frames = [counts_frame("all", all_counts)] + [
+        counts_frame(str(m), counts[i]) for i, m in enumerate(minutes)
+    ]
 
-frames = []
 
-# Frame 0: "all" minutes with the full dataset.
-frames.append(go.Frame(name="all", data=all_traces))
+def threshold_traces(fig, df, render, threshold, colors):
+    """Markers sized by the share of workers commuting longer than `threshold`.
 
-# Frames for each commute minute value.
-for m in minutes:
-    df_m = df[df["commute_min"] == m]
-    minute_traces = []
+    Returns the shares of every threshold per trace for THRESHOLD_JS, URL-safe
+    base64 encoded (plotly escapes every "/" in the figure JSON).
+    """
+    import base64
 
-    for q in quartile_order:
-        sub = df_m[df_m["Income Group"] == q]
+    import numpy as np
+
+    from commute_distribution import THRESHOLDS
+    from figure_export import scatter_trace
+
+    # Threshold view: every tract stays on screen and the markers start at
+    # the `threshold` shares; THRESHOLD_JS switches to the other thresholds
+    # from the shares of all of them, embedded once per trace.
+    share_columns = commute_columns("threshold")
+    first = THRESHOLDS.index(threshold)
+    min_size, max_size = THRESHOLD_MARKER_SIZES
+    trace_shares = []
+    for q, sub in df.groupby("Income Group", observed=False, sort=True):
+        shares = sub[share_columns].to_numpy(dtype="float64")
+        percent = np.rint(np.clip(shares, 0, 1) * 100).astype(np.uint8)
+        trace_shares.append(base64.urlsafe_b64encode(percent.T.tobytes()).decode("ascii"))
+
+        fig.add_trace(
+            scatter_trace(
+                render,
+                x=sub["median_income"],
+                y=sub["pct_public"],
+                mode="markers",
+                name=q,
+                text=sub["tract_name"],
+                marker=dict(color=colors[q], size=min_size + shares[:, first] * (max_size - min_size), opacity=0.6),
+                customdata=np.column_stack([np.full(len(sub), threshold), percent[:, first] / 100]),
+                hovertemplate=(
+                    "<b>%{text}</b><br>"
+                    "Income group: " + q + "<br>"
+                    "Commuting over %{customdata[0]} minutes: %{customdata[1]:.0%} of workers<br>"
+                    "Median income: $%{x:,.0f}<br>"
+                    "Transit share: %{y:.1%}<extra></extra>"
+                ),
+            )
+        )
+    return trace_shares
+
+
+def minute_traces(fig, df, render, minutes, colors):
+    """Every tract, with name-only frames filtered by MINUTE_FILTER_JS."""
+    import plotly.graph_objects as go
+
+    from figure_export import scatter_trace
+
+    # Build the figure once with every tract ("All minutes" view).
+    # One trace per income group, partitioned with a single groupby.
+    # Each tract's data is written to the HTML only here; the commute-minute
+    # frames below carry no data and the page filters these traces instead.
+    for q, sub in df.groupby("Income Group", observed=False, sort=True):
+        # customdata stores extra fields for the hover tooltip:
+        # tract name and commute minutes (also used by the minute filter).
         customdata = list(zip(sub["tract_name"], sub["commute_min"]))
 
-        minute_traces.append(
-            go.Scatter(
+        fig.add_trace(
+            scatter_trace(
+                render,
                 x=sub["median_income"],
                 y=sub["pct_public"],
                 mode="markers",
@@ -140,37 +313,51 @@ for m in minutes:
             )
         )
 
-    frames.append(go.Frame(name=str(m), data=minute_traces))
+    # Animation frames.
+    # Each frame represents either:
+    # "all"  → all commute minutes together, or
+    # a specific minute (e.g., "25") → tracts whose mean commute equals that value.
+    # Frames are only names: the slider and Play button still step through them,
+    # and MINUTE_FILTER_JS shows the matching tracts when a frame starts,
+    # so the HTML size grows with the number of tracts, not tracts x frames.
+    fig.frames = [go.Frame(name="all")] + [go.Frame(name=str(m)) for m in minutes]
 
-fig.frames = frames
 
-# The slider controls which frame is visible: "All minutes" or a specific minute.
-slider_steps = []
+def threshold_controls(threshold):
+    """Slider, buttons and title of the threshold view."""
+    from commute_distribution import THRESHOLDS
 
-# First slider step: show all tracts at once (no filtering by commute time).
-slider_steps.append(
-    dict(
-        label="All minutes",
-        method="animate",
-        args=[
-            ["all"],
-            {
-                "frame": {"duration": 0, "redraw": True},
-                "mode": "immediate",
-                "transition": {"duration": 0},
-            },
-        ],
+    # One slider step per threshold; THRESHOLD_JS reacts to it (method
+    # "skip" = no plotly action). No animation in this view.
+    sliders = [
+        dict(
+            active=THRESHOLDS.index(threshold),
+            pad={"t": 60},
+            currentvalue={"prefix": "Workers commuting longer than (minutes): ", "visible": True},
+            steps=[dict(label=str(m), method="skip", value=str(k)) for k, m in enumerate(THRESHOLDS)],
+        )
+    ]
+    title = (
+        "Transit Reliance vs Income, sized by long commutes<br>"
+        "<sup>Marker size is the share of a tract's workers commuting longer than the "
+        "slider's minutes (from ACS travel time ranges); use the legend to highlight "
+        "an income group.</sup>"
     )
-)
+    return sliders, [], title
+
+
+def minute_controls(minutes):
+    """Slider, Play / Pause buttons and title of the commute minute view."""
+    # The slider controls which frame is visible: "All minutes" or a specific minute.
+    slider_steps = []
 
-# Add one step per commute minute so the user can scrub through the distribution.
-for m in minutes:
+    # First slider step: show all tracts at once (no filtering by commute time).
     slider_steps.append(
         dict(
-            label=str(m),
+            label="All minutes",
             method="animate",
             args=[
-                [str(m)],
+                ["all"],
                 {
                     "frame": {"duration": 0, "redraw": True},
                     "mode": "immediate",
@@ -180,93 +367,211 @@ for m in minutes:
         )
     )
 
-sliders = [
-    dict(
-        active=0,  # start with the "All minutes" view selected
-        pad={"t": 60},
-        currentvalue={
-            "prefix": "Mean commute time (minutes): ",
-            "visible": True,
-        },
-        steps=slider_steps,
-    )
-]
-
-# Play / Pause buttons for automatic animation.
-# Play walks through each minute frame; Pause stops on the current one.
-updatemenus = [
-    dict(
-        type="buttons",
-        direction="left",
-        x=0.05,
-        y=-0.1,
-        showactive=False,
-        pad={"r": 10, "t": 40},
-        buttons=[
+    # Add one step per commute minute so the user can scrub through the distribution.
+    for m in minutes:
+        slider_steps.append(
             dict(
-                label="▶",
+                label=str(m),
                 method="animate",
                 args=[
-                    None,
+                    [str(m)],
                     {
-                        "frame": {"duration": 400, "redraw": True},
-                        "fromcurrent": True,
-                        "transition": {"duration": 0},
-                    },
-                ],
-            ),
-            dict(
-                label="⏸",
-                method="animate",
-                args=[
-                    [None],
-                    {
-                        "frame": {"duration": 0, "redraw": False},
+                        "frame": {"duration": 0, "redraw": True},
                         "mode": "immediate",
+                        "transition": {"duration": 0},
                     },
                 ],
-            ),
-        ],
-    )
-]
+            )
+        )
+
+    sliders = [
+        dict(
+            active=0,  # start with the "All minutes" view selected
+            pad={"t": 60},
+            currentvalue={
+                "prefix": "Mean commute time (minutes): ",
+                "visible": True,
+            },
+            steps=slider_steps,
+        )
+    ]
+
+    # Play / Pause buttons for automatic animation.
+    # Play walks through each minute frame; Pause stops on the current one.
+    updatemenus = [
+        dict(
+            type="buttons",
+            direction="left",
+            x=0.05,
+            y=-0.1,
+            showactive=False,
+            pad={"r": 10, "t": 40},
+            buttons=[
+                dict(
+                    label="▶",
+                    method="animate",
+                    args=[
+                        None,
+                        {
+                            "frame": {"duration": 400, "redraw": True},
+                            "fromcurrent": True,
+                            "transition": {"duration": 0},
+                        },
+                    ],
+                ),
+                dict(
+                    label="⏸",
+                    method="animate",
+                    args=[
+                        [None],
+                        {
+                            "frame": {"duration": 0, "redraw": False},
+                            "mode": "immediate",
+                        },
+                    ],
+                ),
+            ],
+        )
+    ]
 
-# Layout settings: axes, legend behavior, title, margins, and controls.
-fig.update_layout(
-    template="plotly_white",
-    title=(
+    title = (
         "Transit Reliance vs Income (animated by commute time)<br>"
         "<sup>Initial view shows all tracts. Move the slider or press Play "
         "to see only tracts with a given mean commute time; use the legend "
         "to highlight an income group.</sup>"
-    ),
-    xaxis=dict(
-        title="Median household income (USD)",
-        tickprefix="$",
-        tickformat=",",
-        range=[x_min, x_max],
-    ),
-    yaxis=dict(
-        title="% of workers using public transit",
-        tickformat=".0%",
-        rangemode="tozero",
-        range=[y_min, y_max],
-    ),
-    legend_title="Income Group",
-    legend=dict(
-        itemclick="toggleothers",  # click once to isolate one income group
-        itemdoubleclick="toggle",  # double click to toggle normally
-    ),
-    sliders=sliders,
-    updatemenus=updatemenus,
-    margin=dict(l=70, r=40, t=110, b=120),
-)
-
-# Save dashboard as an interactive HTML file and display it.
-os.makedirs("./figs", exist_ok=True)
-
-fig.write_html(
-    "./figs/commute_threshold_slider.html",
-    include_plotlyjs="cdn",
-)
-
-print("Saved interactive figure to ./figs/commute_threshold_slider.html")
+    )
+    return sliders, updatemenus, title
+
+
+def build_figure(
+    df,
+    slider="minute",
+    threshold=45,
+    n_groups=4,
+    min_commute=5,
+    render="auto",
+    webgl_above=None,
+    binned_above=None,
+):
+    """The transit vs income figure of master rows `df` (see parser() for the options)."""
+    import plotly.graph_objects as go
+
+    from commute_distribution import THRESHOLDS
+    from figure_export import render_mode
+    from income_groups import group_colors, group_labels
+
+    if slider not in SLIDERS:
+        raise ValueError(f"slider must be one of {', '.join(SLIDERS)}, not {slider!r}")
+    if threshold not in THRESHOLDS:
+        raise ValueError(f"threshold must be one of {', '.join(map(str, THRESHOLDS))}, not {threshold!r}")
+
+    quartile_order = group_labels(n_groups)
+    colors = group_colors(n_groups)
+
+    with step("transform", rows_in=len(df)) as s:
+        df = prepare(df, slider, n_groups, min_commute)
+        minutes = None
+        if slider == "minute":
+            if df.empty:
+                raise ValueError(f"no tracts with a mean commute of at least {min_commute} minutes")
+            # Collect the sorted list of unique commute minutes to use as frames.
+            minutes = sorted(df["commute_min"].unique())
+            print("Commute minutes in data:", minutes[0], "to", minutes[-1])
+        s.record(rows_out=len(df))
+
+    with step("figure"):
+        # Fix axis ranges for all frames so the animation feels stable.
+        x_min = df["median_income"].min()
+        x_max = df["median_income"].max()
+        y_min = 0.0
+        y_max = df["pct_public"].max() * 1.05
+
+        # Large tract sets are drawn with WebGL, or binned into per-quartile heatmaps
+        # when even that would be too much data for the page.
+        # The threshold view sizes individual markers, so it is never binned.
+        render = render_mode(render, len(df), webgl_above, binned_above)
+        if slider == "threshold" and render == "binned":
+            print("The threshold view draws every tract; using WebGL instead of binning")
+            render = "webgl"
+        fig = go.Figure()
+
+        # layout.meta tells page_options (and the page) which view this is
+        if render == "binned":
+            binned_traces(fig, df, minutes, quartile_order, colors)
+            meta = {"view": "binned"}
+        elif slider == "threshold":
+            trace_shares = threshold_traces(fig, df, render, threshold, colors)
+            meta = {
+                "view": "threshold",
+                "thresholds": list(THRESHOLDS),
+                "shares": trace_shares,
+                "marker_sizes": list(THRESHOLD_MARKER_SIZES),
+            }
+        else:
+            minute_traces(fig, df, render, minutes, colors)
+            meta = {"view": "minute"}
+
+        if slider == "threshold":
+            sliders, updatemenus, title = threshold_controls(threshold)
+        else:
+            sliders, updatemenus, title = minute_controls(minutes)
+
+        # Layout settings: axes, legend behavior, title, margins, and controls.
+        fig.update_layout(
+            template="plotly_white",
+            title=title,
+            xaxis=dict(
+                title="Median household income (USD)",
+                tickprefix="$",
+                tickformat=",",
+                range=[x_min, x_max],
+            ),
+            yaxis=dict(
+                title="% of workers using public transit",
+                tickformat=".0%",
+                rangemode="tozero",
+                range=[y_min, y_max],
+            ),
+            legend_title="Income Group",
+            legend=dict(
+                itemclick="toggleothers",  # click once to isolate one income group
+                itemdoubleclick="toggle",  # double click to toggle normally
+            ),
+            sliders=sliders,
+            updatemenus=updatemenus,
+            margin=dict(l=70, r=40, t=110, b=120),
+            meta=meta,
+        )
+    return fig
+
+
+def page_options(fig):
+    """write_html options of the figure's page: the script of its view, if any."""
+    view = (fig.layout.meta or {}).get("view")
+    post_script = {"threshold": THRESHOLD_JS, "minute": MINUTE_FILTER_JS}.get(view)
+    return {"post_script": post_script}
+
+
+def main(argv=None):
+    from figure_export import figure_path, write_figure
+
+    args = parser().parse_args(argv)
+
+    # Load input data produced by the preprocessing pipeline.
+    df = load_data(args.year, args.slider)
+    fig = build_figure(df, **figure_params(args))
+
+    # Save dashboard as an interactive HTML file and display it.
+    output_path = figure_path(OUTPUT_NAME, args.year)
+    write_figure(
+        fig,
+        output_path,
+        offline=args.offline,  # local plotly.js instead of the CDN
+        **page_options(fig),
+    )
+
+    print("Saved interactive figure to", output_path)
+
+
+if __name__ == "__main__":
+    main()
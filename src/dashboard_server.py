@@ -0,0 +1,404 @@
+# dashboard_server.py
+#
+# Local HTTP server that builds the dashboards on request instead of
+# writing static HTML files.
+# - tract_mobility_master is read once and kept in memory (a panel year on
+#   its first request); when the file on disk changes it is read again and
+#   gets a new dataset version (the first 12 hex digits of its sha256).
+# - The dashboard modules are imported once, so a request only pays for
+#   build_figure (see income_vs_car_dashboard.py).
+# - Built figures are kept as ready-to-send JSON in an LRU cache keyed by
+#   (dashboard, year, dataset version, parameters). A repeated request is
+#   answered from the cache, and concurrent requests for a figure that is
+#   being built wait for that one build instead of repeating the pandas and
+#   plotly work. Entries of an outdated dataset version are dropped.
+# - Requests are handled by one thread each (ThreadingHTTPServer).
+#
+# Endpoints (GET):
+#   /                        index of the dashboards and their parameters
+#   /view/<dashboard>?...    page that fetches and draws a figure
+#   /figure/<dashboard>?...  {"dashboard", "year", "version", "params", "build_seconds",
+#                             "figure", "config", "post_script"} as JSON; post_script is
+#                             the page script, with {plot_id} for the figure's div id
+#   /dashboards              dashboards and their parameters as JSON
+#   /status                  dataset versions and cache statistics
+#   /plotly.min.js           the plotly.js bundle of the installed plotly
+# Query parameters are the dashboard's command-line options, with "_" or
+# "-" (flags take 1 / 0), e.g.
+#   /figure/commute_threshold?slider=threshold&threshold=30&groups=5
+#
+# Usage:
+#   python src/dashboard_server.py [--port 8050] [--cache-size 128] [--no-warm]
+
+import argparse
+import importlib
+import json
+import os
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from concurrent.futures import Future
+from html import escape
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+from datastore import MASTER_NAME, file_digest, load_master, partition_name, table_files
+
+# URL name -> dashboard module
+DASHBOARDS = {
+    "income_vs_car": "income_vs_car_dashboard",
+    "commute_inequality": "commute_inequality_dashboard",
+    "commute_threshold": "commute_threshold_dashboard",
+}
+# Command-line options that only concern writing the HTML file
+FILE_OPTIONS = ("help", "offline")
+TRUE_VALUES = ("", "1", "true", "yes", "on")
+FALSE_VALUES = ("0", "false", "no", "off")
+
+DEFAULT_PORT = 8050
+DEFAULT_CACHE_SIZE = 128
+
+VIEW_HTML = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<script src="/plotly.min.js"></script>
+</head>
+<body style="margin: 0">
+<div id="figure" style="height: 100vh"></div>
+<script>
+fetch('/figure/{name}' + location.search).then(function (r) {{
+    return r.json().then(function (p) {{ if (!r.ok) {{ throw new Error(p.error); }} return p; }});
+}}).then(function (p) {{
+    var fig = Object.assign({{config: p.config}}, p.figure);
+    return Plotly.newPlot('figure', fig).then(function () {{
+        if (p.post_script) {{ new Function(p.post_script.split('{{plot_id}}').join('figure'))(); }}
+    }});
+}}).catch(function (e) {{ document.getElementById('figure').textContent = e.message; }});
+</script>
+</body>
+</html>
+"""
+
+
+class MasterData:
+    """tract_mobility_master frames kept in memory, read again when their file changes."""
+
+    def __init__(self, on_reload=None):
+        self.lock = threading.Lock()
+        self.frames = {}  # year -> (file stamp, version, frame)
+        self.on_reload = on_reload
+
+    @staticmethod
+    def source(year=None):
+        """The file load_master reads for `year` (None = the single-year master)."""
+        name = MASTER_NAME if year is None else partition_name(MASTER_NAME, year)
+        for path in table_files(name):
+            if os.path.exists(path):
+                return path
+        if year is None:
+            raise LookupError("No tract master yet; run pipeline.py first")
+        raise LookupError(f"No {year} partition of the tract panel; run build_panel.py first")
+
+    def get(self, year=None):
+        """(dataset version, frame) of the master, or of one panel year."""
+        path = self.source(year)
+        stat = os.stat(path)
+        stamp = (path, stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            current = self.frames.get(year)
+            if current is None or current[0] != stamp:
+                start = time.perf_counter()
+                df = load_master(year=year)
+                version = file_digest(path)[:12]
+                self.frames[year] = current = (stamp, version, df)
+                print(f"Loaded {os.path.basename(path)} ({len(df):,} rows, version {version}) in {time.perf_counter() - start:.2f}s")
+                if self.on_reload:
+                    self.on_reload(year, version)
+        return current[1], current[2]
+
+    def versions(self):
+        with self.lock:
+            return {"master" if year is None else str(year): entry[1] for year, entry in self.frames.items()}
+
+
+class FigureCache:
+    """LRU cache of built figures; a key that is being built is built only once.
+
+    get() returns (value, how) with how = "hit" (from the cache), "built"
+    (by this call) or "shared" (waited for a build by another thread).
+    """
+
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.pending = {}  # key -> Future of the build in progress
+        self.counts = {"hit": 0, "built": 0, "shared": 0, "failed": 0}
+
+    def get(self, key, build):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.counts["hit"] += 1
+                return self.entries[key], "hit"
+            future = self.pending.get(key)
+            owner = future is None
+            if owner:
+                future = self.pending[key] = Future()
+            else:
+                self.counts["shared"] += 1
+        if not owner:
+            return future.result(), "shared"
+
+        try:
+            value = build()
+        except BaseException as exc:
+            with self.lock:
+                del self.pending[key]
+                self.counts["failed"] += 1
+            future.set_exception(exc)
+            raise
+        with self.lock:
+            del self.pending[key]
+            self.counts["built"] += 1
+            if self.maxsize > 0:
+                self.entries[key] = value
+                while len(self.entries) > self.maxsize:
+                    self.entries.popitem(last=False)
+        future.set_result(value)
+        return value, "built"
+
+    def discard(self, predicate):
+        """Drop the entries whose key matches `predicate`."""
+        with self.lock:
+            for key in [key for key in self.entries if predicate(key)]:
+                del self.entries[key]
+
+    def stats(self):
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "maxsize": self.maxsize,
+                "megabytes": sum(len(value) for value in self.entries.values()) / 1e6,
+                "building": len(self.pending),
+                **self.counts,
+            }
+
+
+def query_actions(module):
+    """The dashboard's parser and its options that can be given in a query, by dest."""
+    parser = module.parser()
+
+    def error(message):
+        raise ValueError(message)
+
+    parser.error = error  # raise instead of exiting the server
+    actions = {
+        action.dest: action
+        for action in parser._actions
+        if action.option_strings and action.dest not in FILE_OPTIONS
+    }
+    return parser, actions
+
+
+def parse_query(module, query):
+    """(build_figure keyword arguments, panel year) of a query string.
+
+    The query is turned into command-line arguments and validated by the
+    dashboard's own parser, so the same defaults, types and choices apply.
+    """
+    parser, actions = query_actions(module)
+    argv = []
+    for key, value in dict(parse_qsl(query, keep_blank_values=True)).items():
+        action = actions.get(key.replace("-", "_"))
+        if action is None:
+            raise ValueError(f"unknown parameter {key!r}; use {', '.join(sorted(actions))}")
+        option = action.option_strings[-1]
+        if action.nargs == 0:
+            if value.lower() in TRUE_VALUES:
+                argv.append(option)
+            elif value.lower() not in FALSE_VALUES:
+                raise ValueError(f"{key} is a flag; use 1 or 0, not {value!r}")
+        else:
+            argv += [option, value]
+    args = parser.parse_args(argv)
+    return module.figure_params(args), getattr(args, "year", None)
+
+
+def describe(module):
+    """Description and parameters (default, choices, help) of a dashboard."""
+    parser, actions = query_actions(module)
+    params = {
+        dest: {
+            "default": action.default,
+            "choices": list(action.choices) if action.choices else None,
+            "help": action.help,
+        }
+        for dest, action in actions.items()
+    }
+    return {"description": parser.description, "params": params}
+
+
+class DashboardServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, cache_size=DEFAULT_CACHE_SIZE):
+        super().__init__(address, DashboardHandler)
+        self.modules = {name: importlib.import_module(module) for name, module in DASHBOARDS.items()}
+        self.cache = FigureCache(cache_size)
+        self.data = MasterData(on_reload=self.drop_outdated)
+        self._plotlyjs = None
+
+    def drop_outdated(self, year, version):
+        self.cache.discard(lambda key: key[1] == year and key[2] != version)
+
+    def module(self, name):
+        if name not in self.modules:
+            raise LookupError(f"unknown dashboard {name!r}; use {', '.join(self.modules)}")
+        return self.modules[name]
+
+    def figure(self, name, query=""):
+        """(JSON bytes, cache outcome) of a dashboard figure."""
+        module = self.module(name)
+        params, year = parse_query(module, query)
+        version, df = self.data.get(year)
+        key = (name, year, version, tuple(sorted(params.items())))
+        return self.cache.get(key, lambda: self.build(name, module, df, version, year, params))
+
+    @staticmethod
+    def build(name, module, df, version, year, params):
+        from plotly.io.json import to_json_plotly
+
+        from figure_export import compact_figure
+
+        start = time.perf_counter()
+        fig = compact_figure(module.build_figure(df, **params))
+        options = module.page_options(fig)
+        payload = {
+            "dashboard": name,
+            "year": year,
+            "version": version,
+            "params": params,
+            "build_seconds": time.perf_counter() - start,
+            "figure": fig.to_plotly_json(),
+            "config": options.get("config", {}),
+            "post_script": options.get("post_script"),
+        }
+        return to_json_plotly(payload).encode("utf-8")
+
+    def warm(self):
+        """Load the master and build every dashboard with its defaults."""
+        for name in self.modules:
+            start = time.perf_counter()
+            self.figure(name)
+            print(f"Built {name} in {time.perf_counter() - start:.2f}s")
+
+    def plotlyjs(self):
+        if self._plotlyjs is None:
+            from plotly.offline import get_plotlyjs
+
+            self._plotlyjs = get_plotlyjs().encode("utf-8")
+        return self._plotlyjs
+
+    def status(self):
+        return {"versions": self.data.versions(), "cache": self.cache.stats()}
+
+    def index(self):
+        items = []
+        for name, module in self.modules.items():
+            info = describe(module)
+            params = ", ".join(
+                f"<code>{escape(dest)}</code> ({escape(str(p['default']))})" for dest, p in info["params"].items()
+            )
+            items.append(
+                f'<li><a href="/view/{name}">{escape(name)}</a>: {escape(info["description"])}<br>'
+                f"<small>Parameters (defaults): {params}</small></li>"
+            )
+        return (
+            '<!DOCTYPE html>\n<html><head><meta charset="utf-8"><title>Mobility dashboards</title></head>\n'
+            "<body><h1>Mobility dashboards</h1>\n<ul>\n" + "\n".join(items) + "\n</ul>\n"
+            "<p>Add parameters as a query, e.g. "
+            '<a href="/view/commute_threshold?slider=threshold&amp;threshold=30">'
+            "/view/commute_threshold?slider=threshold&amp;threshold=30</a>.</p>\n</body></html>\n"
+        )
+
+
+class DashboardHandler(BaseHTTPRequestHandler):
+    server_version = "MobilityDashboards/1.0"
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        parts = url.path.strip("/").split("/")
+        server = self.server
+        try:
+            if url.path == "/":
+                self.send(server.index().encode("utf-8"), "text/html; charset=utf-8")
+            elif len(parts) == 2 and parts[0] == "figure":
+                body, how = server.figure(parts[1], url.query)
+                self.send(body, "application/json", {"X-Figure-Cache": how})
+            elif len(parts) == 2 and parts[0] == "view":
+                server.module(parts[1])
+                page = VIEW_HTML.format(title=escape(parts[1]), name=parts[1])
+                self.send(page.encode("utf-8"), "text/html; charset=utf-8")
+            elif url.path == "/dashboards":
+                info = {name: describe(module) for name, module in server.modules.items()}
+                self.send(json.dumps(info, indent=2).encode("utf-8"), "application/json")
+            elif url.path == "/status":
+                self.send(json.dumps(server.status(), indent=2).encode("utf-8"), "application/json")
+            elif url.path == "/plotly.min.js":
+                self.send(server.plotlyjs(), "application/javascript", {"Cache-Control": "max-age=86400"})
+            else:
+                raise LookupError(f"no page {url.path}")
+        except ValueError as exc:
+            self.send_error_json(HTTPStatus.BAD_REQUEST, exc)
+        except LookupError as exc:
+            self.send_error_json(HTTPStatus.NOT_FOUND, exc)
+        except Exception as exc:
+            traceback.print_exc()
+            self.send_error_json(HTTPStatus.INTERNAL_SERVER_ERROR, exc)
+
+    def send(self, body, content_type, headers=None, status=HTTPStatus.OK):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_json(self, status, exc):
+        self.send(json.dumps({"error": str(exc)}).encode("utf-8"), "application/json", status=status)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the dashboards as JSON figures built on request.")
+    parser.add_argument("--host", default="127.0.0.1", help="interface to listen on (default 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"port (default {DEFAULT_PORT})")
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=DEFAULT_CACHE_SIZE,
+        help=f"built figures kept in memory (default {DEFAULT_CACHE_SIZE}; 0 = no cache)",
+    )
+    parser.add_argument("--no-warm", action="store_true", help="do not build the default figures at start-up")
+    args = parser.parse_args(argv)
+
+    server = DashboardServer((args.host, args.port), cache_size=args.cache_size)
+    if not args.no_warm:
+        server.warm()
+    host, port = server.server_address[:2]
+    print(f"Serving the dashboards on http://{host}:{port}/ (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
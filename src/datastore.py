@@ -0,0 +1,187 @@
+# datastore.py
+#
+# Typed, columnar storage for the processed tables in data_processed/.
+# Each table is written as Parquet (tract_name as a categorical, geoid as an
+# integer, percentage shares as float32) so readers can load only the columns
+# they need. CSV is still written next to it as an optional export, and is
+# used as the fallback when pyarrow is not installed or a Parquet file has not
+# been built yet. The CSV keeps the shares at full precision, and the stages
+# that compute new tables (the master, intervals, rollup) read it with
+# exact=True, so float32 only reaches the dashboards.
+# Multi-year panels (build_panel.py) are stored one partition per year, as
+# data_processed/panel/year=<year>/<name>, so a reader loads only its year.
+
+import hashlib
+import os
+from contextlib import contextmanager
+
+import pandas as pd
+
+from instrument import step, wrote
+from paths import PROCESSED_DIR
+
+MASTER_NAME = "tract_mobility_master"
+# Directory (under data_processed/) of the per-year panel partitions
+PANEL_DIR = "panel"
+
+# Repeated label strings are stored once per distinct value.
+CATEGORICAL_COLUMNS = ["tract_name", "station_name"]
+
+try:
+    import pyarrow  # noqa: F401
+
+    HAVE_PARQUET = True
+except ImportError:
+    HAVE_PARQUET = False
+
+
+def table_path(name, ext):
+    return os.path.join(PROCESSED_DIR, f"{name}.{ext}")
+
+
+def partition_name(name, year):
+    """Table name of one year's partition of a panel table."""
+    return os.path.join(PANEL_DIR, f"year={year}", name)
+
+
+def panel_years(name=MASTER_NAME):
+    """Years with a written partition of the panel table `name`, ascending."""
+    root = os.path.join(PROCESSED_DIR, PANEL_DIR)
+    if not os.path.isdir(root):
+        return []
+    years = [int(entry[len("year=") :]) for entry in os.listdir(root) if entry.startswith("year=")]
+    return sorted(y for y in years if any(os.path.exists(p) for p in table_files(partition_name(name, y))))
+
+
+def file_digest(path, limit=None):
+    """sha256 of a file's content (its first `limit` bytes if given), or None if it does not exist."""
+    if not os.path.exists(path):
+        return None
+    digest = hashlib.sha256()
+    remaining = limit
+    with open(path, "rb") as fh:
+        while remaining is None or remaining > 0:
+            block = fh.read(1 << 20 if remaining is None else min(1 << 20, remaining))
+            if not block:
+                break
+            digest.update(block)
+            if remaining is not None:
+                remaining -= len(block)
+    return digest.hexdigest()
+
+
+def table_files(name, csv=True):
+    """Paths that write_table(df, name, csv) produces."""
+    files = [table_path(name, "parquet")] if HAVE_PARQUET else []
+    if csv or not HAVE_PARQUET:
+        files.append(table_path(name, "csv"))
+    return files
+
+
+@contextmanager
+def atomic_output(path):
+    """Yield a temporary path next to `path` and move it into place on success.
+
+    os.replace is atomic on the same filesystem, so readers (and parallel
+    pipeline runs) see either the old file or the complete new one, never a
+    half-written file. On error the temporary file is removed.
+    """
+    tmp = f"{path}.tmp-{os.getpid()}"
+    try:
+        yield tmp
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def to_columnar(df, compact_shares=True):
+    """Return a copy of df with compact dtypes for columnar storage.
+
+    pct_* shares are in [0, 1] and are plotted or averaged, so float32 keeps
+    more precision than they are ever displayed with. Counts, income and
+    travel times keep their original dtypes. compact_shares=False keeps the
+    shares as they are.
+    """
+    df = df.copy()
+    if "geoid" in df.columns:
+        df["geoid"] = pd.to_numeric(df["geoid"]).astype("int64")
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype("category")
+    if compact_shares:
+        for col in df.columns:
+            if col.startswith("pct_"):
+                df[col] = df[col].astype("float32")
+    return df
+
+
+def write_table(df, name, csv=True):
+    """Save a processed table as Parquet, plus a CSV export if csv=True.
+
+    Only the Parquet file holds float32 shares; the CSV is written from the
+    untouched frame at full precision, and read_table(exact=True) reads it
+    back that way.
+    """
+    written = []
+    os.makedirs(os.path.dirname(table_path(name, "csv")), exist_ok=True)
+    with step("serialize", rows_in=len(df)):
+        if HAVE_PARQUET:
+            path = table_path(name, "parquet")
+            with atomic_output(path) as tmp:
+                to_columnar(df).to_parquet(tmp, index=False)
+            written.append(path)
+        elif not csv:
+            print("pyarrow is not installed; writing CSV instead of Parquet")
+            csv = True
+
+        if csv:
+            path = table_path(name, "csv")
+            with atomic_output(path) as tmp:
+                df.to_csv(tmp, index=False)
+            written.append(path)
+        for path in written:
+            wrote(path)
+    return written
+
+
+def read_table(name, columns=None, exact=False):
+    """Load a processed table, reading only `columns` (all columns if None).
+
+    Parquet is preferred; the CSV export is read (with the same projection and
+    dtypes) when Parquet is unavailable. exact=True is for stages that compute
+    new tables from this one: it reads the CSV export, so pct_* shares are
+    float64 with the precision they were written with instead of float32,
+    and raises FileNotFoundError when there is no CSV export.
+    """
+    with step("load") as s:
+        parquet = table_path(name, "parquet")
+        csv = table_path(name, "csv")
+        if exact and not os.path.exists(csv):
+            raise FileNotFoundError(
+                f"{csv} does not exist; reading {name} at full precision needs its CSV export "
+                "(write it with write_table(..., csv=True))"
+            )
+        if HAVE_PARQUET and os.path.exists(parquet) and not exact:
+            df = pd.read_parquet(parquet, columns=columns)
+        else:
+            df = pd.read_csv(csv, usecols=columns)
+            if columns is not None:
+                df = df[columns]
+            df = to_columnar(df, compact_shares=not exact)
+        s.record(rows_out=len(df))
+    return df
+
+
+def load_master(columns=None, year=None, exact=False):
+    """Load the tract-level master dataset (optionally only some columns).
+
+    With a year, only that year's partition of the multi-year panel is read.
+    exact=True keeps the shares at full precision (see read_table).
+    """
+    if year is None:
+        return read_table(MASTER_NAME, columns=columns, exact=exact)
+    if year not in panel_years():
+        available = ", ".join(map(str, panel_years())) or "none; run build_panel.py"
+        raise FileNotFoundError(f"No {year} partition of the tract panel (available years: {available})")
+    return read_table(partition_name(MASTER_NAME, year), columns=columns, exact=exact)
@@ -1,8 +1,7 @@
-import pandas as pd
+from datastore import load_master
 
 # 1. Read the master dataset
-file_path = "./data_processed/tract_mobility_master.csv"
-df = pd.read_csv(file_path)
+df = load_master()
 
 print("=== BASIC INFO ===")
 print("Shape (rows, columns):", df.shape)
@@ -0,0 +1,237 @@
+# figure_export.py
+#
+# Writing dashboards to HTML.
+# - Numeric trace arrays are stored as compact typed arrays: plotly encodes
+#   numpy arrays as base64 binary in the HTML, and we downcast them first
+#   (whole numbers -> int32, other floats -> float32), which keeps ~7
+#   significant digits, more than any axis or hover label shows.
+# - Offline mode references one local plotly.js file next to the figures
+#   instead of the CDN, so the dashboards open on hosts without internet
+#   access and all figures share a single copy of the library.
+# - Scatter plots pick a rendering mode from the number of points: SVG for
+#   small data, WebGL (Scattergl) for larger data, and above a second
+#   threshold per-group 2D histograms (heatmaps) binned in Python, so the
+#   HTML size stops growing with the number of tracts.
+
+import argparse
+import os
+
+import numpy as np
+
+from datastore import atomic_output
+from instrument import step, wrote
+from paths import FIGS_DIR
+
+# Trace attributes that hold per-point numeric data.
+ARRAY_ATTRS = ("x", "y", "z", "base", "width")
+
+RENDER_MODES = ("auto", "svg", "webgl", "binned")
+# Default point counts above which "auto" switches to WebGL / binning
+WEBGL_ABOVE = 5_000
+BINNED_ABOVE = 100_000
+
+INT32_MIN = np.iinfo(np.int32).min
+INT32_MAX = np.iinfo(np.int32).max
+FLOAT32_MAX = np.finfo(np.float32).max
+
+
+def compact_array(values):
+    """Downcast a numeric array to int32/float32 when that is safe.
+
+    Non-numeric data (e.g. tract names) is returned unchanged. 2-D arrays
+    (heatmap z) are handled like 1-D ones.
+    """
+    if values is None or isinstance(values, (str, dict)):
+        return values
+    arr = np.asarray(values)
+    if arr.dtype.kind not in "iuf" or arr.ndim not in (1, 2):
+        return values
+
+    if arr.dtype.kind in "iu":
+        if arr.size and (arr.min() < INT32_MIN or arr.max() > INT32_MAX):
+            return values
+        return arr.astype(np.int32)
+
+    finite = arr[np.isfinite(arr)]
+    largest = np.abs(finite).max() if finite.size else 0.0
+    if largest > FLOAT32_MAX:
+        return values
+    if finite.size == arr.size and np.array_equal(finite, np.round(finite)):
+        # whole numbers: exact as int32, but not as float32 beyond 2**24
+        return arr.astype(np.int32) if largest <= INT32_MAX else values
+    return arr.astype(np.float32)
+
+
+def compact_figure(fig):
+    """Downcast the numeric arrays of every trace (and animation frame) in place."""
+    traces = list(fig.data)
+    for frame in fig.frames or ():
+        traces.extend(frame.data or ())
+    for trace in traces:
+        for attr in ARRAY_ATTRS:
+            if attr in trace and trace[attr] is not None:
+                compact = compact_array(trace[attr])
+                # plotly ignores assigning an equal array, so clear it first
+                trace[attr] = None
+                trace[attr] = compact
+    return fig
+
+
+def local_plotlyjs_path(directory):
+    """Where the shared plotly.js bundle for figures in `directory` lives."""
+    from plotly.offline import get_plotlyjs_version
+
+    return os.path.join(directory, f"plotly-{get_plotlyjs_version()}.min.js")
+
+
+def local_plotlyjs(directory):
+    """Write the plotly.js bundle into `directory` once and return its file name.
+
+    The file name carries the plotly.js version, so upgrading plotly writes a
+    new bundle instead of silently mixing versions.
+    """
+    from plotly.offline import get_plotlyjs
+
+    path = local_plotlyjs_path(directory)
+    if not os.path.exists(path):
+        with atomic_output(path) as tmp:
+            with open(tmp, "w", encoding="utf-8") as fh:
+                fh.write(get_plotlyjs())
+    return os.path.basename(path)
+
+
+def write_figure(fig, path, offline=False, **write_html_kwargs):
+    """Compact `fig` and write it to `path` as a standalone HTML page.
+
+    offline=False loads plotly.js from the CDN; offline=True uses the shared
+    local bundle in the same directory as `path`.
+    """
+    with step("serialize"):
+        compact_figure(fig)
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        include = local_plotlyjs(directory) if offline else "cdn"
+        with atomic_output(path) as tmp:
+            fig.write_html(tmp, include_plotlyjs=include, **write_html_kwargs)
+        wrote(path)
+    return path
+
+
+def dashboard_parser(description, years=True):
+    """Command-line options shared by every dashboard script.
+
+    years=True adds --year, for dashboards on the tract master that can
+    show one year of the multi-year panel instead (see build_panel.py).
+    """
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="reference a local plotly.js next to the HTML instead of the CDN",
+    )
+    if years:
+        parser.add_argument(
+            "--year",
+            type=int,
+            default=None,
+            help="show this ACS year of the tract panel (loads only its partition); default: the single-year master",
+        )
+    return parser
+
+
+def figure_path(filename, year=None):
+    """Output path in figs/ of a dashboard, with the panel year in the name if any."""
+    if year is not None:
+        stem, ext = os.path.splitext(filename)
+        filename = f"{stem}_{year}{ext}"
+    return os.path.join(FIGS_DIR, filename)
+
+
+def add_render_args(parser):
+    """Options choosing how scatter plots are drawn (see render_mode)."""
+    parser.add_argument(
+        "--render",
+        choices=RENDER_MODES,
+        default="auto",
+        help="scatter rendering: svg, webgl, binned heatmaps, or auto by point count",
+    )
+    parser.add_argument(
+        "--webgl-above",
+        type=int,
+        default=WEBGL_ABOVE,
+        help=f"auto mode uses WebGL above this many points (default {WEBGL_ABOVE:,})",
+    )
+    parser.add_argument(
+        "--binned-above",
+        type=int,
+        default=BINNED_ABOVE,
+        help=f"auto mode bins the points above this many (default {BINNED_ABOVE:,})",
+    )
+    return parser
+
+
+def render_params(args):
+    """build_figure keyword arguments of the add_render_args options."""
+    return {"render": args.render, "webgl_above": args.webgl_above, "binned_above": args.binned_above}
+
+
+def render_mode(render, n_points, webgl_above=None, binned_above=None):
+    """Resolve render "auto" to svg, webgl or binned for `n_points` points.
+
+    The thresholds default to WEBGL_ABOVE and BINNED_ABOVE.
+    """
+    if render != "auto":
+        return render
+    if n_points > (BINNED_ABOVE if binned_above is None else binned_above):
+        return "binned"
+    if n_points > (WEBGL_ABOVE if webgl_above is None else webgl_above):
+        return "webgl"
+    return "svg"
+
+
+def scatter_trace(render, **kwargs):
+    """go.Scattergl in webgl mode, go.Scatter otherwise."""
+    import plotly.graph_objects as go
+
+    return go.Scattergl(**kwargs) if render == "webgl" else go.Scatter(**kwargs)
+
+
+def heatmap_z(group_counts, columns):
+    """Heatmap z for one group: counts cropped to `columns`, empty cells NaN."""
+    z = group_counts[:, columns].astype("float64")
+    z[z == 0] = np.nan
+    return z
+
+
+def group_heatmaps(counts, x_edges, y_edges, labels, colors, columns, hovertemplate):
+    """One heatmap trace per group from (n_groups, ny, nx) binned counts.
+
+    Each group is shaded from a light to the full shade of its own color and
+    cropped to its `columns` (see binning.occupied_columns); empty cells are
+    gaps, so overlapping groups stay visible. The traces have legend entries,
+    so the usual legend toggles keep working.
+    """
+    import plotly.graph_objects as go
+    from plotly.colors import convert_colors_to_same_type
+
+    x_centers = (x_edges[:-1] + x_edges[1:]) / 2
+    y_centers = (y_edges[:-1] + y_edges[1:]) / 2
+    traces = []
+    for group, label in enumerate(labels):
+        r, g, b = (round(255 * c) for c in convert_colors_to_same_type(colors[label], "tuple")[0][0])
+        traces.append(
+            go.Heatmap(
+                x=x_centers[columns[group]],
+                y=y_centers,
+                z=heatmap_z(counts[group], columns[group]),
+                name=label,
+                legendgroup=label,
+                showlegend=True,
+                showscale=False,
+                colorscale=[[0, f"rgba({r}, {g}, {b}, 0.25)"], [1, f"rgb({r}, {g}, {b})"]],
+                zmin=0,
+                hoverongaps=False,
+                hovertemplate=hovertemplate + "<extra>" + label + "</extra>",
+            )
+        )
+    return traces
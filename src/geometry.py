@@ -0,0 +1,283 @@
+# geometry.py
+#
+# Polygon boundaries (e.g. community_boundaries.csv) as flat NumPy arrays.
+#
+# WKT POLYGON / MULTIPOLYGON strings are parsed without creating a Python
+# object per vertex: the parenthesis structure of all geometries is read with
+# vectorized operations on the raw bytes, and all coordinates are converted
+# in a single np.fromstring call. The layout follows GeoArrow:
+#   coords        (n_vertices, 2) float64, x = longitude, y = latitude
+#   ring_offsets  ring i       = coords[ring_offsets[i]:ring_offsets[i + 1]]
+#   part_offsets  polygon j    = rings  part_offsets[j] .. part_offsets[j + 1]
+#   geom_offsets  geometry k   = polygons geom_offsets[k] .. geom_offsets[k + 1]
+# The first ring of every polygon is its exterior, the rest are holes.
+#
+# Parsed boundaries are cached in one binary file next to the CSV
+# (<name>.geomcache). Its arrays are memory-mapped on load, so later runs
+# neither parse the WKT nor read the whole file up front.
+
+import json
+import os
+import struct
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from datastore import atomic_output
+from paths import RAW_DIR
+
+COMMUNITY_PATH = os.path.join(RAW_DIR, "community_boundaries.csv")
+GEOMETRY_COLUMN = "the_geom"
+
+# Depth of the parentheses around a ring for each WKT type
+RING_DEPTH = {"POLYGON": 2, "MULTIPOLYGON": 3}
+
+CACHE_SUFFIX = ".geomcache"
+CACHE_MAGIC = b"GEOMCACHE1\n"
+CACHE_ALIGN = 64
+ARRAY_NAMES = ("coords", "ring_offsets", "part_offsets", "geom_offsets")
+# WKT text parsed per batch (bounds the temporary per-byte arrays)
+BATCH_BYTES = 32 << 20
+
+# Bytes that carry the WKT structure
+_STRUCTURE_BYTES = np.zeros(256, dtype=bool)
+_STRUCTURE_BYTES[np.frombuffer(b"(),", dtype=np.uint8)] = True
+# bytes.translate table keeping only what can be part of a coordinate
+# (digits, sign, decimal point, exponent); everything else becomes a space
+_NUMBERS_ONLY = bytes(c if chr(c) in "0123456789+-.eE" else ord(" ") for c in range(256))
+
+
+@dataclass(frozen=True)
+class Geometries:
+    """Polygon geometries in flat offset arrays (see the module comment)."""
+
+    coords: np.ndarray
+    ring_offsets: np.ndarray
+    part_offsets: np.ndarray
+    geom_offsets: np.ndarray
+
+    def __len__(self):
+        return len(self.geom_offsets) - 1
+
+    @property
+    def n_rings(self):
+        return len(self.ring_offsets) - 1
+
+    def vertex_offsets(self):
+        """Vertex range of every geometry: coords[v[k]:v[k + 1]]."""
+        return self.ring_offsets[self.part_offsets[self.geom_offsets]]
+
+    def ring_geometry(self):
+        """Index of the geometry each ring belongs to."""
+        ring_part = np.repeat(np.arange(len(self.part_offsets) - 1), np.diff(self.part_offsets))
+        part_geom = np.repeat(np.arange(len(self)), np.diff(self.geom_offsets))
+        return part_geom[ring_part]
+
+    def bounds(self):
+        """(n_geometries, 4) array of min x, min y, max x, max y (NaN if empty)."""
+        starts = self.vertex_offsets()
+        sizes = np.diff(starts)
+        out = np.full((len(self), 4), np.nan)
+        nonempty = sizes > 0
+        if nonempty.any():
+            idx = starts[:-1][nonempty]
+            out[nonempty, :2] = np.minimum.reduceat(self.coords, idx, axis=0)
+            out[nonempty, 2:] = np.maximum.reduceat(self.coords, idx, axis=0)
+        return out
+
+
+def parse_wkt(wkt, batch_bytes=BATCH_BYTES):
+    """Parse a sequence of WKT POLYGON / MULTIPOLYGON strings into Geometries.
+
+    Geometries are parsed in batches of about `batch_bytes` of text, which
+    bounds the temporary copies of the text.
+
+    Raises ValueError for other geometry types, unbalanced parentheses or
+    coordinates that are not 2-D.
+    """
+    wkt = [str(w).strip() for w in wkt]
+    sizes = np.cumsum([len(w) + 1 for w in wkt])
+    batch = sizes // batch_bytes
+    cuts = np.flatnonzero(np.diff(batch)) + 1
+    bounds = [0, *cuts.tolist(), len(wkt)]
+    parts = [_parse_batch(wkt[a:b]) for a, b in zip(bounds[:-1], bounds[1:])]
+    return parts[0] if len(parts) == 1 else concat_geometries(parts)
+
+
+def concat_geometries(parts):
+    """Join several Geometries into one, shifting their offsets."""
+    coords = np.concatenate([g.coords for g in parts])
+    offsets = {}
+    for name, counts in (
+        ("ring_offsets", [len(g.coords) for g in parts]),
+        ("part_offsets", [g.n_rings for g in parts]),
+        ("geom_offsets", [len(g.part_offsets) - 1 for g in parts]),
+    ):
+        shifts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        offsets[name] = np.concatenate(
+            [[0]] + [getattr(g, name)[1:] + shift for g, shift in zip(parts, shifts)]
+        ).astype(np.int64)
+    return Geometries(coords=coords, **offsets)
+
+
+def _parse_batch(wkt):
+    kinds = [w.split("(", 1)[0].strip().split(" ")[0].upper() for w in wkt]
+    unknown = sorted(set(kinds) - set(RING_DEPTH))
+    if unknown:
+        raise ValueError(f"Unsupported WKT geometry types: {unknown}")
+
+    # Drop the type keywords; what is left is parentheses, commas and numbers.
+    bodies = [w[w.find("(") :] if "(" in w else "" for w in wkt]
+    text = "".join(body + "\n" for body in bodies).encode("ascii")
+    geom_ends = np.cumsum([len(body) + 1 for body in bodies])
+
+    # Only parentheses and commas carry structure, so the nesting depth is
+    # tracked at those positions alone (a few % of the text).
+    chars = np.frombuffer(text, dtype=np.uint8)
+    positions = np.flatnonzero(_STRUCTURE_BYTES[chars])
+    symbols = chars[positions]
+    is_open = symbols == ord("(")
+    is_close = symbols == ord(")")
+    depth = np.cumsum(is_open.astype(np.int32) - is_close.astype(np.int32))
+    # depth after each geometry's last symbol must be back to 0
+    last = np.searchsorted(positions, geom_ends) - 1
+    if (depth < 0).any() or (depth[last[last >= 0]] != 0).any():
+        raise ValueError("Unbalanced parentheses in WKT")
+
+    symbol_geom = np.searchsorted(geom_ends, positions, side="right")
+    ring_depth = np.array([RING_DEPTH[k] for k in kinds], dtype=np.int32)[symbol_geom]
+    ring_starts = np.flatnonzero(is_open & (depth == ring_depth))
+    ring_ends = np.flatnonzero(is_close & (depth == ring_depth - 1))
+    part_starts = np.flatnonzero(is_open & (depth == ring_depth - 1))
+    vertex_commas = np.flatnonzero((symbols == ord(",")) & (depth == ring_depth))
+
+    # vertices per ring = commas directly inside the ring + 1
+    ring_sizes = np.searchsorted(vertex_commas, ring_ends) - np.searchsorted(vertex_commas, ring_starts) + 1
+    ring_offsets = np.concatenate([[0], np.cumsum(ring_sizes)])
+    ring_part = np.searchsorted(part_starts, ring_starts, side="right") - 1
+    part_rings = np.bincount(ring_part, minlength=len(part_starts))
+    part_offsets = np.concatenate([[0], np.cumsum(part_rings)])
+    geom_parts = np.bincount(symbol_geom[part_starts], minlength=len(wkt))
+    geom_offsets = np.concatenate([[0], np.cumsum(geom_parts)])
+
+    # Blank everything except the numbers and convert all coordinates at once.
+    numbers = text.translate(_NUMBERS_ONLY)
+    values = np.fromstring(numbers, sep=" ") if numbers.strip() else np.empty(0)
+    if values.size != 2 * ring_offsets[-1]:
+        raise ValueError("Only 2-D WKT coordinates are supported")
+
+    return Geometries(
+        coords=values.reshape(-1, 2),
+        ring_offsets=ring_offsets.astype(np.int64),
+        part_offsets=part_offsets.astype(np.int64),
+        geom_offsets=geom_offsets.astype(np.int64),
+    )
+
+
+def cache_path(path):
+    return os.path.splitext(path)[0] + CACHE_SUFFIX
+
+
+def _source_stamp(path):
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def _aligned(n):
+    return -(-n // CACHE_ALIGN) * CACHE_ALIGN
+
+
+def write_cache(path, attributes, geoms, source):
+    """Write attributes and geometries to a binary cache file.
+
+    Layout: magic, 8-byte header length, JSON header (source stamp,
+    attribute columns, array dtypes/shapes/offsets), then the raw arrays,
+    each aligned to 64 bytes so it can be memory-mapped.
+    """
+    arrays = {name: np.ascontiguousarray(getattr(geoms, name)) for name in ARRAY_NAMES}
+    layout, offset = {}, 0
+    for name, arr in arrays.items():
+        layout[name] = {"dtype": arr.dtype.str, "shape": arr.shape, "offset": offset}
+        offset = _aligned(offset + arr.nbytes)
+
+    header = json.dumps(
+        {
+            "source": source,
+            "attributes": {col: attributes[col].tolist() for col in attributes.columns},
+            "arrays": layout,
+        }
+    ).encode("utf-8")
+    data_start = _aligned(len(CACHE_MAGIC) + 8 + len(header))
+
+    with atomic_output(path) as tmp:
+        with open(tmp, "wb") as fh:
+            fh.write(CACHE_MAGIC + struct.pack("<Q", len(header)) + header)
+            for name, arr in arrays.items():
+                fh.seek(data_start + layout[name]["offset"])
+                fh.write(arr.tobytes())
+            fh.truncate(data_start + offset)
+
+
+def read_cache(path, source=None):
+    """Load a cache written by write_cache with memory-mapped arrays.
+
+    Returns None if the file is missing, not a cache, or was built from a
+    source file that has changed since (when `source` is given).
+    """
+    try:
+        with open(path, "rb") as fh:
+            if fh.read(len(CACHE_MAGIC)) != CACHE_MAGIC:
+                return None
+            (header_len,) = struct.unpack("<Q", fh.read(8))
+            header = json.loads(fh.read(header_len))
+    except (OSError, ValueError, struct.error):
+        return None
+    if source is not None and header["source"] != source:
+        return None
+
+    data_start = _aligned(len(CACHE_MAGIC) + 8 + header_len)
+    arrays = {}
+    for name, spec in header["arrays"].items():
+        shape = tuple(spec["shape"])
+        if np.prod(shape) == 0:
+            arrays[name] = np.empty(shape, dtype=spec["dtype"])
+        else:
+            arrays[name] = np.memmap(path, dtype=spec["dtype"], mode="r", offset=data_start + spec["offset"], shape=shape)
+    return pd.DataFrame(header["attributes"]), Geometries(**arrays)
+
+
+def load_geometries(path=COMMUNITY_PATH, geometry_column=GEOMETRY_COLUMN, cache=True):
+    """Attributes (DataFrame) and Geometries of a CSV with a WKT column.
+
+    Uses the binary cache next to the CSV when it is up to date, otherwise
+    parses the CSV and (if cache=True) writes the cache. Row i of the
+    attributes belongs to geometry i.
+    """
+    source = _source_stamp(path)
+    if cache:
+        cached = read_cache(cache_path(path), source)
+        if cached is not None:
+            return cached
+
+    df = pd.read_csv(path, thousands=",")
+    if geometry_column not in df.columns:
+        raise ValueError(f"{path} has no '{geometry_column}' column")
+    geoms = parse_wkt(df[geometry_column])
+    attributes = df.drop(columns=[geometry_column])
+    if cache:
+        write_cache(cache_path(path), attributes, geoms, source)
+    return attributes, geoms
+
+
+def main():
+    attributes, geoms = load_geometries()
+    print(
+        f"Loaded {len(geoms)} geometries, {len(geoms.part_offsets) - 1} polygons, "
+        f"{geoms.n_rings} rings, {len(geoms.coords)} vertices"
+    )
+    print("Cache:", cache_path(COMMUNITY_PATH))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# income_groups.py
+#
+# Income groups shared by all dashboards.
+# Tracts are split into n equally sized groups by median household income
+# (quartiles by default). A tract belongs to the first group whose upper
+# quantile boundary is >= its income, i.e. "income <= q25 -> Q1",
+# "income <= q50 -> Q2", ... exactly like the original per-row if/elif
+# functions, but assigned for the whole column at once with searchsorted.
+
+import numpy as np
+import pandas as pd
+
+# Fixed labels and viridis colors for quartiles, used across every dashboard:
+# purple = lowest income, yellow = highest income.
+QUARTILE_LABELS = [
+    "Q1 – Lowest income",
+    "Q2 – Lower-middle",
+    "Q3 – Upper-middle",
+    "Q4 – Highest income",
+]
+QUARTILE_COLORS = {
+    "Q1 – Lowest income": "#440154",  # purple
+    "Q2 – Lower-middle": "#31688e",  # blue
+    "Q3 – Upper-middle": "#35b779",  # green
+    "Q4 – Highest income": "#fde725",  # yellow
+}
+
+
+def group_labels(n_groups=4):
+    """Ordered labels, lowest income first.
+
+    At least two groups are needed for a lowest and a highest income group.
+    """
+    if n_groups < 2:
+        raise ValueError(f"n_groups must be at least 2, not {n_groups}")
+    if n_groups == 4:
+        return list(QUARTILE_LABELS)
+    labels = [f"Q{i}" for i in range(1, n_groups + 1)]
+    labels[0] += " – Lowest income"
+    labels[-1] += " – Highest income"
+    return labels
+
+
+def group_colors(n_groups=4):
+    """Label -> color, sampled from the same viridis scale as the quartiles."""
+    if n_groups == 4:
+        return dict(QUARTILE_COLORS)
+    from plotly.colors import sample_colorscale
+
+    labels = group_labels(n_groups)
+    positions = [i / (n_groups - 1) for i in range(n_groups)]
+    return dict(zip(labels, sample_colorscale("Viridis", positions)))
+
+
+def quantile_breaks(values, n_groups=4):
+    """Upper boundaries of the first n_groups - 1 groups (e.g. q25, q50, q75).
+
+    Uses the same linear-interpolation quantiles as Series.quantile.
+    """
+    probs = np.arange(1, n_groups) / n_groups
+    return pd.Series(values).quantile(probs).to_numpy()
+
+
+def assign_income_groups(values, n_groups=4, breaks=None):
+    """Label every value with its income group as an ordered categorical Series.
+
+    Missing incomes get a missing label.
+    """
+    values = pd.Series(values)
+    if breaks is None:
+        breaks = quantile_breaks(values, n_groups)
+
+    # side="left" returns the first boundary >= value, which is the "<=" rule
+    codes = np.searchsorted(breaks, values.to_numpy(dtype="float64"), side="left")
+    codes[values.isna().to_numpy()] = -1
+
+    groups = pd.Categorical.from_codes(codes, categories=group_labels(n_groups), ordered=True)
+    return pd.Series(groups, index=values.index, name=values.name)
+
+
+def replicate_income_groups(values, n_groups=4):
+    """Group codes (0 = lowest) for a (tracts, replicates) array of incomes.
+
+    Each replicate column gets its own quantile boundaries, and tracts are
+    assigned with the same "<= boundary" rule as assign_income_groups. The
+    values must not contain NaN.
+    """
+    values = np.asarray(values, dtype="float64")
+    probs = np.arange(1, n_groups) / n_groups
+    breaks = np.quantile(values, probs, axis=0)  # (n_groups - 1, replicates)
+    return (values[:, None, :] > breaks[None]).sum(axis=1)
@@ -1,116 +1,316 @@
-import pandas as pd
-import plotly.express as px
-
-# Load the mobility master dataset
-# Contains census-tract level income + mobility data
-df = pd.read_csv("./data_processed/tract_mobility_master.csv")
+# Dashboard 1: Income quartile vs households without a vehicle (violins)
+#
+# build_figure(df, ...) makes the figure from tract_mobility_master rows
+# and main() is the command line. Importing the module only defines them:
+# numpy, pandas and plotly are imported on the first build, so a
+# long-lived process pays for them once and can rebuild the figure with
+# other options many times.
 
-# Keep only tracts that have valid income and % of households without vehicles
-df = df.dropna(subset=["median_income", "pct_hh_no_vehicle"]).copy()
-print("Rows used:", len(df))
+from instrument import step
 
-# Create income groups using statistical quartiles
-# Q1 is the lowest 25% of incomes, Q4 is the highest 25%
-# This ensures fair comparisons between neighborhoods
-q25 = df["median_income"].quantile(0.25)
-q50 = df["median_income"].quantile(0.50)
-q75 = df["median_income"].quantile(0.75)
+OUTPUT_NAME = "income_vs_no_vehicle_violin.html"
+POINT_MODES = ("all", "outliers", "sample", "none")
 
+# Share shown per income group: column -> (title label, axis label)
+VALUE_COLUMNS = {
+    "pct_hh_no_vehicle": ("% Households with No Vehicle", "% Households with No Vehicles"),
+    "pct_hh_one_vehicle": ("% Households with One Vehicle", "% Households with One Vehicle"),
+    "pct_car": ("% Workers Driving to Work", "% Workers Driving to Work"),
+    "pct_public": ("% Workers Using Public Transit", "% Workers Using Public Transit"),
+    "pct_walk": ("% Workers Walking to Work", "% Workers Walking to Work"),
+    "pct_home": ("% Working from Home", "% Working from Home"),
+}
 
-def assign_quartile(income):
-    """
-    Assign an income group label based on quartile thresholds.
-    Quartiles divide the population into 4 equal-sized economic groups.
-    """
-    if income <= q25:
-        return "Q1 – Lowest income"
-    elif income <= q50:
-        return "Q2 – Lower-middle"
-    elif income <= q75:
-        return "Q3 – Upper-middle"
-    else:
-        return "Q4 – Highest income"
-
-
-df["Income Group"] = df["median_income"].apply(assign_quartile)
-
-income_order = [
-    "Q1 – Lowest income",
-    "Q2 – Lower-middle",
-    "Q3 – Upper-middle",
-    "Q4 – Highest income",
-]
-
-# Build the violin plot
-# - X axis: income groups (Q1–Q4)
-# - Y axis: % households without a vehicle
-# - Each dot represents a census tract
-#
-# Why violin?
-# It shows the full distribution: peaks, tails, and density.
-# Bar charts hide inequality — violins expose it.
-fig = px.violin(
-    df,
-    x="Income Group",
-    y="pct_hh_no_vehicle",
-    color="Income Group",
-    category_orders={"Income Group": income_order},
-    box=False,  # hide internal box — we want pure distribution
-    points="all",  # show each tract as a point to preserve raw detail
-)
-
-# Improve visual readability of scattered points
-fig.update_traces(
-    jitter=0.25,  # spread points horizontally to prevent overlap
-    marker_size=4,
-    opacity=0.45,
-)
-
-
-# Chart formatting and interaction
-fig.update_layout(
-    title=(
-        "Income Quartile vs % Households with No Vehicle<br>"
-        "<sup>Each dot represents a census tract; violins show the distribution within each income group.</sup>"
-    ),
-    xaxis_title="Income Quartile (Q1 = lowest income, Q4 = highest income)",
-    yaxis_title="% Households with No Vehicles",
-    yaxis_tickformat=".0%",  # show percentages like 35%
-    template="plotly_white",  # clean visual style
-    legend_title_text="Income Group",
-    # Legend interaction:
-    # Single click: isolate a single income group
-    # Double click: hide/show normally
-    legend_itemclick="toggleothers",
-    legend_itemdoubleclick="toggle",
-)
-
-# Add a short guidance hint above the chart
-fig.add_annotation(
-    text="Legend: click an income group to show only that group; click again to restore all.",
-    xref="paper",
-    yref="paper",
-    x=0.5,
-    y=1.12,
-    showarrow=False,
-    font=dict(size=11),
-    align="center",
-)
+# Half of the horizontal space a violin may use, in category units
+VIOLIN_HALF_WIDTH = 0.45
+# Points are spread over this share of the violin width, like px jitter=0.25
+JITTER = 0.25
+# Grid points of the precomputed densities (shared by all violins)
+KDE_GRID_SIZE = 200
 
 # Disable selection tools
 # These tools cause mass highlighting and make the violins unreadable.
 # We keep hover and legend interactivity only.
-config = {
+CONFIG = {
     "modeBarButtonsToRemove": ["select2d", "lasso2d", "boxSelect"],
     "displaylogo": False,
 }
 
-# Export interactive HTML file
-# Students and professors can open it in any browser
-# without needing Python installed
-fig.write_html(
-    "./figs/income_vs_no_vehicle_violin.html",
-    include_plotlyjs="cdn",
-    config=config,
-)
-print("Saved HTML to ./figs/income_vs_no_vehicle_violin.html")
+
+def parser():
+    """Command-line options of the dashboard."""
+    from figure_export import dashboard_parser
+
+    parser = dashboard_parser("Income quartile vs households without a vehicle.")
+    parser.add_argument(
+        "--column",
+        choices=list(VALUE_COLUMNS),
+        default="pct_hh_no_vehicle",
+        help="share shown per income group (default: households without a vehicle)",
+    )
+    parser.add_argument("--groups", type=int, default=4, help="number of income groups, at least 2 (default 4, quartiles)")
+    parser.add_argument(
+        "--precomputed-kde",
+        action="store_true",
+        help="estimate the violin densities in Python and embed only the outlines",
+    )
+    parser.add_argument(
+        "--points",
+        choices=POINT_MODES,
+        default="outliers",
+        help="tract points drawn with --precomputed-kde (default: outliers)",
+    )
+    parser.add_argument(
+        "--sample-size",
+        type=int,
+        default=200,
+        help="points per income group for --points sample",
+    )
+    return parser
+
+
+def figure_params(args):
+    """build_figure keyword arguments of the command-line options."""
+    return {
+        "column": args.column,
+        "n_groups": args.groups,
+        "precomputed_kde": args.precomputed_kde,
+        "points": args.points,
+        "sample_size": args.sample_size,
+    }
+
+
+def load_data(year=None, column="pct_hh_no_vehicle"):
+    """Master rows with the columns build_figure uses."""
+    from datastore import load_master
+
+    return load_master(columns=["median_income", column], year=year)
+
+
+def prepare(df, column, n_groups):
+    """Tracts with an income and a `column` share, with their income group."""
+    from income_groups import assign_income_groups
+
+    # Keep only tracts that have valid income and a valid share (by default
+    # % of households without vehicles)
+    df = df.dropna(subset=["median_income", column]).copy()
+    print("Rows used:", len(df))
+
+    # Create income groups using statistical quartiles (by default)
+    # Q1 is the lowest 25% of incomes, Q4 is the highest 25%
+    # This ensures fair comparisons between neighborhoods
+    df["Income Group"] = assign_income_groups(df["median_income"], n_groups=n_groups)
+    return df
+
+
+def pick_points(df, column, mode, sample_size):
+    """Tracts to draw as individual points on top of the precomputed violins.
+
+    outliers: outside 1.5 IQR of their own income group (box-plot whiskers);
+    sample: a stratified random sample of up to `sample_size` per group.
+    """
+    if mode == "none":
+        return df.iloc[:0]
+    if mode == "all":
+        return df
+    groups = df.groupby("Income Group", observed=True)[column]
+    if mode == "outliers":
+        q1 = groups.transform("quantile", 0.25)
+        q3 = groups.transform("quantile", 0.75)
+        fence = 1.5 * (q3 - q1)
+        value = df[column]
+        return df[(value < q1 - fence) | (value > q3 + fence)]
+    shuffled = df.sample(frac=1, random_state=0)
+    return shuffled.groupby("Income Group", observed=True).head(sample_size)
+
+
+def kde_violins(df, column, order, colors, points, sample_size):
+    """Violins drawn as filled outlines from densities estimated in Python.
+
+    The figure holds one closed polygon per income group (a few hundred
+    vertices) instead of every tract value, so its size does not grow with
+    the number of tracts. Like plotly's defaults, every violin has the same
+    maximum width and spans its data range plus two bandwidths.
+    """
+    import numpy as np
+    import plotly.graph_objects as go
+
+    from binning import grouped_kde
+
+    values = df[column].to_numpy(dtype="float64")
+    codes = df["Income Group"].cat.codes.to_numpy()
+    grid, density, bandwidths = grouped_kde(values, codes, len(order), KDE_GRID_SIZE)
+
+    fig = go.Figure()
+    for code, q in enumerate(order):
+        group_values = values[codes == code]
+        if not group_values.size:
+            continue
+        lo = group_values.min() - 2 * bandwidths[code]
+        hi = group_values.max() + 2 * bandwidths[code]
+        span = (grid >= lo) & (grid <= hi)
+        y, d = grid[span], density[code][span]
+        half = VIOLIN_HALF_WIDTH * d / d.max() if d.max() > 0 else np.zeros_like(d)
+        fig.add_trace(
+            go.Scatter(
+                x=np.concatenate([code + half, (code - half)[::-1]]),
+                y=np.concatenate([y, y[::-1]]),
+                fill="toself",
+                fillcolor=colors[q],
+                opacity=0.5,
+                mode="lines",
+                line=dict(color=colors[q], width=2),
+                name=q,
+                legendgroup=q,
+                hoveron="fills",
+                hoverinfo="name",
+            )
+        )
+
+    points = pick_points(df, column, points, sample_size)
+    rng = np.random.default_rng(0)
+    spread = JITTER * VIOLIN_HALF_WIDTH
+    for code, q in enumerate(order):
+        sub = points[points["Income Group"] == q]
+        if sub.empty:
+            continue
+        fig.add_trace(
+            go.Scatter(
+                x=code + rng.uniform(-spread, spread, len(sub)),
+                y=sub[column],
+                mode="markers",
+                marker=dict(color=colors[q], size=4, opacity=0.45),
+                name=q,
+                legendgroup=q,
+                showlegend=False,
+                hovertemplate="%{y:.1%}<extra>" + q + "</extra>",
+            )
+        )
+
+    fig.update_xaxes(
+        tickmode="array",
+        tickvals=list(range(len(order))),
+        ticktext=order,
+        range=[-0.6, len(order) - 0.4],
+        zeroline=False,
+    )
+    return fig
+
+
+def build_figure(
+    df,
+    column="pct_hh_no_vehicle",
+    n_groups=4,
+    precomputed_kde=False,
+    points="outliers",
+    sample_size=200,
+):
+    """The violin figure of master rows `df` (see parser() for the options)."""
+    import plotly.express as px
+
+    from income_groups import group_colors, group_labels
+
+    if column not in VALUE_COLUMNS:
+        raise ValueError(f"column must be one of {', '.join(VALUE_COLUMNS)}, not {column!r}")
+    if points not in POINT_MODES:
+        raise ValueError(f"points must be one of {', '.join(POINT_MODES)}, not {points!r}")
+    title_label, axis_label = VALUE_COLUMNS[column]
+    group_name = "Quartile" if n_groups == 4 else "Group"
+
+    with step("transform", rows_in=len(df)) as s:
+        income_order = group_labels(n_groups)
+        df = prepare(df, column, n_groups)
+        s.record(rows_out=len(df))
+
+    with step("figure"):
+        # Build the violin plot
+        # - X axis: income groups (Q1–Q4)
+        # - Y axis: % households without a vehicle
+        # - Each dot represents a census tract
+        #
+        # Why violin?
+        # It shows the full distribution: peaks, tails, and density.
+        # Bar charts hide inequality — violins expose it.
+        if precomputed_kde:
+            fig = kde_violins(df, column, income_order, group_colors(n_groups), points, sample_size)
+        else:
+            fig = px.violin(
+                df,
+                x="Income Group",
+                y=column,
+                color="Income Group",
+                category_orders={"Income Group": income_order},
+                color_discrete_map=group_colors(n_groups),  # same quartile colors as the other dashboards
+                box=False,  # hide internal box — we want pure distribution
+                points="all",  # show each tract as a point to preserve raw detail
+            )
+
+            # Improve visual readability of scattered points
+            fig.update_traces(
+                jitter=0.25,  # spread points horizontally to prevent overlap
+                marker_size=4,
+                opacity=0.45,
+            )
+
+        # Chart formatting and interaction
+        fig.update_layout(
+            title=(
+                f"Income {group_name} vs {title_label}<br>"
+                "<sup>Each dot represents a census tract; violins show the distribution within each income group.</sup>"
+            ),
+            xaxis_title=f"Income {group_name} (Q1 = lowest income, Q{n_groups} = highest income)",
+            yaxis_title=axis_label,
+            yaxis_tickformat=".0%",  # show percentages like 35%
+            template="plotly_white",  # clean visual style
+            legend_title_text="Income Group",
+            # Legend interaction:
+            # Single click: isolate a single income group
+            # Double click: hide/show normally
+            legend_itemclick="toggleothers",
+            legend_itemdoubleclick="toggle",
+        )
+
+        # Add a short guidance hint above the chart
+        fig.add_annotation(
+            text="Legend: click an income group to show only that group; click again to restore all.",
+            xref="paper",
+            yref="paper",
+            x=0.5,
+            y=1.12,
+            showarrow=False,
+            font=dict(size=11),
+            align="center",
+        )
+    return fig
+
+
+def page_options(fig):
+    """write_html options of the figure's page."""
+    return {"config": CONFIG}
+
+
+def main(argv=None):
+    from figure_export import figure_path, write_figure
+
+    args = parser().parse_args(argv)
+
+    # Load the mobility master dataset
+    # Contains census-tract level income + mobility data
+    df = load_data(args.year, args.column)
+    fig = build_figure(df, **figure_params(args))
+
+    # Export interactive HTML file
+    # Students and professors can open it in any browser
+    # without needing Python installed
+    output_path = figure_path(OUTPUT_NAME, args.year)
+    write_figure(
+        fig,
+        output_path,
+        offline=args.offline,  # local plotly.js instead of the CDN
+        **page_options(fig),
+    )
+    print("Saved HTML to", output_path)
+
+
+if __name__ == "__main__":
+    main()
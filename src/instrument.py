@@ -0,0 +1,262 @@
+# instrument.py
+#
+# Lightweight timing and memory instrumentation of the stage scripts.
+# A stage run is split into named steps (load, transform, figure,
+# serialize). For every step the recorder keeps wall and CPU time, the
+# process's current and peak resident memory, optionally the peak of the
+# Python / numpy allocations traced by tracemalloc, the rows going in and
+# out and the bytes written.
+# The shared helpers mark their own steps (read_table, load_master and
+# load_acs_table = load; write_table and write_figure = serialize). Stage
+# functions and the dashboards' build_figure add theirs with
+#     with step("transform") as s:
+#         ...
+#         s.record(rows_out=len(df))
+#
+# Everything is off unless MOBILITY_PROFILE is set (pipeline.py --profile,
+# --profile-memory and --cprofile set it). Then step() hands out one shared
+# object that does nothing and wrote() returns at once.
+# MOBILITY_PROFILE is a comma separated list of options:
+#   report (or 1) - write a step report per stage run to data_processed/profile/<stage>.json
+#   memory        - also trace allocations with tracemalloc (slows the stage down)
+#   cprofile      - also dump a cProfile of the stage to data_processed/profile/<stage>.prof
+# pipeline.py starts and finishes a run around every stage it executes and
+# collects the reports into one run report; a stage script started on its
+# own begins its run at its first step and writes the report when it exits.
+
+import atexit
+import cProfile
+import json
+import os
+import resource
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from paths import PROCESSED_DIR
+
+PROFILE_ENV = "MOBILITY_PROFILE"
+PROFILE_DIR = os.path.join(PROCESSED_DIR, "profile")
+OPTIONS = ("report", "memory", "cprofile")
+
+# ru_maxrss is in kilobytes on Linux and in bytes on macOS
+RSS_BYTES = 1 if sys.platform == "darwin" else 1024
+PAGE_BYTES = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+MB = 1024 * 1024
+
+
+def profile_options(value=None):
+    """Options of a MOBILITY_PROFILE value (default: the environment's); empty = off."""
+    value = os.environ.get(PROFILE_ENV, "") if value is None else value
+    options = {option.strip() for option in value.split(",") if option.strip()}
+    if "1" in options:
+        options = options - {"1"} | {"report"}
+    unknown = options - set(OPTIONS)
+    if unknown:
+        raise ValueError(f"unknown {PROFILE_ENV} option(s) {', '.join(sorted(unknown))}; use {', '.join(OPTIONS)}")
+    return options | {"report"} if options else options
+
+
+def rss_mb():
+    """Current resident memory of this process (None where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * PAGE_BYTES / MB
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def max_rss_mb():
+    """Peak resident memory of this process so far."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * RSS_BYTES / MB
+
+
+class _NullStep:
+    """Stand-in for Step while instrumentation is off."""
+
+    def record(self, **counts):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_STEP = _NullStep()
+
+
+class Step:
+    """One measured step of a run; use as a context manager."""
+
+    def __init__(self, run, name, rows_in=None, rows_out=None):
+        self.run = run
+        self.name = name
+        self.counts = {"rows_in": rows_in, "rows_out": rows_out}
+        self.bytes_written = 0
+        self.traced_peak = 0
+
+    def record(self, **counts):
+        """Set the step's rows_in / rows_out."""
+        self.counts.update(counts)
+
+    def __enter__(self):
+        self.run.open(self)
+        return self
+
+    def __exit__(self, *exc):
+        self.run.close(self)
+        return False
+
+
+class Run:
+    """Steps recorded for one execution of a stage script."""
+
+    def __init__(self, stage, options):
+        self.stage = stage
+        self.options = options
+        self.started = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        self.steps = []
+        self.stack = []
+        self.bytes_written = 0
+        self.memory = "memory" in options and not tracemalloc.is_tracing()
+        if self.memory:
+            tracemalloc.start()
+        self.profiler = cProfile.Profile() if "cprofile" in options else None
+        if self.profiler:
+            self.profiler.enable()
+        self.start = (time.perf_counter(), time.process_time())
+
+    def _fold_peak(self):
+        """Credit the traced peak since the last call to every open step, then reset it."""
+        if not self.memory:
+            return
+        peak = tracemalloc.get_traced_memory()[1]
+        for open_step in self.stack:
+            open_step.traced_peak = max(open_step.traced_peak, peak)
+        tracemalloc.reset_peak()
+
+    def open(self, step):
+        self._fold_peak()
+        step.depth = len(self.stack)
+        step.begin = (time.perf_counter(), time.process_time())
+        self.stack.append(step)
+
+    def close(self, step):
+        self._fold_peak()
+        self.stack.remove(step)
+        self._record(step, step.begin)
+
+    def _record(self, step, begin):
+        now = (time.perf_counter(), time.process_time())
+        entry = {
+            "name": step.name,
+            "depth": step.depth,
+            "offset_seconds": begin[0] - self.start[0],
+            "wall_seconds": now[0] - begin[0],
+            "cpu_seconds": now[1] - begin[1],
+            "rss_mb": rss_mb(),
+            "max_rss_mb": max_rss_mb(),
+            "bytes_written": step.bytes_written,
+        }
+        if self.memory:
+            entry["traced_peak_mb"] = step.traced_peak / MB
+        entry.update({key: value for key, value in step.counts.items() if value is not None})
+        self.steps.append(entry)
+
+    def wrote(self, path):
+        size = os.path.getsize(path)
+        self.bytes_written += size
+        if self.stack:
+            self.stack[-1].bytes_written += size
+
+    def report(self):
+        """The run's totals and steps as a JSON-ready dict."""
+        wall = time.perf_counter() - self.start[0]
+        stepped = sum(s["wall_seconds"] for s in self.steps if s["depth"] == 0)
+        out = {
+            "stage": self.stage,
+            "pid": os.getpid(),
+            "started": self.started,
+            "options": sorted(self.options),
+            "wall_seconds": wall,
+            "cpu_seconds": time.process_time() - self.start[1],
+            "untracked_seconds": max(wall - stepped, 0.0),
+            "max_rss_mb": max_rss_mb(),
+            "bytes_written": self.bytes_written,
+            "steps": self.steps,
+        }
+        if self.memory:
+            out["traced_peak_mb"] = max((s.get("traced_peak_mb", 0.0) for s in self.steps), default=0.0)
+        return out
+
+    def stop(self):
+        if self.profiler:
+            self.profiler.disable()
+        if self.memory:
+            self._fold_peak()
+            tracemalloc.stop()
+
+
+_run = None
+_auto = bool(os.environ.get(PROFILE_ENV))
+
+
+def start(stage, options=None):
+    """Begin recording a run of `stage`; does nothing when profiling is off."""
+    global _run
+    options = profile_options() if options is None else options
+    _run = Run(stage, options) if options else None
+    return _run
+
+
+def finish(write=True):
+    """End the current run; write its report (and cProfile dump) and return the report.
+
+    Returns None when no run is active.
+    """
+    global _run
+    run, _run = _run, None
+    if run is None:
+        return None
+    run.stop()
+    report = run.report()
+    if write:
+        from datastore import atomic_output
+
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        if run.profiler:
+            path = os.path.join(PROFILE_DIR, f"{run.stage}.prof")
+            with atomic_output(path) as tmp:
+                run.profiler.dump_stats(tmp)
+            report["cprofile"] = path
+        with atomic_output(os.path.join(PROFILE_DIR, f"{run.stage}.json")) as tmp:
+            with open(tmp, "w") as fh:
+                json.dump(report, fh, indent=2)
+    return report
+
+
+def _current():
+    """The active run; a script run on its own starts one at its first step."""
+    global _auto
+    if _run is None and _auto:
+        _auto = False
+        start(os.path.splitext(os.path.basename(sys.argv[0]))[0] or "python")
+        atexit.register(finish)
+    return _run
+
+
+def step(name, rows_in=None, rows_out=None):
+    """Context manager measuring one named step (a shared no-op when off)."""
+    run = _current()
+    if run is None:
+        return NULL_STEP
+    return Step(run, name, rows_in=rows_in, rows_out=rows_out)
+
+
+def wrote(path):
+    """Count a written file's size towards the current step."""
+    if _run is not None:
+        _run.wrote(path)
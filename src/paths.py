@@ -0,0 +1,16 @@
+# paths.py
+#
+# Project directories, resolved from the location of this file so the
+# scripts work no matter which directory they are started from.
+# MOBILITY_DATA_ROOT moves the data and figure directories somewhere else
+# (benchmark.py runs every stage on synthetic data in a scratch directory);
+# the code always runs from this checkout.
+
+import os
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_ROOT = os.environ.get("MOBILITY_DATA_ROOT") or PROJECT_ROOT
+
+RAW_DIR = os.path.join(DATA_ROOT, "data_raw")
+PROCESSED_DIR = os.path.join(DATA_ROOT, "data_processed")
+FIGS_DIR = os.path.join(DATA_ROOT, "figs")
@@ -0,0 +1,434 @@
+# pipeline.py
+#
+# Single entry point for the whole pipeline:
+#   ACS cleaners + CTA cleaner -> build_master_tracts -> dashboards
+#                                                     -> community area rollup
+#                                                     -> margin of error intervals
+#   ACS extracts per year (data_raw/panel/<year>/) -> build_panel (one
+#   partition per year, read by the dashboards with --year)
+# Stages whose dependencies are finished run at the same time in a process
+# pool, so a full rebuild takes about as long as the slowest chain of stages
+# (the critical path) instead of the sum of all stages. Stages whose inputs,
+# code and arguments are unchanged since the last run are skipped.
+# --profile records where each stage spends its time and memory (load,
+# transform, figure, serialize steps; see instrument.py) and writes
+# data_processed/profile/run.json with every executed stage's steps.
+#
+# Usage (from anywhere):
+#   python src/pipeline.py                  # run everything
+#   python src/pipeline.py build_master_tracts --jobs 2
+#   python src/pipeline.py --list
+#   python src/pipeline.py --force --profile --cprofile
+
+import argparse
+import contextlib
+import glob
+import hashlib
+import io
+import json
+import os
+import runpy
+import sys
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass, replace
+
+import instrument
+from datastore import MASTER_NAME, atomic_output, file_digest, partition_name, table_files
+from paths import FIGS_DIR, PROCESSED_DIR, PROJECT_ROOT, RAW_DIR
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Stage keys and output hashes from previous runs (see stage_key).
+CACHE_PATH = os.path.join(PROCESSED_DIR, ".pipeline_cache.json")
+# Step reports of the stages run with --profile
+RUN_REPORT_PATH = os.path.join(instrument.PROFILE_DIR, "run.json")
+
+# Helper modules shared by several stages; part of every stage's code hash.
+SHARED_MODULES = (
+    "acs_loader.py",
+    "aggregation.py",
+    "binning.py",
+    "commute_distribution.py",
+    "datastore.py",
+    "figure_export.py",
+    "geometry.py",
+    "income_groups.py",
+    "instrument.py",
+    "paths.py",
+    "spatial.py",
+    "topology.py",
+    "uncertainty.py",
+)
+
+
+@dataclass(frozen=True)
+class Stage:
+    """One pipeline step: a script in src/ plus the stages it depends on.
+
+    inputs/outputs are the files the script reads and writes; together with
+    the script's code and args they decide whether a cached result is reused.
+    requires lists raw files that must exist; when one is missing the stage
+    (and everything downstream of it) is skipped instead of failing the run.
+    code lists other stage scripts in src/ that the script imports from.
+    """
+
+    name: str
+    deps: tuple = ()
+    inputs: tuple = ()
+    outputs: tuple = ()
+    args: tuple = ()
+    requires: tuple = ()
+    code: tuple = ()
+
+    @property
+    def module(self):
+        return self.name
+
+
+def raw(name):
+    return os.path.join(RAW_DIR, name)
+
+
+def fig(name):
+    return os.path.join(FIGS_DIR, name)
+
+
+def acs_cleaner(name):
+    raw_file, table = ACS_TABLES[name]
+    return Stage(name, inputs=(raw(raw_file),), outputs=tuple(table_files(table)), requires=(raw_file,))
+
+
+def panel_files():
+    """Raw panel files (data_raw/panel/<year>/*.csv, crosswalk) and the partitions they make."""
+    inputs = sorted(glob.glob(os.path.join(RAW_DIR, "panel", "*.csv")))
+    outputs = []
+    for year_dir in sorted(glob.glob(os.path.join(RAW_DIR, "panel", "[0-9][0-9][0-9][0-9]"))):
+        inputs += sorted(glob.glob(os.path.join(year_dir, "*.csv")))
+        outputs += table_files(partition_name(MASTER_NAME, os.path.basename(year_dir)))
+    return tuple(inputs), tuple(outputs)
+
+
+def dashboard(name, html):
+    return Stage(name, deps=("build_master_tracts",), inputs=MASTER_FILES, outputs=(fig(html),))
+
+
+# ACS cleaner stage -> (raw file, cleaned table)
+ACS_TABLES = {
+    "clean_median_income": ("median_income.csv", "median_income_clean"),
+    "clean_means_transport": ("means_transport.csv", "means_transport_clean"),
+    "clean_vehicles_available": ("vehicles_available.csv", "vehicles_available_clean"),
+    "clean_travel_time": ("travel_time.csv", "travel_time_clean"),
+}
+ACS_CLEANERS = tuple(ACS_TABLES)
+MASTER_FILES = tuple(table_files(MASTER_NAME))
+PANEL_INPUTS, PANEL_OUTPUTS = panel_files()
+
+STAGES = [
+    *(acs_cleaner(name) for name in ACS_CLEANERS),
+    Stage(
+        "clean_cta_ridership",
+        inputs=(raw("cta_entries.csv"),),
+        outputs=tuple(table_files("cta_ridership_clean")),
+        requires=("cta_entries.csv",),
+    ),
+    Stage(
+        "build_master_tracts",
+        deps=ACS_CLEANERS,
+        inputs=tuple(path for _, table in ACS_TABLES.values() for path in table_files(table)),
+        outputs=MASTER_FILES,
+    ),
+    Stage(
+        "build_community_rollup",
+        deps=("build_master_tracts",),
+        inputs=MASTER_FILES + (raw("tract_centroids.csv"), raw("community_boundaries.csv")),
+        outputs=tuple(table_files("tract_community_areas") + table_files("community_area_mobility")),
+        requires=("tract_centroids.csv", "community_boundaries.csv"),
+    ),
+    Stage(
+        "build_panel",
+        inputs=PANEL_INPUTS,
+        outputs=PANEL_OUTPUTS,
+        requires=("panel",),
+        code=(
+            "build_master_tracts.py",
+            *(f"{name}.py" for name in ACS_CLEANERS),
+        ),
+    ),
+    Stage(
+        "build_moe_intervals",
+        deps=("build_master_tracts",),
+        inputs=MASTER_FILES,
+        outputs=tuple(table_files("tract_mobility_intervals") + table_files("quartile_correlation_intervals")),
+        code=("clean_means_transport.py", "clean_vehicles_available.py"),
+    ),
+    dashboard("income_vs_car_dashboard", "income_vs_no_vehicle_violin.html"),
+    dashboard("commute_inequality_dashboard", "commute_inequality.html"),
+    dashboard("commute_threshold_dashboard", "commute_threshold_slider.html"),
+    Stage(
+        "community_choropleth_dashboard",
+        deps=("build_community_rollup",),
+        inputs=tuple(table_files("community_area_mobility")) + (raw("community_boundaries.csv"),),
+        outputs=(fig("community_choropleth.html"),),
+    ),
+]
+STAGES_BY_NAME = {stage.name: stage for stage in STAGES}
+DASHBOARDS = tuple(stage.name for stage in STAGES if stage.name.endswith("_dashboard"))
+
+
+def offline_dashboards(stages):
+    """Make the dashboard stages reference a local plotly.js instead of the CDN."""
+    from figure_export import local_plotlyjs_path
+
+    bundle = local_plotlyjs_path(FIGS_DIR)
+    return [
+        replace(s, args=s.args + ("--offline",), outputs=s.outputs + (bundle,)) if s.name in DASHBOARDS else s
+        for s in stages
+    ]
+
+
+def path_id(path):
+    return os.path.relpath(path, PROJECT_ROOT)
+
+
+def stage_key(stage):
+    """Cache key: hash of the stage's input files, code and arguments.
+
+    The code part covers the stage script and the shared modules it builds
+    on, so editing a helper invalidates every stage that could use it.
+    """
+    digest = hashlib.sha256()
+    code = [os.path.join(SRC_DIR, f"{stage.module}.py")] + [
+        os.path.join(SRC_DIR, m) for m in stage.code + SHARED_MODULES
+    ]
+    for path in list(stage.inputs) + code:
+        digest.update(f"{path_id(path)}={file_digest(path)}\n".encode())
+    digest.update(json.dumps(list(stage.args)).encode())
+    return digest.hexdigest()
+
+
+def load_cache():
+    if not os.path.exists(CACHE_PATH):
+        return {}
+    with open(CACHE_PATH) as fh:
+        return json.load(fh)
+
+
+def save_cache(cache):
+    with atomic_output(CACHE_PATH) as tmp:
+        with open(tmp, "w") as fh:
+            json.dump(cache, fh, indent=2, sort_keys=True)
+
+
+def is_cached(stage, key, cache):
+    """True if the stage ran with this key and its outputs are still untouched."""
+    entry = cache.get(stage.name)
+    if not entry or entry["key"] != key:
+        return False
+    return all(file_digest(path) == entry["outputs"].get(path_id(path)) for path in stage.outputs)
+
+
+def run_stage(module, args=()):
+    """Run one stage script as __main__ in this process.
+
+    Returns (wall seconds, captured stdout, step report or None). Runs inside
+    a pool worker, so the script's prints are captured and shown by the
+    parent in one block instead of interleaving with other stages. The step
+    report is recorded when MOBILITY_PROFILE is set (see instrument.py).
+    """
+    out = io.StringIO()
+    start = time.perf_counter()
+    argv = sys.argv
+    sys.argv = [module, *args]  # stage scripts parse their own command line
+    instrument.start(module)
+    try:
+        with contextlib.redirect_stdout(out):
+            try:
+                runpy.run_module(module, run_name="__main__", alter_sys=True)
+            except SystemExit as exc:
+                if exc.code not in (None, 0):
+                    raise RuntimeError(f"{module} exited with status {exc.code}") from None
+    except Exception:
+        raise RuntimeError(out.getvalue() + traceback.format_exc()) from None
+    finally:
+        sys.argv = argv
+        report = instrument.finish()
+    return time.perf_counter() - start, out.getvalue(), report
+
+
+def with_dependencies(targets):
+    """Return the target stages plus everything they depend on, in STAGES order."""
+    needed = set()
+    todo = list(targets)
+    while todo:
+        name = todo.pop()
+        if name not in STAGES_BY_NAME:
+            raise ValueError(f"unknown stage {name!r}; see --list")
+        if name not in needed:
+            needed.add(name)
+            todo.extend(STAGES_BY_NAME[name].deps)
+    return [stage for stage in STAGES if stage.name in needed]
+
+
+def critical_path(stages, times):
+    """Length (seconds) of the slowest dependency chain among finished stages."""
+    finish = {}
+    for stage in stages:  # STAGES is listed in dependency order
+        if stage.name in times:
+            before = max((finish.get(dep, 0.0) for dep in stage.deps), default=0.0)
+            finish[stage.name] = before + times[stage.name]
+    return max(finish.values(), default=0.0)
+
+
+def run_pipeline(stages, jobs=None, verbose=False, force=False):
+    """Run `stages` respecting dependencies, independent ones in parallel.
+
+    A stage whose key (inputs + code + args) matches the last successful run
+    and whose outputs are unchanged is not run again; force=True runs
+    everything. Returns {stage name: "ok" | "cached" | "failed" | "skipped"},
+    per-stage wall times and, when profiling, per-stage step reports.
+    """
+    cache = load_cache()
+    keys = {}
+    status = {}
+    times = {}
+    reports = {}
+    selected_stages = {stage.name: stage for stage in stages}
+    pending = dict(selected_stages)
+    selected = set(pending)
+    t0 = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        running = {}
+        while pending or running:
+            for name, stage in list(pending.items()):
+                deps = [d for d in stage.deps if d in selected]
+                missing = [f for f in stage.requires if not os.path.exists(os.path.join(RAW_DIR, f))]
+                if missing:
+                    print(f"[skip] {name}: missing raw file(s) {', '.join(missing)}")
+                    status[name] = "skipped"
+                elif any(status.get(d) in ("failed", "skipped") for d in deps):
+                    print(f"[skip] {name}: an upstream stage did not finish")
+                    status[name] = "skipped"
+                elif all(status.get(d) in ("ok", "cached") for d in deps):
+                    keys[name] = stage_key(stage)
+                    if not force and is_cached(stage, keys[name], cache):
+                        print(f"[cached] {name}")
+                        status[name] = "cached"
+                    else:
+                        running[pool.submit(run_stage, stage.module, stage.args)] = name
+                else:
+                    continue
+                del pending[name]
+
+            if not running:
+                continue  # stages were only skipped or cached; re-check dependents
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                try:
+                    seconds, output, report = future.result()
+                except Exception as exc:
+                    status[name] = "failed"
+                    print(f"[FAIL] {name}\n{exc}")
+                    continue
+                status[name] = "ok"
+                times[name] = seconds
+                if report is not None:
+                    reports[name] = report
+                stage = selected_stages[name]
+                cache[name] = {
+                    "key": keys[name],
+                    "outputs": {path_id(p): file_digest(p) for p in stage.outputs},
+                }
+                save_cache(cache)
+                print(f"[done] {name:<30} {seconds:7.2f}s")
+                if verbose:
+                    print(output)
+
+    wall = time.perf_counter() - t0
+    print(
+        f"\nWall time: {wall:.2f}s  "
+        f"(sum of stages {sum(times.values()):.2f}s, "
+        f"critical path {critical_path(stages, times):.2f}s)"
+    )
+    if reports:
+        print_profile(stages, reports)
+        save_run_report(stages, status, reports, wall, critical_path(stages, times))
+    return status, times, reports
+
+
+def print_profile(stages, reports):
+    """Table of every profiled stage and its top-level steps."""
+    print(f"\n{'stage / step':<40} {'wall s':>8} {'cpu s':>8} {'peak MB':>8} {'rows in':>10} {'rows out':>10} {'MB out':>8}")
+    for stage in stages:
+        report = reports.get(stage.name)
+        if report is None:
+            continue
+        steps = [s for s in report["steps"] if s["depth"] == 0]
+        steps.append({"name": "(untracked)", "wall_seconds": report["untracked_seconds"]})
+        for name, s in [(stage.name, report)] + [("  " + s["name"], s) for s in steps]:
+            peak = s.get("traced_peak_mb", s.get("max_rss_mb"))
+            print(
+                f"{name:<40} {s['wall_seconds']:8.2f} {s.get('cpu_seconds', float('nan')):8.2f}"
+                f" {float('nan') if peak is None else peak:8.1f}"
+                f" {s.get('rows_in', ''):>10} {s.get('rows_out', ''):>10}"
+                f" {s.get('bytes_written', 0) / instrument.MB:8.2f}"
+            )
+
+
+def save_run_report(stages, status, reports, wall, critical):
+    """Write the step reports of one pipeline run to RUN_REPORT_PATH."""
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "options": sorted(instrument.profile_options()),
+        "wall_seconds": wall,
+        "critical_path_seconds": critical,
+        "stages": {s.name: {"status": status.get(s.name), **reports.get(s.name, {})} for s in stages},
+    }
+    os.makedirs(os.path.dirname(RUN_REPORT_PATH), exist_ok=True)
+    with atomic_output(RUN_REPORT_PATH) as tmp:
+        with open(tmp, "w") as fh:
+            json.dump(report, fh, indent=2)
+    print("\nRun report:", RUN_REPORT_PATH)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the mobility data pipeline.")
+    parser.add_argument("targets", nargs="*", help="stages to run (with their dependencies); default: all")
+    parser.add_argument("--jobs", "-j", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--list", action="store_true", help="list stages and their dependencies")
+    parser.add_argument("--verbose", "-v", action="store_true", help="print each stage's output")
+    parser.add_argument("--force", action="store_true", help="ignore the cache and run every selected stage")
+    parser.add_argument("--offline", action="store_true", help="dashboards use a local plotly.js in figs/ instead of the CDN")
+    parser.add_argument("--profile", action="store_true", help="record per-step time and memory of the stages that run")
+    parser.add_argument(
+        "--profile-memory", action="store_true", help="--profile plus the traced allocation peak of every step (slower)"
+    )
+    parser.add_argument("--cprofile", action="store_true", help="--profile plus a cProfile dump per stage")
+    args = parser.parse_args(argv)
+
+    flags = {"report": args.profile, "memory": args.profile_memory, "cprofile": args.cprofile}
+    options = [name for name, on in flags.items() if on]
+    if options:
+        # read by instrument.start in the pool workers, which inherit the environment
+        os.environ[instrument.PROFILE_ENV] = ",".join(options)
+
+    if args.list:
+        for stage in STAGES:
+            deps = ", ".join(stage.deps) or "-"
+            print(f"{stage.name:<30} needs: {deps}")
+        return 0
+
+    stages = with_dependencies(args.targets) if args.targets else STAGES
+    if args.offline:
+        stages = offline_dashboards(stages)
+    status, _, _ = run_pipeline(stages, jobs=args.jobs, verbose=args.verbose, force=args.force)
+    if options and "cached" in status.values():
+        print("Cached stages did not run and have no step report; add --force to profile them as well.")
+    return 1 if "failed" in status.values() else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,193 @@
+# spatial.py
+#
+# Point-in-polygon lookups for many points at once.
+#
+# A uniform grid over the polygons' bounding boxes narrows each point down to
+# a few candidate polygons, an index of edges by y band narrows each polygon
+# down to the edges a ray from the point can cross, and those are tested with
+# an even-odd ray-casting rule evaluated on whole arrays of (point, edge)
+# pairs. Work is done in chunks of edge tests, so memory stays bounded for
+# national tract counts, and there is no Python loop over points or polygons.
+
+from dataclasses import dataclass
+
+import numpy as np
+
+# (point, edge) tests evaluated per chunk in locate_points
+MAX_EDGE_TESTS = 4_000_000
+# Edge bands per grid cell height in PolygonIndex
+BANDS_PER_CELL = 32
+
+
+def ragged_arange(counts):
+    """For groups of the given sizes, the group of every item and its index in it.
+
+    ragged_arange([2, 0, 3]) -> ([0, 0, 2, 2, 2], [0, 1, 0, 1, 2])
+    """
+    counts = np.asarray(counts, dtype=np.int64)
+    groups = np.repeat(np.arange(len(counts)), counts)
+    starts = np.cumsum(counts) - counts
+    return groups, np.arange(counts.sum()) - starts[groups]
+
+
+@dataclass(frozen=True)
+class GridIndex:
+    """Uniform grid listing, for every cell, the geometries whose bbox touches it.
+
+    Cell c (row-major, ny rows of nx cells) holds
+    geoms[cell_offsets[c]:cell_offsets[c + 1]].
+    """
+
+    x0: float
+    y0: float
+    cell: float
+    nx: int
+    ny: int
+    cell_offsets: np.ndarray
+    geoms: np.ndarray
+    bounds: np.ndarray
+
+    @classmethod
+    def build(cls, bounds, cell=None):
+        """Index (n, 4) bounding boxes (min x, min y, max x, max y; NaN = empty).
+
+        The default cell size is the median bbox extent, so a typical polygon
+        touches about four cells and a cell holds a handful of polygons.
+        """
+        bounds = np.asarray(bounds, dtype="float64")
+        valid = np.flatnonzero(np.isfinite(bounds).all(axis=1))
+        box = bounds[valid]
+        if not len(box):
+            return cls(0.0, 0.0, 1.0, 1, 1, np.zeros(2, dtype=np.int64), np.empty(0, dtype=np.int64), bounds)
+
+        x0, y0 = box[:, 0].min(), box[:, 1].min()
+        if cell is None:
+            extents = np.maximum(box[:, 2] - box[:, 0], box[:, 3] - box[:, 1])
+            cell = float(np.median(extents)) or 1.0
+        nx = int((box[:, 2].max() - x0) // cell) + 1
+        ny = int((box[:, 3].max() - y0) // cell) + 1
+
+        ix0 = ((box[:, 0] - x0) // cell).astype(np.int64)
+        iy0 = ((box[:, 1] - y0) // cell).astype(np.int64)
+        wx = ((box[:, 2] - x0) // cell).astype(np.int64) - ix0 + 1
+        wy = ((box[:, 3] - y0) // cell).astype(np.int64) - iy0 + 1
+
+        # every (geometry, cell) pair covered by a bbox, grouped by cell
+        owner, k = ragged_arange(wx * wy)
+        cells = (iy0[owner] + k // wx[owner]) * nx + ix0[owner] + k % wx[owner]
+        order = np.argsort(cells, kind="stable")
+        cell_offsets = np.concatenate([[0], np.cumsum(np.bincount(cells, minlength=nx * ny))])
+        return cls(float(x0), float(y0), float(cell), nx, ny, cell_offsets, valid[owner[order]], bounds)
+
+    def candidates(self, x, y):
+        """(point index, geometry index) pairs whose bbox contains the point."""
+        x = np.asarray(x, dtype="float64")
+        y = np.asarray(y, dtype="float64")
+        ix = np.floor((x - self.x0) / self.cell)
+        iy = np.floor((y - self.y0) / self.cell)
+        inside = np.isfinite(ix) & np.isfinite(iy) & (ix >= 0) & (ix < self.nx) & (iy >= 0) & (iy < self.ny)
+        points = np.flatnonzero(inside)
+        cells = iy[points].astype(np.int64) * self.nx + ix[points].astype(np.int64)
+
+        start = self.cell_offsets[cells]
+        which, k = ragged_arange(self.cell_offsets[cells + 1] - start)
+        point_idx = points[which]
+        geom_idx = self.geoms[start[which] + k]
+
+        b = self.bounds[geom_idx]
+        px, py = x[point_idx], y[point_idx]
+        hit = (px >= b[:, 0]) & (px <= b[:, 2]) & (py >= b[:, 1]) & (py <= b[:, 3])
+        return point_idx[hit], geom_idx[hit]
+
+
+@dataclass(frozen=True)
+class PolygonIndex:
+    """GridIndex of the polygons' bboxes plus their edges bucketed by y band.
+
+    A ray cast from a point only meets edges whose y range contains the
+    point's y, so each (geometry, band) key lists just the edges that overlap
+    that band; a point is tested against the edges of its own band instead
+    of every edge of the polygon. Keys are stored sorted (sparse), so memory
+    is proportional to the number of edges, not geometries x bands.
+    """
+
+    grid: GridIndex
+    band_y0: float
+    band_height: float
+    n_bands: int
+    keys: np.ndarray
+    key_offsets: np.ndarray
+    edges: np.ndarray
+
+    @classmethod
+    def build(cls, geoms, bands_per_cell=BANDS_PER_CELL):
+        grid = GridIndex.build(geoms.bounds())
+        band_height = grid.cell / bands_per_cell
+        n_bands = grid.ny * bands_per_cell + 1
+
+        # Edge k runs from vertex k to k + 1; the step from a ring's last
+        # vertex to the next ring's first is not an edge.
+        coords = geoms.coords
+        is_edge = np.ones(max(len(coords) - 1, 0), dtype=bool)
+        is_edge[geoms.ring_offsets[1:-1] - 1] = False
+        edges = np.flatnonzero(is_edge)
+        vertex_geom = np.repeat(np.arange(len(geoms)), np.diff(geoms.vertex_offsets()))
+        y1, y2 = coords[edges, 1], coords[edges + 1, 1]
+        lo = ((np.minimum(y1, y2) - grid.y0) // band_height).astype(np.int64)
+        hi = ((np.maximum(y1, y2) - grid.y0) // band_height).astype(np.int64)
+
+        owner, k = ragged_arange(hi - lo + 1)
+        keys = vertex_geom[edges[owner]] * n_bands + lo[owner] + k
+        order = np.argsort(keys, kind="stable")
+        keys, first = np.unique(keys[order], return_index=True)
+        key_offsets = np.concatenate([first, [len(order)]])
+        return cls(grid, grid.y0, band_height, n_bands, keys, key_offsets, edges[owner[order]])
+
+    def edge_ranges(self, geom_idx, y):
+        """Start/end into self.edges of the edges to test for each (geometry, y)."""
+        key = geom_idx * self.n_bands + ((y - self.band_y0) // self.band_height).astype(np.int64)
+        if not len(self.keys):
+            none = np.zeros(len(key), dtype=np.int64)
+            return none, none
+        pos = np.minimum(np.searchsorted(self.keys, key), len(self.keys) - 1)
+        match = self.keys[pos] == key
+        return np.where(match, self.key_offsets[pos], 0), np.where(match, self.key_offsets[pos + 1], 0)
+
+
+def locate_points(geoms, x, y, index=None):
+    """Index of the geometry containing each point, or -1 for none.
+
+    geoms is a geometry.Geometries and index an optional prebuilt
+    PolygonIndex. Holes and multi-part polygons follow the even-odd rule over
+    all rings of a geometry. A point inside several (overlapping) geometries
+    gets the first one.
+    """
+    x = np.asarray(x, dtype="float64")
+    y = np.asarray(y, dtype="float64")
+    if index is None:
+        index = PolygonIndex.build(geoms)
+    point_idx, geom_idx = index.grid.candidates(x, y)
+    start, end = index.edge_ranges(geom_idx, y[point_idx])
+    n_edges = end - start
+
+    coords = geoms.coords
+    crossings = np.zeros(len(point_idx), dtype=np.int64)
+    # split the pairs so that each chunk runs at most MAX_EDGE_TESTS tests
+    ends = np.cumsum(n_edges)
+    cuts = np.searchsorted(ends, np.arange(MAX_EDGE_TESTS, ends[-1] if len(ends) else 0, MAX_EDGE_TESTS))
+    chunks = np.unique(np.concatenate([[0], cuts, [len(point_idx)]]))
+    for lo, hi in zip(chunks[:-1], chunks[1:]):
+        pair, k = ragged_arange(n_edges[lo:hi])
+        edge = index.edges[start[lo:hi][pair] + k]
+        px, py = x[point_idx[lo:hi][pair]], y[point_idx[lo:hi][pair]]
+        x1, y1 = coords[edge, 0], coords[edge, 1]
+        x2, y2 = coords[edge + 1, 0], coords[edge + 1, 1]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            crosses = ((y1 > py) != (y2 > py)) & (px < x1 + (py - y1) * (x2 - x1) / (y2 - y1))
+        crossings[lo:hi] = np.bincount(pair, weights=crosses, minlength=hi - lo)
+
+    hit = crossings % 2 == 1
+    result = np.full(len(x), len(geoms), dtype=np.int64)
+    np.minimum.at(result, point_idx[hit], geom_idx[hit])
+    result[result == len(geoms)] = -1
+    return result
@@ -0,0 +1,312 @@
+# synthetic_data.py
+#
+# Synthetic raw data at any size, in exactly the layout of the real files,
+# for benchmarking the pipeline beyond one county (see benchmark.py).
+# Writes to data_raw/ of the output directory:
+#   - the four ACS extracts (means_transport.csv, vehicles_available.csv,
+#     median_income.csv, travel_time.csv) for --tracts tracts: UTF-8 BOM,
+#     every field quoted, GEO_ID / NAME / paired _E / _M columns and the label
+#     row copied from the real extracts in this checkout's data_raw/, the
+#     national summary row and the trailing empty column;
+#   - cta_entries.csv with --stations stations x --days daily rows ending on
+#     the last day of the CTA cleaner's default year;
+#   - tract_centroids.csv with the tracts spread over Chicago's bounding box,
+#     for the community area rollup.
+# Counts are drawn per tract so that each table adds up the way the ACS does
+# (car = drove alone + carpooled, every vehicle count = the sum over household
+# sizes, travel time total = workers not working from home, ...). One latent
+# factor per tract links the tables: tracts with low incomes get more transit
+# riders, fewer cars and longer commutes, so the dashboards show the same
+# kind of pattern as the real data. Margins of error grow with the square
+# root of the count; a few tracts are empty ("-" / "**") and incomes above
+# $250,000 are top-coded ("250,000+" / "***"), as in the real extracts.
+#
+# Usage:
+#   python src/synthetic_data.py --tracts 100000 --out-dir /tmp/mobility-100k
+
+import argparse
+import csv
+import io
+import os
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from clean_cta_ridership import DATE_FORMAT, DEFAULT_YEAR, RAW_COLUMNS
+from paths import PROJECT_ROOT
+
+# The real extracts whose header and label rows are copied
+TEMPLATE_DIR = os.path.join(PROJECT_ROOT, "data_raw")
+ACS_FILES = ("means_transport.csv", "vehicles_available.csv", "median_income.csv", "travel_time.csv")
+
+# Tracts per county and the first county (Cook County, Illinois) of the GEOIDs
+TRACTS_PER_COUNTY = 1300
+FIRST_COUNTY = 17031
+
+# Share of tracts without population (all counts 0, income "-")
+EMPTY_SHARE = 0.005
+# Median income: log-normal around this value, top-coded like the ACS
+INCOME_CENTER = 72_000
+INCOME_TOP = 250_000
+# Design effect of the count margins (ACS tract MOEs are well above sqrt(n))
+MOE_FACTOR = 5.0
+MOE_FLOOR = 12
+
+# B08301 leaf categories (raw column, base share, response to the latent
+# factor: > 0 = more common in low-income tracts)
+MEANS_LEAVES = [
+    ("B08301_003E", 0.58, -0.4),  # drove alone
+    ("B08301_005E", 0.05, 0.0),  # carpool: 2 people
+    ("B08301_006E", 0.01, 0.0),  # 3
+    ("B08301_007E", 0.005, 0.0),  # 4
+    ("B08301_008E", 0.003, 0.0),  # 5 or 6
+    ("B08301_009E", 0.002, 0.0),  # 7 or more
+    ("B08301_011E", 0.08, 0.9),  # bus
+    ("B08301_012E", 0.06, 0.7),  # subway / elevated
+    ("B08301_013E", 0.02, -0.3),  # commuter rail
+    ("B08301_014E", 0.001, 0.0),  # light rail
+    ("B08301_015E", 0.0005, 0.0),  # ferry
+    ("B08301_016E", 0.005, 0.2),  # taxi
+    ("B08301_017E", 0.002, 0.0),  # motorcycle
+    ("B08301_018E", 0.01, 0.1),  # bicycle
+    ("B08301_019E", 0.03, 0.4),  # walked
+    ("B08301_020E", 0.01, 0.1),  # other means
+    ("B08301_021E", 0.12, -0.5),  # worked from home
+]
+# B08301 subtotals -> the columns they add up
+MEANS_TOTALS = {
+    "B08301_004E": ["B08301_005E", "B08301_006E", "B08301_007E", "B08301_008E", "B08301_009E"],
+    "B08301_002E": ["B08301_003E", "B08301_004E"],
+    "B08301_010E": ["B08301_011E", "B08301_012E", "B08301_013E", "B08301_014E", "B08301_015E"],
+}
+
+# B08201: household size (1, 2, 3, 4+ persons) x vehicles available (0 .. 4+)
+HOUSEHOLD_SIZES = [0.32, 0.31, 0.15, 0.22]
+VEHICLE_SHARES = [0.12, 0.38, 0.33, 0.11, 0.06]
+VEHICLE_RESPONSE = [1.0, 0.1, -0.4, -0.6, -0.7]
+SIZE_TOTALS = ["B08201_007E", "B08201_013E", "B08201_019E", "B08201_025E"]
+
+# B08303 buckets (shortest first); longer commutes in low-income tracts
+TRAVEL_SHARES = [0.02, 0.07, 0.11, 0.13, 0.13, 0.06, 0.15, 0.04, 0.05, 0.11, 0.10, 0.03]
+TRAVEL_RESPONSE = 0.5
+
+# CTA: station ids as in the real export (40010, 40020, ...), day type
+# factors of the rides (W = weekday, A = Saturday, U = Sunday)
+FIRST_STATION_ID = 40010
+DAYTYPE_FACTORS = {"W": 1.0, "A": 0.55, "U": 0.4}
+MEDIAN_WEEKDAY_RIDES = 3000
+
+# Bounding box of Chicago's community areas (lon min, lat min, lon max, lat max)
+CHICAGO_BBOX = (-87.94, 41.64, -87.52, 42.02)
+
+
+def template_header(name):
+    """Column names and label row of one real ACS extract."""
+    path = os.path.join(TEMPLATE_DIR, name)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"{path} is needed as the layout template of the synthetic {name}")
+    with open(path, encoding="utf-8-sig", newline="") as fh:
+        reader = csv.reader(fh)
+        columns, labels = next(reader), next(reader)
+    # the trailing comma of every line reads as one empty last field
+    return columns[:-1], labels[:-1]
+
+
+def tract_geoids(n):
+    """n tract GEO_IDs and NAMEs, TRACTS_PER_COUNTY tracts per county."""
+    i = np.arange(n)
+    county = FIRST_COUNTY + 2 * (i // TRACTS_PER_COUNTY)  # county FIPS codes are odd
+    number = i % TRACTS_PER_COUNTY + 101
+    state, county = county // 1000, county % 1000
+    geoids = pd.Series(
+        [f"1400000US{s:02d}{c:03d}{t * 100:06d}" for s, c, t in zip(state, county, number)], dtype="object"
+    )
+    names = pd.Series(
+        [f"Census Tract {t}; County {c:03d}; State {s:02d}" for s, c, t in zip(state, county, number)],
+        dtype="object",
+    )
+    return geoids, names
+
+
+def draw_shares(rng, base, response, factor, noise=0.3):
+    """(tracts, categories) probabilities: base shares tilted by each tract's factor."""
+    base = np.asarray(base, dtype="float64")
+    response = np.asarray(response, dtype="float64")
+    logits = np.log(base)[None, :] + factor[:, None] * response[None, :]
+    logits += noise * rng.standard_normal(logits.shape)
+    p = np.exp(logits - logits.max(axis=1, keepdims=True))
+    return p / p.sum(axis=1, keepdims=True)
+
+
+def count_margins(counts):
+    """ACS-like 90% margins of error of counts."""
+    return np.rint(MOE_FACTOR * 1.645 * np.sqrt(counts) + MOE_FLOOR).astype("int64")
+
+
+def means_transport(rng, workers, factor):
+    """B08301 estimates (raw column -> counts) that add up like the ACS table."""
+    leaves = [name for name, _, _ in MEANS_LEAVES]
+    p = draw_shares(rng, [s for _, s, _ in MEANS_LEAVES], [r for _, _, r in MEANS_LEAVES], factor)
+    counts = dict(zip(leaves, rng.multinomial(workers, p).T))
+    for total, parts in MEANS_TOTALS.items():
+        counts[total] = sum(counts[c] for c in parts)
+    counts["B08301_001E"] = workers
+    return counts
+
+
+def vehicles_available(rng, households, factor):
+    """B08201 estimates: household size x vehicles, with both sets of totals."""
+    vehicles = draw_shares(rng, VEHICLE_SHARES, VEHICLE_RESPONSE, factor)
+    sizes = draw_shares(rng, HOUSEHOLD_SIZES, np.zeros(len(HOUSEHOLD_SIZES)), factor, noise=0.2)
+    p = (sizes[:, :, None] * vehicles[:, None, :]).reshape(len(households), -1)
+    cells = rng.multinomial(households, p).reshape(len(households), len(HOUSEHOLD_SIZES), len(VEHICLE_SHARES))
+
+    counts = {"B08201_001E": households}
+    for v in range(len(VEHICLE_SHARES)):
+        counts[f"B08201_{v + 2:03d}E"] = cells[:, :, v].sum(axis=1)
+    for s, total in enumerate(SIZE_TOTALS):
+        first = int(total[7:10])
+        counts[total] = cells[:, s].sum(axis=1)
+        for v in range(len(VEHICLE_SHARES)):
+            counts[f"B08201_{first + v + 1:03d}E"] = cells[:, s, v]
+    return counts
+
+
+def travel_time(rng, commuters, factor):
+    """B08303 estimates: the commuters (workers not at home) per travel time bucket."""
+    response = TRAVEL_RESPONSE * np.linspace(-1, 1, len(TRAVEL_SHARES))
+    buckets = rng.multinomial(commuters, draw_shares(rng, TRAVEL_SHARES, response, factor, noise=0.15))
+    counts = {"B08303_001E": commuters}
+    counts.update({f"B08303_{b + 2:03d}E": buckets[:, b] for b in range(len(TRAVEL_SHARES))})
+    return counts
+
+
+def median_income(rng, households, factor):
+    """B19013 estimate and margin as strings, with the ACS annotations."""
+    income = INCOME_CENTER * np.exp(-0.45 * factor + 0.25 * rng.standard_normal(len(factor)))
+    income = np.clip(np.rint(income / 10) * 10, 2_500, None).astype("int64")
+    margin = np.rint(income * rng.uniform(0.08, 0.35, len(income))).astype("int64")
+    estimate, moe = income.astype(str).astype(object), margin.astype(str).astype(object)
+    top = income > INCOME_TOP
+    estimate[top], moe[top] = "250,000+", "***"
+    missing = households < 20
+    estimate[missing], moe[missing] = "-", "**"
+    return {"B19013_001E": estimate, "B19013_001M": moe}
+
+
+def acs_frame(columns, counts, geoids, names):
+    """One ACS extract as strings: national row first, then the tracts."""
+    out = {"GEO_ID": geoids, "NAME": names}
+    national = {"GEO_ID": "0100000US", "NAME": "United States"}
+    for column in columns[2:]:
+        if column in counts and counts[column].dtype == object:  # median income strings
+            out[column] = counts[column]
+            national[column] = "-"
+            continue
+        values = counts[column[:-1] + "E"]
+        if column.endswith("E"):
+            out[column] = values
+            national[column] = int(values.sum())
+        else:
+            margins = count_margins(values)
+            out[column] = margins
+            national[column] = int(np.rint(np.sqrt((margins.astype("float64") ** 2).sum())))
+    df = pd.DataFrame(out, columns=columns)
+    return pd.concat([pd.DataFrame([national], columns=columns), df], ignore_index=True)
+
+
+def write_acs(path, columns, labels, df):
+    """Write like data.census.gov: BOM, all fields quoted, trailing empty column."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, quoting=csv.QUOTE_ALL, lineterminator="\n")
+    writer.writerow(columns)
+    writer.writerow(labels)
+    df.to_csv(buffer, header=False, index=False, quoting=csv.QUOTE_ALL, lineterminator="\n")
+    with open(path, "w", encoding="utf-8-sig", newline="") as fh:
+        fh.write(buffer.getvalue().replace("\n", ",\n"))
+
+
+def generate_acs(raw_dir, n_tracts, rng):
+    """Write the four ACS extracts for n_tracts tracts; returns the tract GEO_IDs."""
+    factor = rng.standard_normal(n_tracts)
+    households = np.rint(np.exp(np.log(1400) + 0.45 * rng.standard_normal(n_tracts))).astype("int64")
+    households[rng.random(n_tracts) < EMPTY_SHARE] = 0
+    workers = rng.binomial(households * 2, 0.62)
+
+    means = means_transport(rng, workers, factor)
+    counts = {
+        "means_transport.csv": means,
+        "vehicles_available.csv": vehicles_available(rng, households, factor),
+        "median_income.csv": median_income(rng, households, factor),
+        "travel_time.csv": travel_time(rng, workers - means["B08301_021E"], factor),
+    }
+    geoids, names = tract_geoids(n_tracts)
+    for name in ACS_FILES:
+        columns, labels = template_header(name)
+        write_acs(os.path.join(raw_dir, name), columns, labels, acs_frame(columns, counts[name], geoids, names))
+    return geoids
+
+
+def generate_centroids(raw_dir, geoids, rng):
+    lon_min, lat_min, lon_max, lat_max = CHICAGO_BBOX
+    df = pd.DataFrame(
+        {
+            "GEOID": geoids.str.slice(-11),
+            "INTPTLAT": rng.uniform(lat_min, lat_max, len(geoids)).round(7),
+            "INTPTLONG": rng.uniform(lon_min, lon_max, len(geoids)).round(7),
+        }
+    )
+    df.to_csv(os.path.join(raw_dir, "tract_centroids.csv"), index=False)
+
+
+def generate_cta(raw_dir, n_stations, n_days, rng):
+    """cta_entries.csv: one row per station and day, station by station."""
+    last = date(DEFAULT_YEAR, 12, 31)
+    days = [last - timedelta(days=d) for d in range(n_days - 1, -1, -1)]
+    daytypes = np.array(["W" if d.weekday() < 5 else "A" if d.weekday() == 5 else "U" for d in days])
+    day_factor = np.array([DAYTYPE_FACTORS[t] for t in daytypes])
+
+    stations = FIRST_STATION_ID + 10 * np.arange(n_stations)
+    base = MEDIAN_WEEKDAY_RIDES * np.exp(0.8 * rng.standard_normal(n_stations))
+    rides = base[:, None] * day_factor[None, :] * np.exp(0.15 * rng.standard_normal((n_stations, n_days)))
+
+    df = pd.DataFrame(
+        {
+            "station_id": np.repeat(stations, n_days),
+            "stationname": np.repeat([f"Station {s}" for s in stations], n_days),
+            "date": np.tile([d.strftime(DATE_FORMAT) for d in days], n_stations),
+            "daytype": np.tile(daytypes, n_stations),
+            "rides": np.rint(rides).astype("int64").ravel(),
+        },
+        columns=RAW_COLUMNS,
+    )
+    df.to_csv(os.path.join(raw_dir, "cta_entries.csv"), index=False)
+
+
+def generate(out_dir, n_tracts, n_stations, n_days, seed=0):
+    """Write every synthetic raw file to out_dir/data_raw; returns that directory."""
+    raw_dir = os.path.join(out_dir, "data_raw")
+    os.makedirs(raw_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    geoids = generate_acs(raw_dir, n_tracts, rng)
+    generate_centroids(raw_dir, geoids, rng)
+    generate_cta(raw_dir, n_stations, n_days, rng)
+    return raw_dir
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write synthetic ACS and CTA raw files in the real layout.")
+    parser.add_argument("--out-dir", required=True, help="directory to create data_raw/ in")
+    parser.add_argument("--tracts", type=int, default=10_000, help="number of census tracts (default 10,000)")
+    parser.add_argument("--stations", type=int, default=150, help="number of CTA stations (default 150)")
+    parser.add_argument("--days", type=int, default=365, help=f"days of CTA rides, ending {DEFAULT_YEAR}-12-31")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    args = parser.parse_args(argv)
+
+    raw_dir = generate(args.out_dir, args.tracts, args.stations, args.days, args.seed)
+    print(f"{args.tracts:,} tracts, {args.stations} stations x {args.days} days -> {raw_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,396 @@
+# topology.py
+#
+# Compact, topology-preserving polygon geometry for web maps.
+#
+# Polygons (geometry.Geometries) are turned into a TopoJSON-style topology:
+#   1. coordinates are quantized to an integer grid (default 10^5 steps per
+#      axis, well under a meter across Chicago),
+#   2. rings are cut at junctions (points where the set of polygons on either
+#      side of the border changes) into arcs, and arcs that two polygons share
+#      are stored once; rings refer to arcs by index (~i = arc i reversed),
+#   3. every arc vertex gets a Douglas-Peucker importance in meters: the
+#      tolerance up to which it survives simplification. Arc endpoints are
+#      never removed, so neighbours are simplified identically along their
+#      shared border and no gaps or overlaps open up between them.
+# Simplifying to any tolerance is then a threshold on the importance, which
+# lets the dashboard switch tolerance in the browser. All steps work on flat
+# arrays; the Douglas-Peucker pass handles every arc at once, level by level.
+
+import base64
+from dataclasses import dataclass
+
+import numpy as np
+
+from spatial import ragged_arange
+
+QUANTIZATION = 100_000
+# Approximate meters per degree (latitude; longitude at the equator)
+METERS_PER_DEGREE = (111_320.0, 110_574.0)
+
+
+@dataclass(frozen=True)
+class Topology:
+    """Quantized arcs plus ring -> arc references.
+
+    lon = x0 + qx * kx, lat = y0 + qy * ky. Arc a has the quantized points
+    arc_coords[arc_offsets[a]:arc_offsets[a + 1]] and their importance.
+    Ring r is the concatenation of the arcs ring_arcs[ring_offsets[r]:...];
+    part_offsets / geom_offsets group rings into polygons and geometries as
+    in Geometries. Exterior rings are clockwise, holes counter-clockwise
+    (the winding d3-geo and plotly's geo maps expect).
+    """
+
+    transform: tuple
+    arc_offsets: np.ndarray
+    arc_coords: np.ndarray
+    importance: np.ndarray
+    ring_offsets: np.ndarray
+    ring_arcs: np.ndarray
+    part_offsets: np.ndarray
+    geom_offsets: np.ndarray
+
+    @property
+    def n_arcs(self):
+        return len(self.arc_offsets) - 1
+
+
+def _first_where(mask, groups, n_groups):
+    """Index of the first True item of each group (items sorted by group), -1 if none."""
+    first = np.full(n_groups, -1, dtype=np.int64)
+    idx = np.flatnonzero(mask)
+    uniq, pos = np.unique(groups[idx], return_index=True)
+    first[uniq] = idx[pos]
+    return first
+
+
+def quantize(geoms, quantization=QUANTIZATION):
+    """Quantized open rings of `geoms`: (int coords, ring offsets, transform).
+
+    Consecutive duplicate points (after rounding) and the closing point of
+    every ring are dropped; rings left with fewer than 3 points are emptied.
+    """
+    coords = geoms.coords
+    x0, y0 = coords.min(axis=0) if len(coords) else (0.0, 0.0)
+    span = coords.max(axis=0) - (x0, y0) if len(coords) else np.ones(2)
+    kx, ky = (s / (quantization - 1) if s > 0 else 1.0 for s in span)
+    q = np.rint((coords - (x0, y0)) / (kx, ky)).astype(np.int64)
+
+    ring_of = np.repeat(np.arange(geoms.n_rings), np.diff(geoms.ring_offsets))
+    keep = np.ones(len(q), dtype=bool)
+    keep[1:] = (q[1:] != q[:-1]).any(axis=1) | (ring_of[1:] != ring_of[:-1])
+    # the closing point of a ring repeats its first point
+    keep[geoms.ring_offsets[1:][np.diff(geoms.ring_offsets) > 0] - 1] = False
+    sizes = np.bincount(ring_of[keep], minlength=geoms.n_rings)
+    short = np.repeat(sizes < 3, sizes)
+    q, ring_of = q[keep][~short], ring_of[keep][~short]
+    sizes = np.where(sizes < 3, 0, sizes)
+    return q, np.concatenate([[0], np.cumsum(sizes)]), (float(x0), float(y0), float(kx), float(ky))
+
+
+def ring_signed_area(xy, ring_offsets):
+    """Shoelace signed area of every open ring (positive = counter-clockwise)."""
+    sizes = np.diff(ring_offsets)
+    ring_of = np.repeat(np.arange(len(sizes)), sizes)
+    nxt = np.arange(len(xy)) + 1
+    nxt[ring_offsets[1:][sizes > 0] - 1] = ring_offsets[:-1][sizes > 0]
+    cross = xy[:, 0] * xy[nxt, 1] - xy[nxt, 0] * xy[:, 1]
+    return np.bincount(ring_of, weights=cross, minlength=len(sizes)) / 2
+
+
+def build_topology(geoms, quantization=QUANTIZATION):
+    """Topology (shared arcs, quantized, with simplification importance)."""
+    q, ring_offsets, transform = quantize(geoms, quantization)
+    n_rings = len(ring_offsets) - 1
+    sizes = np.diff(ring_offsets)
+    ring_of = np.repeat(np.arange(n_rings), sizes)
+
+    # Point ids: equal quantized points are the same point.
+    _, pid = np.unique(q[:, 0] * (q[:, 1].max(initial=0) + 1) + q[:, 1], return_inverse=True)
+    n_points = pid.max(initial=-1) + 1
+    nxt = np.arange(len(q)) + 1
+    nxt[ring_offsets[1:][sizes > 0] - 1] = ring_offsets[:-1][sizes > 0]
+
+    # Edge signature: which rings use the (undirected) edge.
+    a, b = pid, pid[nxt]
+    edge_key = np.minimum(a, b) * n_points + np.maximum(a, b)
+    _, edge_id = np.unique(edge_key, return_inverse=True)
+    n_edges = edge_id.max(initial=-1) + 1
+    lo = np.full(n_edges, n_rings)
+    hi = np.full(n_edges, -1)
+    np.minimum.at(lo, edge_id, ring_of)
+    np.maximum.at(hi, edge_id, ring_of)
+    uses = np.bincount(edge_id, minlength=n_edges)
+    signature = (lo * (n_rings + 1) + np.where(uses > 1, hi, n_rings))[edge_id]
+
+    # Junctions: points whose incident edges have different signatures, or
+    # with more than two distinct neighbours.
+    point_sig = np.unique(np.column_stack([np.r_[a, b], np.r_[signature, signature]]), axis=0)
+    neighbours = np.unique(np.column_stack([np.r_[a, b], np.r_[b, a]]), axis=0)
+    junction = (np.bincount(point_sig[:, 0], minlength=n_points) > 1) | (
+        np.bincount(neighbours[:, 0], minlength=n_points) > 2
+    )
+
+    # Rotate each ring to start at its first junction (or, without one, at
+    # its smallest point id so identical rings line up) and close it again.
+    starts = ring_offsets[:-1]
+    is_junction = junction[pid]
+    first_junction = _first_where(is_junction, ring_of, n_rings)
+    min_pid = np.full(n_rings, n_points)
+    np.minimum.at(min_pid, ring_of, pid)
+    first_min = _first_where(pid == min_pid[ring_of], ring_of, n_rings)
+    shift = np.where(first_junction >= 0, first_junction, first_min) - starts
+
+    closed_sizes = np.where(sizes > 0, sizes + 1, 0)
+    rot_ring, local = ragged_arange(closed_sizes)
+    orig = starts[rot_ring] + (local + shift[rot_ring]) % np.maximum(sizes[rot_ring], 1)
+    rot_pid = pid[orig]
+    rot_sig = signature[orig]  # signature of the edge leaving each point
+
+    # Arcs run between consecutive boundaries (junctions and ring ends).
+    boundary = is_junction[orig] | (local == 0) | (local == sizes[rot_ring])
+    bpos = np.flatnonzero(boundary)
+    is_start = local[bpos] != sizes[rot_ring[bpos]]
+    arc_start = bpos[is_start]
+    arc_end = bpos[np.flatnonzero(is_start) + 1]
+    arc_ring = rot_ring[arc_start]
+
+    # Canonical direction and key of every arc occurrence; equal keys are
+    # the same border seen from the two polygons on either side of it.
+    first, last = rot_pid[arc_start], rot_pid[arc_end]
+    second, penult = rot_pid[arc_start + 1], rot_pid[arc_end - 1]
+    forward = (first < last) | ((first == last) & (second <= penult))
+    keys = np.column_stack(
+        [
+            rot_sig[arc_start],
+            np.where(forward, first, last),
+            np.where(forward, second, penult),
+            np.where(forward, last, first),
+            arc_end - arc_start,
+        ]
+    )
+    _, rep, arc_id = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+    arc_id = arc_id.ravel()
+    refs = np.where(forward, arc_id, ~arc_id)
+
+    # Points of each unique arc in canonical direction.
+    lengths = arc_end[rep] - arc_start[rep] + 1
+    which, k = ragged_arange(lengths)
+    pos = np.where(forward[rep][which], arc_start[rep][which] + k, arc_end[rep][which] - k)
+    arc_coords = q[orig[pos]]
+    arc_offsets = np.concatenate([[0], np.cumsum(lengths)])
+
+    # Ring -> arc references, rewound to d3 order (exterior clockwise).
+    ring_arc_offsets = np.concatenate([[0], np.cumsum(np.bincount(arc_ring, minlength=n_rings))])
+    area = ring_signed_area(q.astype("float64"), ring_offsets)
+    ring_part = np.repeat(np.arange(len(geoms.part_offsets) - 1), np.diff(geoms.part_offsets))
+    exterior = np.r_[True, ring_part[1:] != ring_part[:-1]] if n_rings else np.zeros(0, dtype=bool)
+    flip = np.where(exterior, area > 0, area < 0)
+    group, k = ragged_arange(np.diff(ring_arc_offsets))
+    count = np.diff(ring_arc_offsets)[group]
+    reversed_idx = ring_arc_offsets[group] + count - 1 - k
+    refs = np.where(flip[group], ~refs[reversed_idx], refs)
+
+    importance = arc_importance(to_meters(arc_coords, transform), arc_offsets)
+    importance = protect_rings(importance, arc_offsets, refs, ring_arc_offsets)
+
+    return Topology(
+        transform=transform,
+        arc_offsets=arc_offsets,
+        arc_coords=arc_coords,
+        importance=importance,
+        ring_offsets=ring_arc_offsets,
+        ring_arcs=refs,
+        part_offsets=geoms.part_offsets,
+        geom_offsets=geoms.geom_offsets,
+    )
+
+
+def to_meters(qcoords, transform):
+    """Quantized coordinates to local planar meters (equirectangular)."""
+    x0, y0, kx, ky = transform
+    lat = y0 + qcoords[:, 1] * ky
+    scale = np.cos(np.radians(lat.mean() if len(lat) else 0.0))
+    return np.column_stack(
+        [qcoords[:, 0] * kx * METERS_PER_DEGREE[0] * scale, qcoords[:, 1] * ky * METERS_PER_DEGREE[1]]
+    )
+
+
+def arc_importance(xy, arc_offsets):
+    """Douglas-Peucker importance of every point, for all arcs at once.
+
+    Each round takes every open segment of every arc, finds its farthest
+    interior point and splits there. A point's importance is its distance
+    capped by that of the split above it, so simplifying with tolerance t
+    (keep points with importance > t) gives exactly Douglas-Peucker's result.
+    Arc endpoints get +inf.
+    """
+    importance = np.full(len(xy), np.inf)
+    seg_start = arc_offsets[:-1].copy()
+    seg_end = arc_offsets[1:] - 1
+    seg_cap = np.full(len(seg_start), np.inf)
+    while True:
+        interior = seg_end - seg_start - 1
+        active = interior > 0
+        seg_start, seg_end, seg_cap, interior = seg_start[active], seg_end[active], seg_cap[active], interior[active]
+        if not len(seg_start):
+            return importance
+
+        seg, k = ragged_arange(interior)
+        p = seg_start[seg] + 1 + k
+        a, b = xy[seg_start[seg]], xy[seg_end[seg]]
+        ab = b - a
+        ap = xy[p] - a
+        length2 = (ab**2).sum(axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t = np.clip((ap * ab).sum(axis=1) / length2, 0, 1)
+        t = np.where(length2 > 0, t, 0)
+        dist = np.hypot(*(ap - t[:, None] * ab).T)
+
+        # farthest interior point of each segment (first one on ties)
+        group_start = np.concatenate([[0], np.cumsum(interior)[:-1]])
+        best = np.maximum.reduceat(dist, group_start)
+        candidates = np.flatnonzero(dist == best[seg])
+        split = p[candidates[np.unique(seg[candidates], return_index=True)[1]]]
+
+        importance[split] = np.minimum(best, seg_cap)
+        seg_start, seg_end, seg_cap = (
+            np.r_[seg_start, split],
+            np.r_[split, seg_end],
+            np.r_[importance[split], importance[split]],
+        )
+
+
+def protect_rings(importance, arc_offsets, refs, ring_offsets):
+    """Keep enough points that no ring collapses at any tolerance.
+
+    A ring made of one arc keeps the arc's two most important interior
+    points, a ring of two arcs one interior point of each arc; with the arc
+    endpoints that leaves every ring at least three distinct points.
+    """
+    importance = importance.copy()
+    arcs_per_ring = np.diff(ring_offsets)
+    ring_of_ref = np.repeat(np.arange(len(arcs_per_ring)), arcs_per_ring)
+    need = np.zeros(len(arc_offsets) - 1, dtype=np.int64)
+    for n_arcs, keep in ((1, 2), (2, 1)):
+        arcs = np.where(refs < 0, ~refs, refs)[arcs_per_ring[ring_of_ref] == n_arcs]
+        np.maximum.at(need, arcs, keep)
+
+    arc_of = np.repeat(np.arange(len(need)), np.diff(arc_offsets))
+    order = np.lexsort((-importance, arc_of))
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = ragged_arange(np.diff(arc_offsets))[1]
+    # endpoints (inf) rank first, so interior ranks start at 2
+    importance[(rank >= 2) & (rank < 2 + need[arc_of])] = np.inf
+    return importance
+
+
+def _b64(arr):
+    # URL-safe alphabet: the payload travels in the figure JSON, where plotly
+    # writes every "/" as \u002f
+    return base64.urlsafe_b64encode(np.ascontiguousarray(arr).tobytes()).decode("ascii")
+
+
+def _smallest_int(arr):
+    for dtype in (np.int16, np.int32):
+        info = np.iinfo(dtype)
+        if not len(arr) or (arr.min() >= info.min and arr.max() <= info.max):
+            return arr.astype(dtype)
+    return arr.astype(np.int64)
+
+
+def encode_topology(topo, tolerances):
+    """JSON-ready payload of `topo` for TOPOLOGY_JS, at several tolerances.
+
+    Points whose importance is at most tolerances[0] are dropped. Each kept
+    point stores the number of tolerances it survives (1..len), so the page
+    can show any of them. Arcs are delta-encoded: an int32 start point plus
+    int16 (when they fit) steps, base64 encoded little-endian.
+    """
+    tolerances = np.asarray(sorted(tolerances), dtype="float64")
+    level = (topo.importance[:, None] > tolerances[None, :]).sum(axis=1).astype(np.uint8)
+    keep = level > 0
+    arc_of = np.repeat(np.arange(topo.n_arcs), np.diff(topo.arc_offsets))[keep]
+    counts = np.bincount(arc_of, minlength=topo.n_arcs)
+    coords = topo.arc_coords[keep]
+    offsets = np.concatenate([[0], np.cumsum(counts)])
+
+    is_first = np.zeros(len(coords), dtype=bool)
+    is_first[offsets[:-1][counts > 0]] = True
+    deltas = np.diff(coords, axis=0, prepend=coords[:1])[~is_first]
+    steps = _smallest_int(deltas.ravel())
+    return {
+        "transform": list(topo.transform),
+        "tolerances": tolerances.tolist(),
+        "arcCounts": _b64(counts.astype(np.int32)),
+        "arcStarts": _b64(coords[is_first].astype(np.int32).ravel()),
+        "steps": _b64(steps),
+        "stepType": steps.dtype.name,
+        "levels": _b64(level[keep]),
+        "ringArcs": _b64(topo.ring_arcs.astype(np.int32)),
+        "ringOffsets": _b64(topo.ring_offsets.astype(np.int32)),
+        "partOffsets": _b64(np.asarray(topo.part_offsets, dtype=np.int32)),
+        "geomOffsets": _b64(np.asarray(topo.geom_offsets, dtype=np.int32)),
+    }
+
+
+# Decodes an encode_topology payload in the page. topologyFeatures(topo, ids,
+# step) returns a GeoJSON FeatureCollection (feature ids from `ids`) with the
+# points that survive tolerances[step].
+TOPOLOGY_JS = """
+function decodeTopology(p) {
+    function arr(s, T) {
+        var bin = atob(s.replace(/-/g, '+').replace(/_/g, '/')), buf = new Uint8Array(bin.length);
+        for (var i = 0; i < bin.length; i++) { buf[i] = bin.charCodeAt(i); }
+        return new T(buf.buffer);
+    }
+    var counts = arr(p.arcCounts, Int32Array), starts = arr(p.arcStarts, Int32Array);
+    var steps = arr(p.steps, p.stepType === 'int16' ? Int16Array : Int32Array);
+    var levels = arr(p.levels, Uint8Array), t = p.transform;
+    var arcs = [], v = 0, s = 0;
+    for (var a = 0; a < counts.length; a++) {
+        var pts = [], x = 0, y = 0;
+        for (var i = 0; i < counts[a]; i++, v++) {
+            if (i === 0) { x = starts[2 * a]; y = starts[2 * a + 1]; }
+            else { x += steps[s++]; y += steps[s++]; }
+            pts.push([t[0] + x * t[2], t[1] + y * t[3], levels[v]]);
+        }
+        arcs.push(pts);
+    }
+    return {
+        arcs: arcs,
+        ringArcs: arr(p.ringArcs, Int32Array),
+        ringOffsets: arr(p.ringOffsets, Int32Array),
+        partOffsets: arr(p.partOffsets, Int32Array),
+        geomOffsets: arr(p.geomOffsets, Int32Array),
+        tolerances: p.tolerances
+    };
+}
+function topologyFeatures(topo, ids, step) {
+    function ring(r) {
+        var out = [];
+        for (var j = topo.ringOffsets[r]; j < topo.ringOffsets[r + 1]; j++) {
+            var ref = topo.ringArcs[j], pts = topo.arcs[ref < 0 ? ~ref : ref].filter(function (q) {
+                return q[2] > step;
+            }).map(function (q) { return [q[0], q[1]]; });
+            if (ref < 0) { pts.reverse(); }
+            out = out.concat(out.length ? pts.slice(1) : pts);
+        }
+        return out;
+    }
+    var features = [];
+    for (var g = 0; g < ids.length; g++) {
+        var polygons = [];
+        for (var pt = topo.geomOffsets[g]; pt < topo.geomOffsets[g + 1]; pt++) {
+            var rings = [];
+            for (var r = topo.partOffsets[pt]; r < topo.partOffsets[pt + 1]; r++) {
+                var coords = ring(r);
+                if (coords.length >= 4) { rings.push(coords); }
+            }
+            if (rings.length) { polygons.push(rings); }
+        }
+        features.push({type: 'Feature', id: String(ids[g]),
+                       geometry: {type: 'MultiPolygon', coordinates: polygons}});
+    }
+    return {type: 'FeatureCollection', features: features};
+}
+"""
@@ -0,0 +1,155 @@
+# uncertainty.py
+#
+# Sampling error of ACS estimates.
+# The ACS publishes every estimate with a 90% margin of error (MOE). Taking
+# the estimate as normally distributed with standard error MOE / 1.645 (the
+# Census Bureau's own convention), a whole column of tracts can be redrawn
+# many times at once as one (tracts x replicates) array. Any statistic
+# computed column by column on the replicates then varies the way the survey's
+# sampling error lets it vary, and its spread gives a confidence interval.
+# bootstrap_correlations does the same for the other source of uncertainty,
+# which tracts happen to make up the sample, by resampling rows.
+
+import warnings
+
+import numpy as np
+
+# z value of the 90% level the ACS margins of error are published at
+MOE_Z = 1.645
+# Default confidence level of the intervals (the ACS level)
+DEFAULT_LEVEL = 0.9
+# Resampled rows per chunk in bootstrap_correlations
+BOOTSTRAP_CHUNK_CELLS = 2_000_000
+
+
+def standard_error(moe):
+    """Standard errors from 90% margins of error; a missing margin counts as exact."""
+    return np.nan_to_num(np.asarray(moe, dtype="float64") / MOE_Z, nan=0.0)
+
+
+def draw_estimates(rng, estimate, se, n_replicates, lower=0.0):
+    """(len(estimate), n_replicates) normal draws around every estimate.
+
+    Draws are clipped at `lower` (counts, incomes and times are never
+    negative); missing estimates stay missing in every replicate.
+    """
+    estimate = np.asarray(estimate, dtype="float64")
+    draws = rng.standard_normal((len(estimate), n_replicates))
+    draws *= np.asarray(se, dtype="float64")[:, None]
+    draws += estimate[:, None]
+    if lower is not None:
+        np.maximum(draws, lower, out=draws)
+    return draws
+
+
+def interval(samples, level=DEFAULT_LEVEL, axis=-1):
+    """(low, high) bounds holding the central `level` share of samples along axis.
+
+    NaN samples are ignored; an all-NaN slice gives NaN bounds.
+    """
+    tail = (1 - level) / 2
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN slices
+        low, high = np.nanquantile(samples, [tail, 1 - tail], axis=axis)
+    return low, high
+
+
+def centered_interval(samples, estimate, level=DEFAULT_LEVEL, axis=-1):
+    """interval() of the samples' deviations from their mean, placed around `estimate`.
+
+    For statistics whose replicates are biased, e.g. correlations of redrawn
+    estimates, which shrink towards zero because the draws add noise to data
+    that already carries it: the spread is kept, the shift is dropped.
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN slices
+        center = np.nanmean(samples, axis=axis, keepdims=True)
+    low, high = interval(samples - center, level, axis=axis)
+    return estimate + low, estimate + high
+
+
+def _pearson_from_sums(n, sx, sy, sxx, syy, sxy):
+    """Pearson r from row counts and sums of x, y, x^2, y^2 and xy (any shape)."""
+    vx = n * sxx - sx * sx
+    vy = n * syy - sy * sy
+    with np.errstate(divide="ignore", invalid="ignore"):
+        r = (n * sxy - sx * sy) / np.sqrt(vx * vy)
+    return np.where(n < 2, np.nan, r)
+
+
+def _pearson(x, y, mask=None):
+    """Column-wise Pearson r of x and y over the rows where mask is True."""
+    if mask is None:
+        n = np.full(x.shape[1], x.shape[0], dtype="float64")
+    else:
+        mask = np.broadcast_to(mask, x.shape)
+        x = np.where(mask, x, 0.0)
+        y = np.where(mask, y, 0.0)
+        n = mask.sum(axis=0).astype("float64")
+    return _pearson_from_sums(
+        n,
+        x.sum(axis=0),
+        y.sum(axis=0),
+        np.einsum("ij,ij->j", x, x),
+        np.einsum("ij,ij->j", y, y),
+        np.einsum("ij,ij->j", x, y),
+    )
+
+
+def grouped_correlations(x, y, codes, n_groups):
+    """Pearson r of x and y over all rows and within each group, per column.
+
+    x and y are (rows, replicates) arrays without missing values; codes
+    holds each row's group (0 .. n_groups - 1, -1 = none) either per
+    replicate, with the same shape, or as one column shared by all of them.
+    Returns an (n_groups + 1, replicates) array: the overall r first, then
+    group 0, 1, ... NaN where a group has fewer than two rows.
+    """
+    x = np.asarray(x, dtype="float64")
+    y = np.asarray(y, dtype="float64")
+    codes = np.asarray(codes)
+    if codes.ndim == 1:
+        codes = codes[:, None]
+    # centering first keeps the sums of squares small (incomes are ~1e5)
+    x = x - x.mean(axis=0)
+    y = y - y.mean(axis=0)
+
+    out = np.empty((n_groups + 1, x.shape[1]))
+    out[0] = _pearson(x, y)
+    for g in range(n_groups):
+        out[g + 1] = _pearson(x, y, codes == g)
+    return out
+
+
+def bootstrap_correlations(x, y, codes, n_groups, n_replicates, rng, chunk_cells=BOOTSTRAP_CHUNK_CELLS):
+    """grouped_correlations of n_replicates bootstrap resamples of the rows.
+
+    Each replicate draws len(x) row indices with replacement (one integer
+    matrix per chunk of replicates); a drawn row keeps its group. How often
+    every row was drawn turns the sums behind r, for all replicates and
+    groups at once, into one matrix product with the rows' x, y, x^2, y^2
+    and xy, so the cost grows linearly with rows x replicates. Returns an
+    (n_groups + 1, n_replicates) array laid out like grouped_correlations.
+    """
+    x = np.asarray(x, dtype="float64")
+    y = np.asarray(y, dtype="float64")
+    codes = np.asarray(codes)
+    x = x - x.mean()
+    y = y - y.mean()
+    n_rows = len(x)
+
+    # per-row terms of the sums, once for all rows and once per group
+    terms = np.stack([np.ones(n_rows), x, y, x * x, y * y, x * y], axis=1)
+    members = np.column_stack([np.ones(n_rows, dtype=bool)] + [codes == g for g in range(n_groups)])
+    design = (members[:, :, None] * terms[:, None, :]).reshape(n_rows, -1)
+
+    out = np.empty((n_groups + 1, n_replicates))
+    step = max(1, chunk_cells // max(n_rows, 1))
+    for start in range(0, n_replicates, step):
+        size = min(step, n_replicates - start)
+        rows = rng.integers(0, n_rows, size=(size, n_rows))
+        rows += n_rows * np.arange(size)[:, None]  # one bincount for the whole chunk
+        draws = np.bincount(rows.ravel(), minlength=size * n_rows).reshape(size, n_rows)
+        sums = (draws.astype("float64") @ design).reshape(size, n_groups + 1, terms.shape[1])
+        out[:, start : start + size] = _pearson_from_sums(*np.moveaxis(sums, -1, 0)).T
+    return out
@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+
+from aggregation import aggregate_tracts
+from commute_distribution import BUCKET_COLUMNS
+
+
+def tracts():
+    """Three tracts in two areas; one commute bucket has a missing tract (so it is float)."""
+    df = pd.DataFrame(
+        {
+            "geoid": [1, 2, 3],
+            "area": ["a", "a", "b"],
+            "median_income": [40_000.0, 80_000.0, 60_000.0],
+            "workers_total": [120, 80, 100],
+            "workers_public": [30, 10, 20],
+            "hh_total": [100, 100, 50],
+            "travel_total": [120, 80, 100],
+            "mean_travel_time_min": [30.0, 20.0, 25.0],
+        }
+    )
+    for i, column in enumerate(BUCKET_COLUMNS):
+        df[column] = [10 + i, 5 + i, 8]
+    df["commute_20_24"] = [np.nan, 7.0, 8.0]
+    df["pct_public"] = df["workers_public"] / df["workers_total"]
+    df["commute_mean_min"] = 0.0
+    return df
+
+
+def test_counts_with_gaps_are_summed():
+    df = tracts()
+    assert df["commute_20_24"].dtype == "float64"
+    out = aggregate_tracts(df, "area", df.columns.drop("area"))
+
+    assert out.loc["a", "commute_20_24"] == 7
+    assert out.loc["a", "commute_25_29"] == 10 + 5 + 5 + 5
+    assert out.loc["a", "workers_total"] == 200
+    assert out.loc["a", "pct_public"] == 40 / 200
+    assert out.loc["a", "median_income"] == 60_000
+    # the commute distribution is recomputed from the summed buckets
+    assert out.loc["b", "commute_mean_min"] > 0
+
+
+def test_margins_of_averaged_metrics_are_combined():
+    df = tracts()
+    df["median_income_moe"] = [3_000.0, 4_000.0, 5_000.0]
+    out = aggregate_tracts(df, "area", df.columns.drop("area"))
+    # households 100 and 100: sqrt((100 * 3000)^2 + (100 * 4000)^2) / 200
+    assert out.loc["a", "median_income_moe"] == 2_500
+    assert out.loc["b", "median_income_moe"] == 5_000
+
+
+def test_harmonized_tracts_keep_the_master_schema():
+    from build_panel import harmonize_tracts
+
+    master = tracts().drop(columns="area")
+    master["tract_name"] = ["Census Tract 1", "Census Tract 2", "Census Tract 3"]
+    master["median_income_moe"] = [3_000.0, 4_000.0, 5_000.0]
+    master["mean_travel_time_min_moe"] = [2.0, 3.0, 4.0]
+    crosswalk = pd.DataFrame({"geoid_from": [1, 2, 3, 3], "geoid_to": [10, 10, 20, 30], "weight": [1, 1, 0.5, 0.5]})
+
+    out = harmonize_tracts(master, crosswalk)
+    assert list(out.columns) == list(master.columns)
+    assert out["median_income_moe"].notna().all()
+    assert out["workers_total"].tolist() == [200, 50, 50]
@@ -0,0 +1,26 @@
+import numpy as np
+import pandas as pd
+
+from build_moe_intervals import simulate_correlations
+
+
+def noisy_master(n=400, seed=1):
+    """Tracts whose commute time rises with income, with large margins of error."""
+    rng = np.random.default_rng(seed)
+    income = rng.lognormal(11, 0.5, n)
+    travel = 20 + 10 * np.log(income / income.mean()) + rng.normal(0, 5, n)
+    return pd.DataFrame(
+        {
+            "median_income": income,
+            "median_income_moe": 0.4 * income,
+            "mean_travel_time_min": travel,
+            "mean_travel_time_min_moe": np.full(n, 8.0),
+        }
+    )
+
+
+def test_correlation_intervals_hold_the_published_estimate():
+    table, agreement = simulate_correlations(noisy_master(), 300, 0.9, np.random.SeedSequence(0), jobs=1)
+    assert len(table) == 5 and len(agreement) == 400
+    assert (table["r_lo"] <= table["r"]).all()
+    assert (table["r"] <= table["r_hi"]).all()
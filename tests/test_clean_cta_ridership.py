@@ -0,0 +1,137 @@
+import pandas as pd
+import pytest
+
+import clean_cta_ridership
+from clean_cta_ridership import stream_station_totals, summarize_stations, station_totals, update_running_totals
+
+
+def entries():
+    """Parsed entries: weekday and weekend days, and a station without weekend rows."""
+    rows = [
+        (40010, "Austin-Forest Park", "2023-01-02", "W", 1510),
+        (40010, "Austin-Forest Park", "2023-01-03", "W", 1623),
+        (40010, "Austin-Forest Park", "2023-01-07", "A", 702),
+        (40010, "Austin-Forest Park", "2023-01-08", "U", 515),
+        (40020, "Harlem-Lake", "2023-01-02", "W", 3207),
+        (40020, "Harlem-Lake", "2023-01-03", "W", 3388),
+        (40020, "Harlem-Lake", "2023-01-04", "W", 3401),
+        (40030, "Pulaski-Lake", "2023-01-07", "A", 0),
+        (40030, "Pulaski-Lake", "2023-01-02", "W", 1187),
+        (40030, "Pulaski-Lake", "2023-01-08", "U", 431),
+    ]
+    df = pd.DataFrame(rows, columns=["station_id", "station_name", "date", "daytype", "rides"])
+    df["date"] = pd.to_datetime(df["date"])
+    df["daytype"] = df["daytype"].astype("category")
+    return df
+
+
+def per_station_apply(df):
+    """The original per-group aggregation that summarize_stations replaced."""
+
+    def avg_weekday(group):
+        return group[group["daytype"] == "W"]["rides"].mean()
+
+    def avg_weekend(group):
+        return group[group["daytype"].isin(["A", "U"])]["rides"].mean()
+
+    return (
+        df.groupby(["station_id", "station_name"])[["daytype", "rides"]]
+        .apply(
+            lambda g: pd.Series(
+                {
+                    "total_rides": g["rides"].sum(),
+                    "avg_rides_daily": g["rides"].mean(),
+                    "avg_weekday": avg_weekday(g),
+                    "avg_weekend": avg_weekend(g),
+                }
+            )
+        )
+        .reset_index()
+    )
+
+
+def test_summarize_stations_matches_per_station_apply():
+    df = entries()
+    expected = per_station_apply(df)
+    result = summarize_stations(station_totals(df))
+    assert result["avg_weekend"].isna().sum() == 1
+    pd.testing.assert_frame_equal(result, expected, check_exact=True)
+
+
+def test_monthly_totals_collapse_to_station_totals():
+    df = pd.concat([entries(), entries().assign(date=lambda d: d["date"] + pd.DateOffset(months=1))])
+    monthly = station_totals(df, by_period=True)
+    assert sorted(monthly["period"].unique()) == [202301, 202302]
+    collapsed = monthly.drop(columns="period").groupby(["station_id", "station_name"]).sum().reset_index()
+    pd.testing.assert_frame_equal(
+        summarize_stations(collapsed), summarize_stations(station_totals(df)), check_exact=True
+    )
+
+
+HEADER = "station_id,stationname,date,daytype,rides\n"
+
+
+def full_scan(path):
+    totals, _ = stream_station_totals(str(path), None, None, by_period=True)
+    return totals
+
+
+@pytest.fixture
+def running_totals(tmp_path, monkeypatch):
+    monkeypatch.setattr(clean_cta_ridership, "TOTALS_PATH", str(tmp_path / "totals.csv"))
+    monkeypatch.setattr(clean_cta_ridership, "STATE_PATH", str(tmp_path / "state.json"))
+    raw = tmp_path / "cta_entries.csv"
+
+    def update(text):
+        raw.write_text(text)
+        return update_running_totals(str(raw), chunksize=2)
+
+    return raw, update
+
+
+def test_appended_rows_are_counted_once(running_totals):
+    raw, update = running_totals
+    update(HEADER + "10,A,01/02/2023,W,100\n20,B,01/02/2023,W,200\n")
+    totals = update(raw.read_text() + "10,A,01/03/2023,W,110\n20,B,01/07/2023,A,70\n")
+    pd.testing.assert_frame_equal(totals, full_scan(raw), check_dtype=False)
+
+
+def test_replaced_file_is_rescanned(running_totals):
+    # A re-sorted download with a backfilled row, larger than the first one:
+    # the old offset falls in the middle of a line.
+    raw, update = running_totals
+    update(HEADER + "10,A,01/02/2023,W,100\n20,B,01/02/2023,W,200\n")
+    totals = update(
+        HEADER
+        + "10,A,01/01/2023,U,90\n10,A,01/02/2023,W,100\n10,A,01/03/2023,W,110\n"
+        + "20,B,01/02/2023,W,200\n20,B,01/03/2023,W,210\n"
+    )
+    assert set(totals["station_id"]) == {10, 20}
+    pd.testing.assert_frame_equal(totals, full_scan(raw), check_dtype=False)
+
+
+def test_replaced_file_of_the_same_size_is_rescanned(running_totals):
+    raw, update = running_totals
+    update(HEADER + "10,A,01/02/2023,W,100\n20,B,01/02/2023,W,200\n")
+    totals = update(HEADER + "20,B,01/02/2023,W,200\n10,A,01/02/2023,W,900\n")
+    assert totals.set_index("station_id").loc[10, "rides_sum"] == 900
+
+
+def test_half_written_row_waits_for_its_newline(running_totals):
+    raw, update = running_totals
+    first = HEADER + "10,A,01/02/2023,W,100\n"
+    totals = update(first + "20,B,01/02/2023,W,2")
+    assert list(totals["station_id"]) == [10]
+    totals = update(first + "20,B,01/02/2023,W,200\n")
+    pd.testing.assert_frame_equal(totals, full_scan(raw), check_dtype=False)
+    assert totals.set_index("station_id").loc[20, "rides_sum"] == 200
+
+
+def test_totals_without_matching_state_are_rebuilt(running_totals):
+    raw, update = running_totals
+    update(HEADER + "10,A,01/02/2023,W,100\n")
+    # A run interrupted after writing the totals but before the state
+    with open(clean_cta_ridership.TOTALS_PATH, "a") as fh:
+        fh.write("10,A,202301,100,1,100,1,0,0\n")
+    totals = update(raw.read_text() + "10,A,01/03/2023,W,110\n")
+    pd.testing.assert_frame_equal(totals, full_scan(raw), check_dtype=False)
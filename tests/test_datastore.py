@@ -0,0 +1,42 @@
+import pandas as pd
+import pytest
+
+import datastore
+from datastore import read_table, write_table
+
+
+@pytest.fixture
+def tract_table(tmp_path, monkeypatch):
+    monkeypatch.setattr(datastore, "PROCESSED_DIR", str(tmp_path))
+    df = pd.DataFrame(
+        {
+            "geoid": [17031010100, 17031010201],
+            "tract_name": ["Census Tract 101", "Census Tract 102.01"],
+            "workers_total": [2279, 3014],
+            "pct_car": [0.3435717419921018, 0.2505484861781483],
+        }
+    )
+    write_table(df, "tracts")
+    return df
+
+
+def test_exact_read_keeps_full_precision_shares(tract_table):
+    df = read_table("tracts", exact=True)
+    assert df["pct_car"].dtype == "float64"
+    pd.testing.assert_series_equal(df["pct_car"], tract_table["pct_car"], check_exact=True)
+
+
+def test_default_read_has_compact_shares(tract_table):
+    df = read_table("tracts", columns=["geoid", "pct_car"])
+    assert list(df.columns) == ["geoid", "pct_car"]
+    assert df["pct_car"].dtype == "float32"
+    assert df["geoid"].dtype == "int64"
+
+
+def test_exact_read_without_csv_export_fails(tract_table, tmp_path):
+    if not datastore.HAVE_PARQUET:
+        pytest.skip("needs pyarrow")
+    (tmp_path / "tracts.csv").unlink()
+    with pytest.raises(FileNotFoundError, match="full precision"):
+        read_table("tracts", exact=True)
+    assert read_table("tracts")["pct_car"].dtype == "float32"
@@ -0,0 +1,18 @@
+import pytest
+
+from income_groups import QUARTILE_LABELS, group_colors, group_labels
+
+
+def test_quartile_labels_by_default():
+    assert group_labels() == QUARTILE_LABELS
+
+
+def test_lowest_and_highest_group_are_named():
+    assert group_labels(2) == ["Q1 – Lowest income", "Q2 – Highest income"]
+    assert list(group_colors(2)) == group_labels(2)
+
+
+@pytest.mark.parametrize("n_groups", [0, 1])
+def test_fewer_than_two_groups_are_rejected(n_groups):
+    with pytest.raises(ValueError, match="at least 2"):
+        group_labels(n_groups)